@@ -0,0 +1,117 @@
+# Copyright © 2023 Arunachala Amuda Murugan (@majimearun)
+#
+# License: GNU General Public License v3.0
+
+# importing libraries
+import lemminflect
+from array import array
+from heapq import merge
+from itertools import islice
+from collections.abc import Mapping, Sequence
+from postings import PostingsList
+from term_dictionary import TermDictionary
+
+
+class AutocompleteIndex:
+    def __init__(
+        self,
+        term_dictionary: TermDictionary,
+        inflections: Sequence[Sequence[str]],
+        offsets: Sequence[int],
+        completions: Sequence[int],
+        k: int,
+    ):
+        """Autocomplete index: the best completions of every prefix, precomputed for every node of the term dictionary trie, along with the inflections of every word, so suggesting completions for a prefix is one trie walk and a slice (see `build`)
+
+        Args:
+            term_dictionary (TermDictionary): trie of the words in the corpus
+            inflections (Sequence[Sequence[str]]): inflections of each word (by term ID)
+            offsets (Sequence[int]): start of the completions of each node in `completions` (plus one past the last node)
+            completions (Sequence[int]): term IDs of the best completions of every node, best first
+            k (int): number of completions kept per node (nodes with fewer have no other completions)
+
+        Returns:
+            None
+        """
+        self.term_dictionary = term_dictionary
+        self.inflections = inflections
+        self.offsets = offsets
+        self.completions = completions
+        self.k = k
+
+    @classmethod
+    def build(
+        cls,
+        term_dictionary: TermDictionary,
+        inverted_list: Mapping[str, PostingsList],
+        k: int = 10,
+    ):
+        """Builds the autocomplete index. Completions of a prefix are ranked by their edit distance to it (how many characters they add, as every completion starts with the prefix), then by the number of documents they occur in, then alphabetically. The ranking does not depend on the prefix, so the completions of a node are merged bottom up from the completions of its children
+
+        Words without any inflection are left out, as they cannot be suggested. Inflections are looked up here (with lemminflect) instead of at query time.
+
+        Args:
+            term_dictionary (TermDictionary): trie of the words in the corpus
+            inverted_list (Mapping[str, PostingsList]): inverted index for each word in the corpus (document frequencies)
+            k (int, optional): number of completions kept per node. Defaults to 10.
+
+        Returns:
+            AutocompleteIndex: autocomplete index
+        """
+        terms = list(term_dictionary)
+        inflections: list[tuple[str, ...]] = []
+        for term in terms:
+            possible_inflections: dict[str, tuple[str]] = lemminflect.getAllInflections(term)
+            inflections.append(
+                tuple(dict.fromkeys(word for tag in possible_inflections for word in possible_inflections[tag]))
+            )
+        order = sorted(
+            range(len(terms)),
+            key=lambda term_id: (len(terms[term_id]), -len(inverted_list[terms[term_id]]), term_id),
+        )
+        rank = array("I", bytes(4 * len(terms)))
+        for position, term_id in enumerate(order):
+            rank[term_id] = position
+
+        # children have larger node IDs than their parents (breadth first numbering), so visiting nodes backwards is bottom up
+        n_nodes = len(term_dictionary.labels)
+        best: list[list[int]] = [[] for _ in range(n_nodes)]
+        for node in range(n_nodes - 1, -1, -1):
+            own = term_dictionary.node_terms[node]
+            lists = [best[child] for child in range(term_dictionary.first_child[node], term_dictionary.first_child[node + 1])]
+            if own != -1 and inflections[own]:
+                lists.append([own])
+            best[node] = list(islice(merge(*lists, key=rank.__getitem__), k))
+
+        offsets = array("I", [0])
+        completions = array("I")
+        for node_completions in best:
+            completions.extend(node_completions)
+            offsets.append(len(completions))
+        return cls(term_dictionary, inflections, offsets, completions, k)
+
+    def complete(self, prefix: str, max_results: int = 10):
+        """Suggests inflected words starting with the prefix, best first (inflections of the best completions, without repeats)
+
+        Args:
+            prefix (str): prefix typed so far
+            max_results (int, optional): maximum number of suggestions. Defaults to 10.
+
+        Returns:
+            list[str] | None: suggestions, or None if the stored completions may not be enough for max_results suggestions (more than k requested, or inflections shared between words)
+        """
+        node = self.term_dictionary.node(prefix)
+        if node == -1:
+            return []
+        start, end = self.offsets[node], self.offsets[node + 1]
+        suggestions: list[str] = []
+        for term_id in self.completions[start:end]:
+            for word in self.inflections[term_id]:
+                if word not in suggestions:
+                    suggestions.append(word)
+            if len(suggestions) >= max_results:
+                return suggestions[:max_results]
+        if end - start >= self.k:
+            # the node may have more completions than were stored
+            return None
+        return suggestions
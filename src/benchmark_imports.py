@@ -0,0 +1,64 @@
+# Copyright © 2023 Arunachala Amuda Murugan (@majimearun)
+#
+# License: GNU General Public License v3.0
+
+# importing libraries
+import os
+import statistics
+import subprocess
+import sys
+
+# modules imported by an application before its first query
+QUERY_MODULES = [
+    "query_functions",
+    "scoring_functions",
+    "phrase_query_functions",
+    "edit_distance_functions",
+]
+
+# every model the query modules used to load at import time
+EAGER_MODELS = ["lemmatizer", "summarizer"]
+
+
+def time_import(modules: list[str], load_models: list[str] = (), runs: int = 5):
+    """Times importing the given modules in fresh interpreters (nothing cached in memory), optionally loading models from the registry right after, the way the query modules used to load them at import time
+
+    Args:
+        modules (list[str]): modules to import
+        load_models (list[str], optional): names of the registry models loaded after the import. Defaults to ().
+        runs (int, optional): number of fresh interpreters timed. Defaults to 5.
+
+    Returns:
+        tuple[float, list[str]]: median time in seconds, and the models loaded at the end of the last run
+    """
+    code = (
+        "import time\n"
+        "start = time.perf_counter()\n"
+        + "".join(f"import {module}\n" for module in modules)
+        + "import model_registry\n"
+        + "".join(f"model_registry.get_model({name!r})\n" for name in load_models)
+        + "print(time.perf_counter() - start)\n"
+        "print(','.join(model_registry.loaded_models()))\n"
+    )
+    times: list[float] = []
+    loaded: list[str] = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.splitlines()
+        times.append(float(output[0]))
+        loaded = [name for name in output[1].split(",") if name]
+    return statistics.median(times), loaded
+
+
+if __name__ == "__main__":
+    # Run this file from the src directory to compare the lazy imports against loading every model up front
+    lazy_time, lazy_models = time_import(QUERY_MODULES)
+    eager_time, eager_models = time_import(QUERY_MODULES, EAGER_MODELS)
+    print(f"lazy import:  {lazy_time:.3f}s, models loaded: {lazy_models or 'none'}")
+    print(f"eager import: {eager_time:.3f}s, models loaded: {eager_models}")
+    print(f"speedup: {eager_time / lazy_time:.1f}x")
@@ -0,0 +1,308 @@
+# Copyright © 2023 Arunachala Amuda Murugan (@majimearun)
+#
+# License: GNU General Public License v3.0
+
+# importing libraries
+import sys
+from collections import OrderedDict
+from collections.abc import Hashable, Iterator, Mapping
+from typing import Any
+from postings import PostingsList, DecodedPostingsList
+
+
+class Cache:
+    def __init__(self, max_bytes: int, policy: str = "lru"):
+        """Key value cache bounded by the (approximate) memory held by its values
+
+        Args:
+            max_bytes (int): largest total size of the cached values
+            policy (str, optional): eviction policy, "lru" (least recently used) or "lfu" (least frequently used, least recently used among ties). Defaults to "lru".
+
+        Raises:
+            ValueError: if the policy is not supported
+
+        Returns:
+            None
+        """
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"unsupported eviction policy {policy}, expected 'lru' or 'lfu'")
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.nbytes: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        # key -> [value, size, number of uses]
+        self._entries: dict[Hashable, list] = {}
+        # number of uses -> keys used that many times, least recently used first (a single bucket for lru)
+        self._buckets: dict[int, OrderedDict] = {}
+
+    def __len__(self):
+        """Number of cached values"""
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable):
+        return key in self._entries
+
+    def _bucket(self, entry: list):
+        """Bucket an entry is kept in (its number of uses for lfu, always the same for lru)
+
+        Args:
+            entry (list): cache entry
+
+        Returns:
+            int: bucket
+        """
+        return entry[2] if self.policy == "lfu" else 0
+
+    def _touch(self, key: Hashable, entry: list):
+        """Marks an entry as just used, moving it to the most recent end of its (new) bucket
+
+        Args:
+            key (Hashable): key of the entry
+            entry (list): cache entry
+
+        Returns:
+            None
+        """
+        bucket = self._buckets[self._bucket(entry)]
+        del bucket[key]
+        if len(bucket) == 0:
+            del self._buckets[self._bucket(entry)]
+        entry[2] += 1
+        self._buckets.setdefault(self._bucket(entry), OrderedDict())[key] = None
+
+    def get(self, key: Hashable, default: Any = None):
+        """Looks a key up, counting a hit or a miss
+
+        Args:
+            key (Hashable): key
+            default (Any, optional): value returned on a miss. Defaults to None.
+
+        Returns:
+            Any: cached value, or default
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._touch(key, entry)
+        return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int):
+        """Caches a value, evicting others until it fits. Values larger than the whole cache are not kept
+
+        Args:
+            key (Hashable): key
+            value (Any): value
+            size (int): approximate size of the value in bytes
+
+        Returns:
+            None
+        """
+        self.discard(key)
+        if size > self.max_bytes:
+            return
+        while self.nbytes + size > self.max_bytes:
+            self._evict()
+        entry = [value, size, 1]
+        self._entries[key] = entry
+        self._buckets.setdefault(self._bucket(entry), OrderedDict())[key] = None
+        self.nbytes += size
+
+    def _evict(self):
+        """Drops the entry chosen by the eviction policy
+
+        Returns:
+            None
+        """
+        lowest = min(self._buckets)
+        bucket = self._buckets[lowest]
+        key, _ = bucket.popitem(last=False)
+        if len(bucket) == 0:
+            del self._buckets[lowest]
+        self.nbytes -= self._entries.pop(key)[1]
+        self.evictions += 1
+
+    def discard(self, key: Hashable):
+        """Removes a key if it is cached
+
+        Args:
+            key (Hashable): key
+
+        Returns:
+            None
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        bucket = self._buckets[self._bucket(entry)]
+        del bucket[key]
+        if len(bucket) == 0:
+            del self._buckets[self._bucket(entry)]
+        self.nbytes -= entry[1]
+
+    def clear(self):
+        """Removes every cached value (the counters are kept)
+
+        Returns:
+            None
+        """
+        self._entries.clear()
+        self._buckets.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        """Hit, miss and eviction counters along with the current size
+
+        Returns:
+            dict[str, int | float]: counters, number of entries, size in bytes and hit rate
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.nbytes,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class CachedInvertedList(Mapping):
+    def __init__(self, inverted_list: Mapping[str, PostingsList], cache: Cache):
+        """Inverted index whose postings lists are decoded once and then served from a cache (see `DecodedPostingsList`)
+
+        Args:
+            inverted_list (Mapping[str, PostingsList]): inverted index for each word in the corpus
+            cache (Cache): cache of decoded postings lists
+
+        Returns:
+            None
+        """
+        self.inverted_list = inverted_list
+        self.cache = cache
+
+    def __getitem__(self, word: str):
+        """Decoded postings list of a word
+
+        Raises:
+            KeyError: if the word is not in the index
+
+        Returns:
+            DecodedPostingsList: decoded postings list
+        """
+        postings = self.cache.get(word)
+        if postings is None:
+            postings = DecodedPostingsList.decode(self.inverted_list[word])
+            self.cache.put(word, postings, postings.nbytes())
+        return postings
+
+    def __contains__(self, word: object):
+        return word in self.inverted_list
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.inverted_list)
+
+    def __len__(self):
+        return len(self.inverted_list)
+
+
+def index_generation(inverted_list: Mapping[str, PostingsList]):
+    """Identifies the version of the index cached values were computed from: the generation of a memory mapped segment (see `IndexReader`) or of a segmented index snapshot (see `SegmentedIndex`), which changes whenever the index does. A plain dict can be edited in place without notice, so it has no generation
+
+    Args:
+        inverted_list (Mapping[str, PostingsList]): inverted index for each word in the corpus
+
+    Returns:
+        Hashable | None: index generation, None if the index has none
+    """
+    return getattr(inverted_list, "generation", None)
+
+
+class SearchCache:
+    def __init__(
+        self,
+        max_result_bytes: int = 16 * 1024 * 1024,
+        max_postings_bytes: int = 64 * 1024 * 1024,
+        policy: str = "lru",
+    ):
+        """Caches for `search`: the results of whole queries (keyed on the normalized query and the search options) and the decoded postings lists of hot words. Both are emptied when the index generation changes
+
+        Args:
+            max_result_bytes (int, optional): memory bound of the result cache. Defaults to 16 MiB.
+            max_postings_bytes (int, optional): memory bound of the postings cache. Defaults to 64 MiB.
+            policy (str, optional): eviction policy of both caches, "lru" or "lfu". Defaults to "lru".
+
+        Returns:
+            None
+        """
+        self.results = Cache(max_result_bytes, policy)
+        self.postings = Cache(max_postings_bytes, policy)
+        self.generation: Hashable = None
+
+    def validate(self, inverted_list: Mapping[str, PostingsList]):
+        """Empties the caches if the index changed since they were filled
+
+        Args:
+            inverted_list (Mapping[str, PostingsList]): inverted index about to be queried
+
+        Returns:
+            bool: whether the index has a generation, the results of an index without one are never cached
+        """
+        generation = index_generation(inverted_list)
+        if generation is None:
+            return False
+        if generation != self.generation:
+            self.results.clear()
+            self.postings.clear()
+            self.generation = generation
+        return True
+
+    def inverted_list(self, inverted_list: Mapping[str, PostingsList]):
+        """Wraps an inverted index so its postings lists are served from the postings cache
+
+        Args:
+            inverted_list (Mapping[str, PostingsList]): inverted index for each word in the corpus
+
+        Returns:
+            CachedInvertedList: cached inverted index
+        """
+        return CachedInvertedList(inverted_list, self.postings)
+
+    @staticmethod
+    def result_key(query: str, **options: Hashable):
+        """Key of a query in the result cache: the query with case and whitespace normalized, and the options changing its results
+
+        Args:
+            query (str): query string
+            options (Hashable): search options (e.g. is_phrase, ranked, retrieve_n), and the scorer and analyzer instances the results depend on
+
+        Returns:
+            tuple: cache key
+        """
+        return (" ".join(query.lower().split()), tuple(sorted(options.items())))
+
+    @staticmethod
+    def result_size(key: tuple, scores: list[tuple[int, float | None]], corrected_query: str | None = None):
+        """Approximate memory held by a cached result (the scores and the corrected query)
+
+        Args:
+            key (tuple): cache key
+            scores (list[tuple[int, float | None]]): results
+            corrected_query (str | None, optional): query after spell check, kept with the results. Defaults to None.
+
+        Returns:
+            int: size in bytes
+        """
+        # list slot + tuple + int + float per result
+        return sys.getsizeof(key[0]) + sys.getsizeof(corrected_query) + len(scores) * 120
+
+    def stats(self):
+        """Counters of both caches
+
+        Returns:
+            dict[str, dict[str, int | float]]: counters of the result and postings caches
+        """
+        return {"results": self.results.stats(), "postings": self.postings.stats()}
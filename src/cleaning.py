@@ -4,14 +4,136 @@
 
 import fitz
 import glob
+import hashlib
+import json
+import os
 import pickle
+import pandas as pd
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from tokenizing import split_paragraphs, tokenize_texts
 
 
-def clean(path: str):
-    """Cleans the pdfs in a given folder into a pickle file (page-wise) per pdf, and saves it a folder with the same parent as the pdfs, but in a `pkl/` folder
+def extract_pages(file: str):
+    """Extracts the text of every page of a pdf. The document is closed once read
+
+    Args:
+        file (str): path of the pdf
+
+    Returns:
+        list[tuple[str, int]]: text and (0 indexed) page number of every page
+    """
+    with fitz.open(file) as doc:
+        return [(page.get_text(), i) for i, page in enumerate(doc)]
+
+
+def document_name(file: str):
+    """Name of the document a pdf holds: its file name without the extension
+
+    Args:
+        file (str): path of the pdf
+
+    Returns:
+        str: document name
+    """
+    return os.path.splitext(os.path.basename(file))[0]
+
+
+def file_hash(file: str, block_size: int = 1 << 20):
+    """Hashes the content of a file
+
+    Args:
+        file (str): path of the file
+        block_size (int, optional): number of bytes read at a time. Defaults to 1 MiB.
+
+    Returns:
+        str: sha256 hex digest
+    """
+    digest = hashlib.sha256()
+    with open(file, "rb") as fh:
+        for block in iter(lambda: fh.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_manifest(path: str):
+    """Reads a manifest (pdf name -> sha256, mtime and size of the pdf when it was last extracted)
+
+    Args:
+        path (str): path of the manifest
+
+    Returns:
+        dict[str, dict]: manifest, empty if the file does not exist
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def write_manifest(path: str, manifest: dict[str, dict]):
+    """Writes a manifest next to its target and renames it over it, so an interrupted run never leaves a partial manifest
+
+    Args:
+        path (str): path of the manifest
+        manifest (dict[str, dict]): manifest
+
+    Returns:
+        None
+    """
+    with open(path + ".tmp", "w") as fh:
+        json.dump(manifest, fh, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def changed_pdfs(pdfs: list[str], manifest: dict[str, dict]):
+    """Finds the pdfs that changed since the manifest was written. A pdf with the same mtime and size is unchanged, otherwise its content is hashed, so touched but identical files are not extracted again
+
+    Args:
+        pdfs (list[str]): paths of the pdfs
+        manifest (dict[str, dict]): manifest of the previous run
+
+    Returns:
+        tuple[list[str], dict[str, dict]]: changed (or new) pdfs, and the manifest of the given pdfs after extracting them
+    """
+    changed: list[str] = []
+    updated: dict[str, dict] = {}
+    for file in pdfs:
+        name = os.path.basename(file)
+        stat = os.stat(file)
+        entry = manifest.get(name)
+        if entry is not None and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            updated[name] = entry
+            continue
+        digest = file_hash(file)
+        if entry is None or entry["sha256"] != digest:
+            changed.append(file)
+        updated[name] = {"sha256": digest, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    return changed, updated
+
+
+def extract_pdfs(pdfs: list[str], processes: int | None = None):
+    """Extracts pdfs in parallel, one pdf per task of a process pool
+
+    Args:
+        pdfs (list[str]): paths of the pdfs
+        processes (int | None, optional): number of worker processes. Defaults to None (one per core).
+
+    Yields:
+        tuple[str, list[tuple[str, int]]]: path and pages (see `extract_pages`) of each pdf, in the given order, as soon as it is extracted
+    """
+    if len(pdfs) == 0:
+        return
+    with ProcessPoolExecutor(processes) as pool:
+        yield from zip(pdfs, pool.map(extract_pages, pdfs))
+
+
+def clean(path: str, processes: int | None = None):
+    """Cleans the pdfs in a given folder into a pickle file (page-wise) per pdf, and saves it a folder with the same parent as the pdfs, but in a `pkl/` folder. PDFs are extracted in parallel and the ones unchanged since the last run (see the `manifest.json` in the pickle folder) are skipped
 
     Args:
         path (str):takes in the path to the folder with pdfs to be cleaned
+        processes (int | None, optional): number of worker processes. Defaults to None (one per core).
 
     Returns:
         None
@@ -20,15 +142,136 @@ def clean(path: str):
     path += "*.pdf"
     # Getting paths of all the pdfs in the folder into a list
     pdfs: list[str] = glob.glob(path)
-    for file in pdfs:
-        doc = fitz.open(file)
+    if len(pdfs) == 0:
+        return
+    pkl_folder = os.path.dirname(pdfs[0].replace("pdf", "pkl"))
+    os.makedirs(pkl_folder, exist_ok=True)
+    manifest_path = os.path.join(pkl_folder, "manifest.json")
+    changed, manifest = changed_pdfs(pdfs, read_manifest(manifest_path))
+    # a pdf whose pickle was deleted is extracted again, whatever the manifest says
+    changed_set = set(changed)
+    changed = [file for file in pdfs if file in changed_set or not os.path.exists(file.replace("pdf", "pkl"))]
+    for file, pages in extract_pdfs(changed, processes):
         doc_info = {}
-        doc_info["text"] = [(page.get_text(), i) for i, page in enumerate(doc)]
-        fh = open(file.replace("pdf", "pkl"), "wb")
-        pickle.dump(doc_info, fh)
+        doc_info["text"] = pages
+        with open(file.replace("pdf", "pkl"), "wb") as fh:
+            pickle.dump(doc_info, fh)
+    write_manifest(manifest_path, manifest)
+
+
+def _paragraph_rows(
+    extracted: Iterator[tuple[str, list[tuple[str, int]]]],
+    threshold: int = 100,
+    break_paragraph_at: int = 3000,
+):
+    """Splits the pages of the extracted pdfs into paragraphs as they come in
+
+    Args:
+        extracted (Iterator[tuple[str, list[tuple[str, int]]]]): path and pages of each pdf
+        threshold (int, optional): threshold for the length of the paragraph. Defaults to 100.
+        break_paragraph_at (int, optional): maximum length of a paragraph. Defaults to 3000.
+
+    Yields:
+        tuple[str, tuple[str, int, int, str]]: paragraph text, and its document name, page number, paragraph number and text (the context passed through the tokenizer)
+    """
+    for file, pages in extracted:
+        name = document_name(file)
+        for text, page_number in pages:
+            for paragraph_number, paragraph in enumerate(
+                split_paragraphs(text, threshold, break_paragraph_at)
+            ):
+                yield paragraph, (name, page_number, paragraph_number, paragraph)
+
+
+def _write_rows(fh, rows: dict[str, list], columns: list[str]):
+    """Appends the buffered rows to an open csv file (without a header) and empties the buffer
+
+    Args:
+        fh (TextIO): csv file
+        rows (dict[str, list]): values of each column
+        columns (list[str]): column order
+
+    Returns:
+        None
+    """
+    if len(rows[columns[0]]) == 0:
+        return
+    pd.DataFrame(rows, columns=columns).to_csv(fh, index=False, header=False)
+    for column in columns:
+        rows[column].clear()
+
+
+def ingest(
+    path: str,
+    csv_path: str,
+    nlp,
+    processes: int | None = None,
+    chunk_size: int = 10000,
+    batch_size: int = 256,
+    n_process: int = 1,
+):
+    """Turns a folder of pdfs into the tokenized csv `startup_engine` reads, without any intermediate pickle: pdfs are extracted in parallel by a process pool and their pages are streamed through paragraph splitting and the tokenizer (`tokenize_texts`) into the csv, in chunks. Only pdfs that changed since the last run (see the manifest next to the csv) are extracted and tokenized again, the rows of the others are kept from the previous csv and the rows of deleted pdfs are dropped
+
+    Args:
+        path (str): folder with the pdfs
+        csv_path (str): path of the tokenized csv
+        nlp (spacy.lang.en.English): spacy model used for lemmatizing
+        processes (int | None, optional): number of pdf extraction processes. Defaults to None (one per core).
+        chunk_size (int, optional): number of rows written at a time. Defaults to 10000.
+        batch_size (int, optional): number of paragraphs per `nlp.pipe` batch. Defaults to 256.
+        n_process (int, optional): number of tokenizer processes (-1 for one per core). Defaults to 1.
+
+    Returns:
+        list[str]: pdfs that were extracted
+    """
+    pdfs = sorted(glob.glob(os.path.join(path, "*.pdf")))
+    manifest_path = csv_path + ".manifest.json"
+    # without the previous csv there is nothing to keep, every pdf is extracted
+    manifest = read_manifest(manifest_path) if os.path.exists(csv_path) else {}
+    changed, updated = changed_pdfs(pdfs, manifest)
+    if len(changed) == 0 and manifest.keys() == updated.keys():
+        # only mtimes can have changed (touched files), recording them saves hashing those files again
+        if updated != manifest:
+            write_manifest(manifest_path, updated)
+        return []
+
+    columns = ["document_name", "page_number", "paragraph_number", "text", "tokenized"]
+    temp_path = csv_path + ".tmp"
+    with open(temp_path, "w", newline="") as fh:
+        pd.DataFrame(columns=columns).to_csv(fh, index=False)
+        if os.path.exists(csv_path):
+            # the rows of the unchanged pdfs are copied over from the previous csv a chunk at a time
+            unchanged = {document_name(file) for file in pdfs} - {document_name(file) for file in changed}
+            for previous in pd.read_csv(csv_path, dtype={"document_name": str}, chunksize=chunk_size):
+                kept = previous[previous["document_name"].isin(unchanged)]
+                kept.to_csv(fh, index=False, header=False, columns=columns)
+        rows: dict[str, list] = {column: [] for column in columns}
+        tokenized_rows = tokenize_texts(
+            _paragraph_rows(extract_pdfs(changed, processes)),
+            nlp,
+            batch_size=batch_size,
+            n_process=n_process,
+            as_tuples=True,
+        )
+        for tokenized, (name, page_number, paragraph_number, text) in tokenized_rows:
+            rows["document_name"].append(name)
+            rows["page_number"].append(page_number)
+            rows["paragraph_number"].append(paragraph_number)
+            rows["text"].append(text)
+            rows["tokenized"].append(tokenized)
+            if len(rows["document_name"]) == chunk_size:
+                _write_rows(fh, rows, columns)
+        _write_rows(fh, rows, columns)
+    os.replace(temp_path, csv_path)
+    write_manifest(manifest_path, updated)
+    return changed
 
 
 if __name__ == "__main__":
-    # works with the absolute path only for some reason
-    clean("./data/pdfs/Auto/")
-    clean("./data/pdfs/Property/")
+    # extracts the pdfs (one process per core) and tokenizes them straight into the csv files read by setup.py, unchanged pdfs are skipped
+    from model_registry import get_model
+
+    nlp = get_model("spacy")
+    os.makedirs("./data/tokenized", exist_ok=True)
+    ingest("./data/pdfs/Auto/", "./data/tokenized/auto.csv", nlp, n_process=-1)
+    ingest("./data/pdfs/Property/", "./data/tokenized/property.csv", nlp, n_process=-1)
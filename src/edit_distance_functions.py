@@ -3,82 +3,123 @@
 # License: GNU General Public License v3.0
 
 # importing libraries
-import numpy as np
-import sys
-from LinkedList import LinkedList
-import spacy
+from postings import PostingsList
+from term_dictionary import TermDictionary
+from spelling_index import SpellingIndex
+from autocomplete_index import AutocompleteIndex
 import lemminflect
 
-# loading the spacy model for lemmitization of queries
-nlp = spacy.load("en_core_web_sm")
 
-# setting recursion limit for functions on linked list
-sys.setrecursionlimit(10000)
-
-
-def levenshtein_distance(s1: str, s2: str, swapping_importance: bool = True):
+def levenshtein_distance(
+    s1: str, s2: str, swapping_importance: bool = True, max_distance: int | None = None
+):
     """Calculates the levenshtein distance between two strings
 
+    Uses the bit-parallel algorithm of Myers (with Hyyrö's extension for swapped adjacent characters): each column of the edit
+    distance table is kept as two bit vectors of vertical +1/-1 differences (python ints, one bit per character of `s1`), so a
+    character of `s2` costs a handful of integer operations instead of a loop over `s1`.
+
     Args:
         s1 (str): first string
         s2 (str): second string
         swapping_importance (bool, optional): Whether swapping two characters is more important than deleting or inserting a character. Defaults to True.
+        max_distance (int | None, optional): Stop as soon as the distance is known to be larger than this. Defaults to None (always compute the exact distance).
+
+    Returns:
+        int: levenshtein distance between the two strings (max_distance + 1 if it is larger than max_distance)
+    """
+    m, n = len(s1), len(s2)
+    if max_distance is not None and abs(m - n) > max_distance:
+        return max_distance + 1
+    if m == 0:
+        return n
+    # bit i of peq[c] is set if s1[i] == c
+    peq: dict[str, int] = {}
+    for i, character in enumerate(s1):
+        peq[character] = peq.get(character, 0) | (1 << i)
+    mask = (1 << m) - 1
+    last = 1 << (m - 1)
+    vp, vn = mask, 0
+    previous_d0, previous_pm = 0, 0
+    distance = m
+    for j, character in enumerate(s2):
+        pm = peq.get(character, 0)
+        d0 = ((((pm & vp) + vp) ^ vp) | pm | vn) & mask
+        if swapping_importance:
+            # diagonal zero two columns back, the characters swapped with the previous ones
+            d0 |= ((~previous_d0 & pm) << 1) & previous_pm
+        hp = (vn | ~(d0 | vp)) & mask
+        hn = d0 & vp
+        if hp & last:
+            distance += 1
+        elif hn & last:
+            distance -= 1
+        # the distance can go down by at most one per remaining character
+        if max_distance is not None and distance - (n - j - 1) > max_distance:
+            return max_distance + 1
+        x = (hp << 1) | 1
+        vn = x & d0
+        vp = ((hn << 1) | ~(x | d0)) & mask
+        previous_d0, previous_pm = d0, pm
+    return distance
+
+
+def correct_word(
+    word: str,
+    term_dictionary: TermDictionary,
+    inverted_list: dict[str, PostingsList],
+    spelling_index: SpellingIndex | None = None,
+    max_distance: int = 2,
+):
+    """Finds the word of the corpus closest to a misspelt word. Among words at the same distance, the one occurring in the most documents wins (then the first in sorted order)
+
+    The trigram index narrows the search down to a few candidates whose exact distance is computed (with an early exit once it goes over max_distance). Short words, for which trigrams cannot rule anything out, and words with nothing within max_distance are looked up with a trie walk instead.
+
+    Args:
+        word (str): misspelt word
+        term_dictionary (TermDictionary): trie of the words in the corpus
+        inverted_list (dict[str, PostingsList]): inverse index for each word in the corpus (document frequencies)
+        spelling_index (SpellingIndex | None, optional): trigram index of the words in the corpus. Defaults to None (trie walk only).
+        max_distance (int, optional): largest distance looked for through the trigram index. Defaults to 2.
 
     Returns:
-        int: levenshtein distance between the two strings
+        str: corrected word ("" if the corpus is empty)
     """
-    levenshtein = np.zeros((len(s1) + 1, len(s2) + 1), dtype=int)
-    for i in range(len(s1) + 1):
-        levenshtein[i, 0] = i
-    for j in range(len(s2) + 1):
-        levenshtein[0, j] = j
-    if not swapping_importance:
-        for i in range(1, len(s1) + 1):
-            for j in range(1, len(s2) + 1):
-                if s1[i - 1] == s2[j - 1]:
-                    levenshtein[i, j] = levenshtein[i - 1, j - 1]
-                else:
-                    levenshtein[i, j] = (
-                        min(
-                            levenshtein[i - 1, j - 1],
-                            levenshtein[i - 1, j],
-                            levenshtein[i, j - 1],
-                        )
-                        + 1
-                    )
-        return levenshtein[len(s1), len(s2)]
-    else:
-        for i in range(1, len(s1) + 1):
-            for j in range(1, len(s2) + 1):
-                if s1[i - 1] == s2[j - 1]:
-                    levenshtein[i, j] = levenshtein[i - 1, j - 1]
-                else:
-                    levenshtein[i, j] = (
-                        min(
-                            levenshtein[i - 1, j - 1],
-                            levenshtein[i - 1, j],
-                            levenshtein[i, j - 1],
-                        )
-                        + 1
-                    )
-                    if (
-                        i > 1
-                        and j > 1
-                        and s1[i - 1] == s2[j - 2]
-                        and s1[i - 2] == s2[j - 1]
-                    ):
-                        levenshtein[i, j] = min(
-                            levenshtein[i, j], levenshtein[i - 2, j - 2] + 1
-                        )
-        return levenshtein[len(s1), len(s2)]
-
-
-def spell_check_query(query: str, inverted_list: dict[str, LinkedList]):
-    """Spell checks the query and returns the corrected query
+    matches: list[tuple[int, str]] = []
+    if spelling_index is not None:
+        filter_distance = spelling_index.filter_distance(word, max_distance)
+        if filter_distance > 0:
+            for term_id in spelling_index.candidates(word, filter_distance):
+                term = term_dictionary[term_id]
+                distance = levenshtein_distance(word, term, max_distance=filter_distance)
+                if distance <= filter_distance:
+                    matches.append((distance, term))
+    if len(matches) == 0:
+        _, distance = term_dictionary.nearest(word)
+        if distance == -1:
+            return ""
+        matches = [(d, term) for term, d in term_dictionary.fuzzy(word, distance)]
+    best = min(distance for distance, _ in matches)
+    # candidates come in sorted order, so ties on frequency keep the first word
+    return max(
+        (term for distance, term in matches if distance == best),
+        key=lambda term: len(inverted_list[term]),
+    )
+
+
+def spell_check_query(
+    query: str,
+    term_dictionary: TermDictionary,
+    inverted_list: dict[str, PostingsList],
+    spelling_index: SpellingIndex | None = None,
+):
+    """Spell checks the query and returns the corrected query. Every misspelt word is replaced by the closest word of the corpus, the most frequent one among ties (see `correct_word`)
 
     Args:
         query (str): query string
-        inverted_list (dict[str, LinkedList]): inverse index for each word in the corpus
+        term_dictionary (TermDictionary): trie of the words in the corpus
+        inverted_list (dict[str, PostingsList]): inverse index for each word in the corpus
+        spelling_index (SpellingIndex | None, optional): trigram index of the words in the corpus. Defaults to None.
 
     Returns:
         str: corrected query string
@@ -86,54 +127,48 @@ def spell_check_query(query: str, inverted_list: dict[str, LinkedList]):
     query = query.replace('"', "")
     query = query.split()
     for i in range(len(query)):
-        if query[i] not in inverted_list:
-            min_dist = 100000
-            min_word = ""
-            for word in inverted_list:
-                dist = levenshtein_distance(query[i], word)
-                if dist < min_dist:
-                    min_dist = dist
-                    min_word = word
-            query[i] = min_word
+        if query[i] not in term_dictionary:
+            query[i] = correct_word(query[i], term_dictionary, inverted_list, spelling_index)
     return " ".join(query)
 
-def autocomplete_result(query: str, inverted_list: dict[str, LinkedList], max_results: int = 10):
+
+def autocomplete_result(
+    query: str,
+    inverted_list: dict[str, PostingsList],
+    term_dictionary: TermDictionary,
+    max_results: int = 10,
+    autocomplete_index: AutocompleteIndex | None = None,
+):
     """Returns the list of words that start with the query
 
     Args:
         query (str): query string
-        inverted_list (dict[str, LinkedList]): inverse index for each word in the corpus
+        inverted_list (dict[str, PostingsList]): inverse index for each word in the corpus
+        term_dictionary (TermDictionary): trie of the words in the corpus
         max_results (int, optional): maximum number of results to return. Defaults to 10.
+        autocomplete_index (AutocompleteIndex | None, optional): precomputed completions of every prefix, looked up instead of ranking the words below the prefix when it holds enough of them. Defaults to None.
 
     Returns:
         list: list of words that start with the query
     """
     last_word = query.split()[-1]
-    results = []
-    # inserting words in a sorted order in the results list based on their edit distance and frequency (length of linked list)
-    for word in inverted_list:
-        if word.startswith(last_word):
-            dist = levenshtein_distance(last_word, word)
-            i = 0
-            while i < len(results):
-                if (
-                    levenshtein_distance(last_word, results[i]) > dist
-                    or (
-                        levenshtein_distance(last_word, results[i]) == dist
-                        and len(inverted_list[results[i]]) < len(inverted_list[word])
-                    )
-                ):
-                    break
-                i += 1
-            results.insert(i, word)
+    previous = " ".join(query.split()[:-1])
+    if autocomplete_index is not None:
+        suggestions = autocomplete_index.complete(last_word, max_results)
+        if suggestions is not None:
+            return [previous + " " + word for word in suggestions]
+    # only the words below the prefix in the trie, sorted based on their edit distance and frequency (length of postings list)
+    candidates = [word for word, _ in term_dictionary.prefix(last_word)]
+    distances = {word: levenshtein_distance(last_word, word) for word in candidates}
+    results = sorted(
+        candidates, key=lambda word: (distances[word], -len(inverted_list[word]))
+    )
     inflected_results = []
     for i in range(len(results)):
-       possible_inflections: dict[str, tuple[str]] = lemminflect.getAllInflections(results[i])
-       for inflection in possible_inflections:
-           for word in possible_inflections[inflection]:
+        possible_inflections: dict[str, tuple[str]] = lemminflect.getAllInflections(results[i])
+        for inflection in possible_inflections:
+            for word in possible_inflections[inflection]:
                 if word not in inflected_results:
                     inflected_results.append(word)
-    including_previous = [" ".join(query.split()[:-1]) + " " + word for word in inflected_results[:max_results]]
+    including_previous = [previous + " " + word for word in inflected_results[:max_results]]
     return including_previous
-    
-    
\ No newline at end of file
@@ -0,0 +1,1079 @@
+# Copyright © 2023 Arunachala Amuda Murugan (@majimearun)
+#
+# License: GNU General Public License v3.0
+
+# importing libraries
+import io
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from array import array
+from collections.abc import Iterator, Mapping, Sequence
+from typing import BinaryIO
+import pandas as pd
+from postings import SKIP_INTERVAL, PostingsList
+from permuterm import PermutermIndex
+from term_dictionary import TermDictionary
+from spelling_index import SpellingIndex
+from autocomplete_index import AutocompleteIndex
+from query_analyzer import QueryAnalyzer
+
+# Segment file layout (integers in native byte order so the arrays can be mapped without copying, every section starts 8 byte aligned):
+#
+#   header:         magic (8s) | format version (H) | number of sections (H) | padding (4x)
+#   section table:  per section: name (8s) | offset (Q) | length (Q)
+#   sections:       "inverted", "grams" (term tables), "terms" (term dictionary trie), "complete" (autocomplete index), "lemmas" (query analyzer lemma table), "perm" (permuterm rotation array) and "docs" (doc store)
+#
+# A term table maps sorted (utf-8 byte order) keys to gap + varint encoded postings, their varint encoded term frequencies and,
+# if the table is positional, their gap + varint encoded token positions. Postings lists longer than SKIP_INTERVAL also get their skip table
+# (see `PostingsList.skips`): the skip table of term i is skip table[4 * skip offsets[i] : 4 * skip offsets[i+1]], its doc IDs followed by its byte offsets
+# in the postings, frequency and position blocks:
+#
+#   n_terms (I) | positional (I) | postings offsets (Q * n+1) | frequency offsets (Q * n+1) | position offsets (Q * n+1) | key offsets (I * n+1) | postings lengths (I * n) | last doc IDs (I * n) | max term frequencies (I * n) | skip offsets (I * n+1) | skip table (I * 4*skip_offsets[n]) | key pool | postings block | frequency block | position block
+#
+# The "grams" table is the spelling index, its keys are character trigrams and its postings hold term IDs of the "inverted" table.
+#
+# The term dictionary section holds the breadth first trie arrays (see `TermDictionary`), its term IDs are positions in the "inverted" table:
+#
+#   n_nodes (I) | n_terms (I) | first child (I * n_nodes+1) | labels (I * n_nodes) | parents (I * n_nodes) | node term IDs (i * n_nodes) | term nodes (I * n_terms)
+#
+# The autocomplete section holds the best completions of every trie node and the inflections of every word:
+#
+#   k (I) | n_nodes (I) | n_terms (I) | n_inflections (I) | completion offsets (I * n_nodes+1) | completions (I * offsets[n_nodes]) | inflection ranges (I * n_terms+1) | inflection offsets (I * n_inflections+1) | inflection pool
+#
+# The lemma table maps the words expected in queries, sorted in utf-8 byte order, to their lemmas (see `QueryAnalyzer`):
+#
+#   n_words (I) | padding (4x) | word offsets (I * n+1) | lemma offsets (I * n+1) | word pool | lemma pool
+#
+# The permuterm section holds the sorted rotation array, its term IDs point into the "inverted" table:
+#
+#   n_rotations (I) | padding (4x) | term IDs (I * n) | shifts (H * n)
+#
+# The doc store holds the document table column wise, document names are coded as name IDs:
+#
+#   n_docs (I) | n_names (I) | block size (I) | padding (4x) | text offsets (Q * n+1) | tokenized offsets (Q * n+1) | text block offsets (Q * n_blocks+1) | tokenized block offsets (Q * n_blocks+1) | norms (d * n) | page numbers (i * n) | paragraph numbers (i * n) | lengths (I * n) | name IDs (I * n) | name offsets (I * n_names+1) | name pool | text pool | tokenized pool
+#
+# With a block size of 0 the pools are plain utf-8 and there are no block offsets (n_blocks = -1). Otherwise the pools are made of zlib compressed blocks
+# of `block size` documents each (n_blocks = ceil(n / block size)), and the text offsets are positions in the decompressed pools.
+
+MAGIC = b"SEINDEX\x00"
+FORMAT_VERSION = 13
+
+# documents per compressed block of the doc store pools, a document is read by decompressing only its block
+TEXT_BLOCK_SIZE = 16
+
+_HEADER = struct.Struct("=8sHH4x")
+_SECTION = struct.Struct("=8sQQ")
+
+
+def _pad_file(f: BinaryIO, alignment: int = 8):
+    """Pads a file being written with zero bytes up to the next multiple of `alignment`
+
+    Args:
+        f (BinaryIO): file opened for writing
+        alignment (int, optional): alignment in bytes. Defaults to 8.
+
+    Returns:
+        None
+    """
+    f.write(bytes(-f.tell() % alignment))
+
+
+def _copy_block(source: BinaryIO, f: BinaryIO):
+    """Copies a block buffer (in memory or a temporary file) into the file being written
+
+    Args:
+        source (BinaryIO): block buffer
+        f (BinaryIO): file opened for writing
+
+    Returns:
+        None
+    """
+    source.seek(0)
+    shutil.copyfileobj(source, f)
+
+
+class TermTableWriter:
+    def __init__(self, positional: bool, directory: str | None = None):
+        """Writes a term table section (see the layout above) from (key, postings) pairs added in key order. The offsets and lengths (a few integers per key) are kept in memory, the key pool and the blocks go to buffers that are in memory, or temporary files when a directory is given, so tables larger than memory can be written (see `SpimiIndexer`)
+
+        Args:
+            positional (bool): whether the postings lists are positional (their positions are stored)
+            directory (str | None, optional): directory of the temporary block files. Defaults to None (blocks kept in memory).
+
+        Returns:
+            None
+        """
+        self.positional = positional
+        self.postings_offsets = array("Q", [0])
+        self.frequency_offsets = array("Q", [0])
+        self.position_offsets = array("Q", [0])
+        self.key_offsets = array("I", [0])
+        self.lengths = array("I")
+        self.lasts = array("I")
+        self.max_frequencies = array("I")
+        self.skip_offsets = array("I", [0])
+        self.skip_table = array("I")
+        # key pool, postings block, frequency block and position block
+        self._blocks: list[BinaryIO] = [
+            io.BytesIO() if directory is None else tempfile.TemporaryFile(dir=directory) for _ in range(4)
+        ]
+
+    def __len__(self):
+        """Number of keys added"""
+        return len(self.lengths)
+
+    def add(self, key: bytes, postings: PostingsList):
+        """Appends a key (larger than the previous one) and its postings list
+
+        Args:
+            key (bytes): utf-8 encoded key
+            postings (PostingsList): postings list of the key
+
+        Returns:
+            None
+        """
+        keys, block, frequency_block, position_block = self._blocks
+        self.key_offsets.append(self.key_offsets[-1] + keys.write(key))
+        self.postings_offsets.append(self.postings_offsets[-1] + block.write(postings.to_bytes()))
+        self.frequency_offsets.append(
+            self.frequency_offsets[-1] + frequency_block.write(postings.frequencies_to_bytes())
+        )
+        written = position_block.write(postings.positions_to_bytes()) if self.positional else 0
+        self.position_offsets.append(self.position_offsets[-1] + written)
+        self.lengths.append(len(postings))
+        self.lasts.append(postings.last)
+        self.max_frequencies.append(postings.max_frequency)
+        n_skips = 0
+        if len(postings) > SKIP_INTERVAL:
+            skips = postings.skips()
+            for part in skips:
+                self.skip_table.extend(part)
+            n_skips = len(skips[0])
+        self.skip_offsets.append(self.skip_offsets[-1] + n_skips)
+
+    def write_to(self, f: BinaryIO):
+        """Writes the section into a file
+
+        Args:
+            f (BinaryIO): file opened for writing
+
+        Returns:
+            None
+        """
+        f.write(struct.pack("=II", len(self), self.positional))
+        for part in (
+            self.postings_offsets,
+            self.frequency_offsets,
+            self.position_offsets,
+            self.key_offsets,
+            self.lengths,
+            self.lasts,
+            self.max_frequencies,
+            self.skip_offsets,
+            self.skip_table,
+        ):
+            f.write(part.tobytes())
+        for block in self._blocks:
+            _copy_block(block, f)
+
+    def close(self):
+        """Releases the block buffers (temporary files are removed)
+
+        Returns:
+            None
+        """
+        for block in self._blocks:
+            block.close()
+
+
+def _encode_term_table(entries: list[tuple[bytes, PostingsList]]):
+    """Encodes (key, postings) pairs sorted by key into a term table section (positional if all the postings lists are)
+
+    Args:
+        entries (list[tuple[bytes, PostingsList]]): utf-8 encoded keys and their postings, sorted by key
+
+    Returns:
+        bytearray: encoded term table
+    """
+    writer = TermTableWriter(all(postings.is_positional for _, postings in entries))
+    for key, postings in entries:
+        writer.add(key, postings)
+    f = io.BytesIO()
+    writer.write_to(f)
+    return bytearray(f.getbuffer())
+
+
+def _encode_term_dictionary(term_dictionary: TermDictionary):
+    """Encodes the trie arrays of a term dictionary into a term dictionary section
+
+    Args:
+        term_dictionary (TermDictionary): term dictionary whose term IDs are positions in the sorted vocabulary
+
+    Returns:
+        bytearray: encoded term dictionary section
+    """
+    section = bytearray(
+        struct.pack("=II", len(term_dictionary.labels), len(term_dictionary))
+    )
+    section += array("I", term_dictionary.first_child).tobytes()
+    section += array("I", term_dictionary.labels).tobytes()
+    section += array("I", term_dictionary.parents).tobytes()
+    section += array("i", term_dictionary.node_terms).tobytes()
+    section += array("I", term_dictionary.term_nodes).tobytes()
+    return section
+
+
+def _encode_autocomplete(autocomplete_index: AutocompleteIndex):
+    """Encodes the completions and inflections of an autocomplete index into an autocomplete section
+
+    Args:
+        autocomplete_index (AutocompleteIndex): autocomplete index over the term dictionary
+
+    Returns:
+        bytearray: encoded autocomplete section
+    """
+    ranges = array("I", [0])
+    inflection_offsets = array("I", [0])
+    pool = bytearray()
+    for inflections in autocomplete_index.inflections:
+        for word in inflections:
+            pool += word.encode("utf-8")
+            inflection_offsets.append(len(pool))
+        ranges.append(len(inflection_offsets) - 1)
+    section = bytearray(
+        struct.pack(
+            "=IIII",
+            autocomplete_index.k,
+            len(autocomplete_index.offsets) - 1,
+            len(ranges) - 1,
+            len(inflection_offsets) - 1,
+        )
+    )
+    section += array("I", autocomplete_index.offsets).tobytes()
+    section += array("I", autocomplete_index.completions).tobytes()
+    section += ranges.tobytes()
+    section += inflection_offsets.tobytes()
+    section += pool
+    return section
+
+
+def _encode_lemmas(lemmas: Mapping[str, str]):
+    """Encodes the lemma table of a query analyzer into a lemma section
+
+    Args:
+        lemmas (Mapping[str, str]): lemma of each word
+
+    Returns:
+        bytearray: encoded lemma section
+    """
+    word_offsets = array("I", [0])
+    lemma_offsets = array("I", [0])
+    words = bytearray()
+    pool = bytearray()
+    for word, lemma in sorted((word.encode("utf-8"), lemma.encode("utf-8")) for word, lemma in lemmas.items()):
+        words += word
+        word_offsets.append(len(words))
+        pool += lemma
+        lemma_offsets.append(len(pool))
+    section = bytearray(struct.pack("=I4x", len(word_offsets) - 1))
+    section += word_offsets.tobytes()
+    section += lemma_offsets.tobytes()
+    section += words
+    section += pool
+    return section
+
+
+def _encode_permuterm(perm_index: PermutermIndex):
+    """Encodes the sorted rotation array of a permuterm index into a permuterm section
+
+    Args:
+        perm_index (PermutermIndex): permuterm index whose term IDs are positions in the sorted vocabulary
+
+    Returns:
+        bytearray: encoded permuterm section
+    """
+    section = bytearray(struct.pack("=I4x", len(perm_index)))
+    section += array("I", perm_index.term_ids).tobytes()
+    section += array("H", perm_index.shifts).tobytes()
+    return section
+
+
+class DocStoreWriter:
+    def __init__(self, directory: str | None = None, compress: bool = False):
+        """Writes a doc store section (see the layout above) from documents added one at a time. The small columns are kept in memory, the text and tokenized text pools go to buffers that are in memory, or temporary files when a directory is given
+
+        Args:
+            directory (str | None, optional): directory of the temporary pool files. Defaults to None (pools kept in memory).
+            compress (bool, optional): whether to compress the pools in blocks of TEXT_BLOCK_SIZE documents. Defaults to False.
+
+        Returns:
+            None
+        """
+        self.names: dict[str, int] = {}
+        self.name_ids = array("I")
+        self.page_numbers = array("i")
+        self.paragraph_numbers = array("i")
+        self.lengths = array("I")
+        self.norms = array("d")
+        self.text_offsets = array("Q", [0])
+        self.tokenized_offsets = array("Q", [0])
+        self.block_size = TEXT_BLOCK_SIZE if compress else 0
+        self.text_blocks = array("Q", [0])
+        self.tokenized_blocks = array("Q", [0])
+        self._pools: list[BinaryIO] = [
+            io.BytesIO() if directory is None else tempfile.TemporaryFile(dir=directory) for _ in range(2)
+        ]
+        # text of the documents of the block being filled, compressed once the block is full
+        self._pending = [bytearray(), bytearray()]
+
+    def __len__(self):
+        """Number of documents added"""
+        return len(self.name_ids)
+
+    def add(
+        self,
+        document_name: str,
+        page_number: int,
+        paragraph_number: int,
+        length: int,
+        text: str | float,
+        tokenized: str | float,
+    ):
+        """Appends a document (its doc ID is the number of documents added before it)
+
+        Args:
+            document_name (str): document name
+            page_number (int): page number
+            paragraph_number (int): paragraph number
+            length (int): number of tokens
+            text (str | float): text, NaN for an empty paragraph (as read back from the csv)
+            tokenized (str | float): tokenized text, NaN if empty
+
+        Returns:
+            None
+        """
+        self.name_ids.append(self.names.setdefault(str(document_name), len(self.names)))
+        self.page_numbers.append(int(page_number))
+        self.paragraph_numbers.append(int(paragraph_number))
+        self.lengths.append(int(length))
+        for pool, pending, offsets, value in zip(
+            self._pools, self._pending, (self.text_offsets, self.tokenized_offsets), (text, tokenized)
+        ):
+            # empty paragraphs are read back from the csv as NaN
+            encoded = ("" if pd.isna(value) else str(value)).encode("utf-8")
+            offsets.append(offsets[-1] + len(encoded))
+            if self.block_size:
+                pending += encoded
+            else:
+                pool.write(encoded)
+        if self.block_size and len(self) % self.block_size == 0:
+            self._flush_blocks()
+
+    def _flush_blocks(self):
+        """Compresses the pending block of each pool into the pool
+
+        Returns:
+            None
+        """
+        for pool, pending, blocks in zip(self._pools, self._pending, (self.text_blocks, self.tokenized_blocks)):
+            blocks.append(blocks[-1] + pool.write(zlib.compress(pending)))
+            pending.clear()
+
+    def write_to(self, f: BinaryIO):
+        """Writes the section into a file. The norms have to be set first (one per document)
+
+        Args:
+            f (BinaryIO): file opened for writing
+
+        Returns:
+            None
+        """
+        if self.block_size and len(self.text_blocks) - 1 < -(-len(self) // self.block_size):
+            # last, partly filled block
+            self._flush_blocks()
+        name_offsets = array("I", [0])
+        name_pool = bytearray()
+        for name in self.names:
+            name_pool += name.encode("utf-8")
+            name_offsets.append(len(name_pool))
+        f.write(struct.pack("=III4x", len(self), len(self.names), self.block_size))
+        blocks = (self.text_blocks, self.tokenized_blocks) if self.block_size else ()
+        for part in (
+            self.text_offsets,
+            self.tokenized_offsets,
+            *blocks,
+            self.norms,
+            self.page_numbers,
+            self.paragraph_numbers,
+            self.lengths,
+            self.name_ids,
+            name_offsets,
+        ):
+            f.write(part.tobytes())
+        f.write(name_pool)
+        for pool in self._pools:
+            _copy_block(pool, f)
+
+    def close(self):
+        """Releases the pool buffers (temporary files are removed)
+
+        Returns:
+            None
+        """
+        for pool in self._pools:
+            pool.close()
+
+
+def _encode_doc_store(df: pd.DataFrame, compress: bool = False):
+    """Encodes the document table (document name, page number, paragraph number, length, norm, text and tokenized text of each row) into a doc store section
+
+    Args:
+        df (pd.DataFrame): dataframe containing the corpus, indexed 0..n-1
+        compress (bool, optional): whether to compress the text pools (see `DocStoreWriter`). Defaults to False.
+
+    Returns:
+        bytearray: encoded doc store
+    """
+    writer = DocStoreWriter(compress=compress)
+    for row in zip(df["document_name"], df["page_number"], df["paragraph_number"], df["length"], df["text"], df["tokenized"]):
+        writer.add(*row)
+    writer.norms = array("d", df["norm"].astype(float))
+    f = io.BytesIO()
+    writer.write_to(f)
+    return bytearray(f.getbuffer())
+
+
+class IndexWriter:
+    def __init__(self, path: str):
+        """Writes the indexes and document table of the engine into a single versioned segment file (see the layout above)
+
+        Args:
+            path (str): path of the segment file to be written
+
+        Returns:
+            None
+        """
+        self.path = path
+
+    def write(
+        self,
+        inverted_list: dict[str, PostingsList],
+        perm_index: PermutermIndex,
+        main_df: pd.DataFrame,
+        spelling_index: SpellingIndex | None = None,
+        autocomplete_index: AutocompleteIndex | None = None,
+        query_analyzer: QueryAnalyzer | None = None,
+        compress_text: bool = False,
+    ):
+        """Serializes the indexes and the document table. The file is written next to the target and renamed over it, so readers never see a partially written segment
+
+        Args:
+            inverted_list (dict[str, PostingsList]): inverted index for each word in the corpus
+            perm_index (PermutermIndex): permuterm index (sorted rotation array) of the words in the corpus
+            main_df (pd.DataFrame): dataframe containing the corpus
+            spelling_index (SpellingIndex | None, optional): trigram index of the words in the corpus, built from the term dictionary if not given (or built over other words). Defaults to None.
+            autocomplete_index (AutocompleteIndex | None, optional): completions of every prefix, built from the term dictionary if not given (or built over other words). Defaults to None.
+            query_analyzer (QueryAnalyzer | None, optional): query analyzer whose lemma table is saved. Defaults to None (empty table, every query word goes through the lemmatizer once).
+            compress_text (bool, optional): whether to compress the text of the documents (see `DocStoreWriter`). Defaults to False.
+
+        Returns:
+            None
+        """
+        # term IDs of the term dictionary and the permuterm index must be positions in the "inverted" table (utf-8 byte order is code point order)
+        terms = sorted(inverted_list)
+        if list(perm_index.terms) != terms:
+            perm_index = PermutermIndex(TermDictionary(terms))
+        term_dictionary = perm_index.terms
+        if not isinstance(term_dictionary, TermDictionary):
+            term_dictionary = TermDictionary(terms)
+        if spelling_index is None or spelling_index.terms is not perm_index.terms:
+            spelling_index = SpellingIndex(term_dictionary)
+        if autocomplete_index is None or autocomplete_index.term_dictionary is not perm_index.terms:
+            autocomplete_index = AutocompleteIndex.build(term_dictionary, inverted_list)
+
+        self.write_sections(
+            _encode_term_table(sorted((key.encode("utf-8"), inverted_list[key]) for key in inverted_list)),
+            _encode_doc_store(main_df, compress_text),
+            term_dictionary,
+            perm_index,
+            spelling_index,
+            autocomplete_index,
+            query_analyzer,
+        )
+
+    def write_sections(
+        self,
+        inverted: bytes | bytearray | memoryview | TermTableWriter,
+        documents: bytes | bytearray | memoryview | DocStoreWriter,
+        term_dictionary: TermDictionary,
+        perm_index: PermutermIndex,
+        spelling_index: SpellingIndex,
+        autocomplete_index: AutocompleteIndex,
+        query_analyzer: QueryAnalyzer | None = None,
+    ):
+        """Writes an already encoded inverted index and doc store, along with the indexes over the words, into the segment file. Sections are streamed into the file one after the other (the ones given as writers straight from their buffers), so the file is never assembled in memory. The file is written next to the target and renamed over it, so readers never see a partially written segment
+
+        Args:
+            inverted (bytes | bytearray | memoryview | TermTableWriter): encoded positional inverted index (term table)
+            documents (bytes | bytearray | memoryview | DocStoreWriter): encoded doc store
+            term_dictionary (TermDictionary): term dictionary of the keys of the inverted index (term IDs are positions in it)
+            perm_index (PermutermIndex): permuterm index over the term dictionary
+            spelling_index (SpellingIndex): trigram index over the term dictionary
+            autocomplete_index (AutocompleteIndex): completions over the term dictionary
+            query_analyzer (QueryAnalyzer | None, optional): query analyzer whose lemma table is saved. Defaults to None (empty table).
+
+        Returns:
+            None
+        """
+        sections = {
+            "inverted": inverted,
+            "grams": _encode_term_table(
+                sorted((gram.encode("utf-8"), spelling_index.grams[gram]) for gram in spelling_index.grams)
+            ),
+            "terms": _encode_term_dictionary(term_dictionary),
+            "complete": _encode_autocomplete(autocomplete_index),
+            "lemmas": _encode_lemmas(query_analyzer.lemmas if query_analyzer is not None else {}),
+            "perm": _encode_permuterm(perm_index),
+            "docs": documents,
+        }
+
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(sections)))
+            table_position = f.tell()
+            f.write(bytes(_SECTION.size * len(sections)))
+            _pad_file(f)
+            table = bytearray()
+            for name, section in sections.items():
+                offset = f.tell()
+                if isinstance(section, (bytes, bytearray, memoryview)):
+                    f.write(section)
+                else:
+                    section.write_to(f)
+                table += _SECTION.pack(name.encode("ascii"), offset, f.tell() - offset)
+                _pad_file(f)
+            f.seek(table_position)
+            f.write(table)
+        os.replace(temp_path, self.path)
+
+
+class TermTable(Mapping):
+    def __init__(self, buffer: memoryview, generation: tuple | None = None):
+        """Read only mapping from keys to postings lists over a term table section. Lookups binary search the sorted keys in place, nothing is decoded up front
+
+        Args:
+            buffer (memoryview): term table section
+            generation (tuple | None, optional): generation of the segment file the table was read from (see `IndexReader`). Defaults to None.
+
+        Returns:
+            None
+        """
+        self.generation = generation
+        n, positional = struct.unpack_from("=II", buffer, 0)
+        position = 8
+        self._n: int = n
+        self._positional = bool(positional)
+        self._postings_offsets = buffer[position : position + 8 * (n + 1)].cast("Q")
+        position += 8 * (n + 1)
+        self._frequency_offsets = buffer[position : position + 8 * (n + 1)].cast("Q")
+        position += 8 * (n + 1)
+        self._position_offsets = buffer[position : position + 8 * (n + 1)].cast("Q")
+        position += 8 * (n + 1)
+        self._key_offsets = buffer[position : position + 4 * (n + 1)].cast("I")
+        position += 4 * (n + 1)
+        self._lengths = buffer[position : position + 4 * n].cast("I")
+        position += 4 * n
+        self._lasts = buffer[position : position + 4 * n].cast("I")
+        position += 4 * n
+        self._max_frequencies = buffer[position : position + 4 * n].cast("I")
+        position += 4 * n
+        self._skip_offsets = buffer[position : position + 4 * (n + 1)].cast("I")
+        position += 4 * (n + 1)
+        self._skip_table = buffer[position : position + 16 * self._skip_offsets[n]].cast("I")
+        position += 16 * self._skip_offsets[n]
+        self._keys = buffer[position : position + self._key_offsets[n]]
+        position += self._key_offsets[n]
+        self._postings = buffer[position : position + self._postings_offsets[n]]
+        position += self._postings_offsets[n]
+        self._frequencies = buffer[position : position + self._frequency_offsets[n]]
+        position += self._frequency_offsets[n]
+        self._positions = buffer[position : position + self._position_offsets[n]]
+
+    def key_at(self, i: int):
+        """Key stored at the given position (term ID)
+
+        Args:
+            i (int): position of the key in the sorted key order
+
+        Returns:
+            str: key at the given position
+        """
+        return str(self._keys[self._key_offsets[i] : self._key_offsets[i + 1]], "utf-8")
+
+    def postings_at(self, i: int):
+        """Postings list stored at the given position (term ID)
+
+        Args:
+            i (int): position of the key in the sorted key order
+
+        Returns:
+            PostingsList: postings list backed by the mapped file
+        """
+        start, end = self._skip_offsets[i], self._skip_offsets[i + 1]
+        n_skips = end - start
+        skips = (
+            tuple(self._skip_table[4 * start + j * n_skips : 4 * start + (j + 1) * n_skips] for j in range(4))
+            if n_skips
+            else None
+        )
+        return PostingsList.from_bytes(
+            self._postings[self._postings_offsets[i] : self._postings_offsets[i + 1]],
+            self._frequencies[self._frequency_offsets[i] : self._frequency_offsets[i + 1]],
+            self._lengths[i],
+            self._lasts[i],
+            self._max_frequencies[i],
+            self._positions[self._position_offsets[i] : self._position_offsets[i + 1]]
+            if self._positional
+            else None,
+            skips,
+        )
+
+    def find(self, key: str):
+        """Finds the position (term ID) of a key
+
+        Args:
+            key (str): key to be searched for
+
+        Returns:
+            int: position of the key, -1 if the key is not present
+        """
+        target = key.encode("utf-8")
+        lo, hi = 0, self._n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if bytes(self._keys[self._key_offsets[mid] : self._key_offsets[mid + 1]]) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._n and self._keys[self._key_offsets[lo] : self._key_offsets[lo + 1]] == target:
+            return lo
+        return -1
+
+    def __getitem__(self, key: str):
+        """Postings list of a key
+
+        Raises:
+            KeyError: if the key is not present
+
+        Returns:
+            PostingsList: postings list backed by the mapped file
+        """
+        i = self.find(key)
+        if i == -1:
+            raise KeyError(key)
+        return self.postings_at(i)
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterates over the keys in sorted order
+
+        Yields:
+            str: key
+        """
+        for i in range(self._n):
+            yield self.key_at(i)
+
+    def __len__(self):
+        """Number of entries in the table"""
+        return self._n
+
+
+class InflectionTable(Sequence):
+    def __init__(self, ranges: memoryview, offsets: memoryview, pool: memoryview):
+        """Read only sequence (term ID -> inflections) over the inflections stored in an autocomplete section
+
+        Args:
+            ranges (memoryview): first inflection of each term ID (plus one past the last)
+            offsets (memoryview): end of each inflection in the pool (after a leading 0)
+            pool (memoryview): utf-8 encoded inflections
+
+        Returns:
+            None
+        """
+        self._ranges = ranges
+        self._offsets = offsets
+        self._pool = pool
+
+    def __getitem__(self, term_id: int):
+        """Inflections of the word with the given term ID
+
+        Returns:
+            tuple[str, ...]: inflections
+        """
+        return tuple(
+            str(self._pool[self._offsets[i] : self._offsets[i + 1]], "utf-8")
+            for i in range(self._ranges[term_id], self._ranges[term_id + 1])
+        )
+
+    def __len__(self):
+        """Number of words"""
+        return len(self._ranges) - 1
+
+
+class LemmaTable(Mapping):
+    def __init__(self, buffer: memoryview):
+        """Read only mapping (word -> lemma) over a lemma section. Lookups binary search the sorted words in place
+
+        Args:
+            buffer (memoryview): lemma section
+
+        Returns:
+            None
+        """
+        (n,) = struct.unpack_from("=I", buffer, 0)
+        position = 8
+        self._n: int = n
+        self._word_offsets = buffer[position : position + 4 * (n + 1)].cast("I")
+        position += 4 * (n + 1)
+        self._lemma_offsets = buffer[position : position + 4 * (n + 1)].cast("I")
+        position += 4 * (n + 1)
+        self._words = buffer[position : position + self._word_offsets[n]]
+        position += self._word_offsets[n]
+        self._lemmas = buffer[position : position + self._lemma_offsets[n]]
+
+    def _word_at(self, i: int):
+        """utf-8 encoded word stored at the given position"""
+        return bytes(self._words[self._word_offsets[i] : self._word_offsets[i + 1]])
+
+    def __getitem__(self, word: str):
+        """Lemma of a word
+
+        Raises:
+            KeyError: if the word is not in the table
+
+        Returns:
+            str: lemma
+        """
+        target = word.encode("utf-8")
+        lo, hi = 0, self._n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._word_at(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self._n or self._word_at(lo) != target:
+            raise KeyError(word)
+        return str(self._lemmas[self._lemma_offsets[lo] : self._lemma_offsets[lo + 1]], "utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterates over the words in sorted order
+
+        Yields:
+            str: word
+        """
+        for i in range(self._n):
+            yield str(self._word_at(i), "utf-8")
+
+    def __len__(self):
+        """Number of words in the table"""
+        return self._n
+
+
+class DocumentTable:
+    def __init__(self, buffer: memoryview):
+        """Read only, column wise access to the document table over a doc store section. Every column is an array indexed by doc ID, so any document is read in constant time without building a dataframe (only its block is decompressed when the text is compressed)
+
+        Args:
+            buffer (memoryview): doc store section
+
+        Returns:
+            None
+        """
+        n, n_names, block_size = struct.unpack_from("=III4x", buffer, 0)
+        position = 16
+        self._n: int = n
+        self.block_size: int = block_size
+        self._text_offsets = buffer[position : position + 8 * (n + 1)].cast("Q")
+        position += 8 * (n + 1)
+        self._tokenized_offsets = buffer[position : position + 8 * (n + 1)].cast("Q")
+        position += 8 * (n + 1)
+        if block_size:
+            n_blocks = -(-n // block_size)
+            self._text_blocks = buffer[position : position + 8 * (n_blocks + 1)].cast("Q")
+            position += 8 * (n_blocks + 1)
+            self._tokenized_blocks = buffer[position : position + 8 * (n_blocks + 1)].cast("Q")
+            position += 8 * (n_blocks + 1)
+            text_length, tokenized_length = self._text_blocks[n_blocks], self._tokenized_blocks[n_blocks]
+        else:
+            self._text_blocks = self._tokenized_blocks = None
+            text_length, tokenized_length = self._text_offsets[n], self._tokenized_offsets[n]
+        self.norms = buffer[position : position + 8 * n].cast("d")
+        position += 8 * n
+        self.page_numbers = buffer[position : position + 4 * n].cast("i")
+        position += 4 * n
+        self.paragraph_numbers = buffer[position : position + 4 * n].cast("i")
+        position += 4 * n
+        self.lengths = buffer[position : position + 4 * n].cast("I")
+        position += 4 * n
+        self.name_ids = buffer[position : position + 4 * n].cast("I")
+        position += 4 * n
+        name_offsets = buffer[position : position + 4 * (n_names + 1)].cast("I")
+        position += 4 * (n_names + 1)
+        name_pool = buffer[position : position + name_offsets[n_names]]
+        position += name_offsets[n_names]
+        # the handful of document names are small enough to decode eagerly
+        self.names: list[str] = [
+            str(name_pool[name_offsets[i] : name_offsets[i + 1]], "utf-8")
+            for i in range(n_names)
+        ]
+        self._text = buffer[position : position + text_length]
+        position += text_length
+        self._tokenized = buffer[position : position + tokenized_length]
+        # last decompressed block of each pool, results are usually read in runs from the same few blocks
+        self._blocks: dict[int, tuple[int, bytes]] = {}
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, compress: bool = False):
+        """Builds an in memory document table from the dataframe of an engine built with `startup_engine`, so searches over it do not go through pandas either
+
+        Args:
+            df (pd.DataFrame): dataframe containing the corpus, with the `length` and `norm` columns computed while building the index
+            compress (bool, optional): whether to compress the text pools. Defaults to False.
+
+        Returns:
+            DocumentTable: document table
+        """
+        return cls(memoryview(_encode_doc_store(df.reset_index(drop=True), compress)))
+
+    def __len__(self):
+        """Number of entries in the table"""
+        return self._n
+
+    def _read(self, pool: memoryview, offsets: memoryview, blocks: memoryview | None, doc_id: int):
+        """Decoded text of a document in one of the pools
+
+        Args:
+            pool (memoryview): text or tokenized text pool
+            offsets (memoryview): offsets of the documents in the (decompressed) pool
+            blocks (memoryview | None): offsets of the compressed blocks in the pool, None if it is not compressed
+            doc_id (int): doc ID
+
+        Returns:
+            str: text of the document
+        """
+        start, end = offsets[doc_id], offsets[doc_id + 1]
+        if blocks is None:
+            return str(pool[start:end], "utf-8")
+        block = doc_id // self.block_size
+        cached = self._blocks.get(id(pool))
+        if cached is None or cached[0] != block:
+            cached = (block, zlib.decompress(pool[blocks[block] : blocks[block + 1]]))
+            self._blocks[id(pool)] = cached
+        base = offsets[block * self.block_size]
+        return str(cached[1][start - base : end - base], "utf-8")
+
+    def document_name(self, doc_id: int):
+        """Name of the pdf a document (paragraph) comes from
+
+        Args:
+            doc_id (int): doc ID
+
+        Returns:
+            str: document name
+        """
+        return self.names[self.name_ids[doc_id]]
+
+    def page_number(self, doc_id: int):
+        """Page number (0 indexed) of a document
+
+        Args:
+            doc_id (int): doc ID
+
+        Returns:
+            int: page number
+        """
+        return self.page_numbers[doc_id]
+
+    def paragraph_number(self, doc_id: int):
+        """Paragraph number (0 indexed) of a document in its page
+
+        Args:
+            doc_id (int): doc ID
+
+        Returns:
+            int: paragraph number
+        """
+        return self.paragraph_numbers[doc_id]
+
+    def text(self, doc_id: int):
+        """Raw text of a document (paragraph)
+
+        Args:
+            doc_id (int): doc ID
+
+        Returns:
+            str: raw text
+        """
+        return self._read(self._text, self._text_offsets, self._text_blocks, doc_id)
+
+    def tokenized(self, doc_id: int):
+        """Tokenized (lemmatized) text of a document (paragraph)
+
+        Args:
+            doc_id (int): doc ID
+
+        Returns:
+            str: tokenized text
+        """
+        return self._read(self._tokenized, self._tokenized_offsets, self._tokenized_blocks, doc_id)
+
+    def to_dataframe(self, doc_ids: Sequence[int] | None = None):
+        """Materializes the document table (or some of its documents) as a dataframe, e.g. to rebuild indexes from it
+
+        Args:
+            doc_ids (Sequence[int] | None, optional): doc IDs of the documents, in the order of the rows. Defaults to None (every document).
+
+        Returns:
+            pd.DataFrame: dataframe with the document name, page number, paragraph number, text, tokenized text, length and norm of each document, indexed 0..len(doc_ids)-1
+        """
+        if doc_ids is None:
+            doc_ids = range(self._n)
+        return pd.DataFrame(
+            {
+                "document_name": [self.document_name(i) for i in doc_ids],
+                "page_number": [self.page_numbers[i] for i in doc_ids],
+                "paragraph_number": [self.paragraph_numbers[i] for i in doc_ids],
+                "text": [self.text(i) for i in doc_ids],
+                "tokenized": [self.tokenized(i) for i in doc_ids],
+                "length": [self.lengths[i] for i in doc_ids],
+                "norm": [self.norms[i] for i in doc_ids],
+            }
+        )
+
+
+class IndexReader:
+    def __init__(self, path: str):
+        """Opens a segment file written by `IndexWriter`. The file is memory mapped (read only) and only the header is parsed, sections are decoded lazily on access, so processes opening the same file share the page cache
+
+        Args:
+            path (str): path of the segment file
+
+        Raises:
+            ValueError: if the file is not a segment file or was written in an unsupported format version
+
+        Returns:
+            None
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            stat = os.fstat(f.fileno())
+        # a rewritten segment replaces the file (see `IndexWriter`), so this changes whenever the index does
+        self.generation: tuple = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        buffer = memoryview(self._mmap)
+        magic, version, n_sections = _HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a search engine index segment")
+        if version != FORMAT_VERSION:
+            raise ValueError(
+                f"{path} has index format version {version}, expected {FORMAT_VERSION}. Rebuild the index"
+            )
+        self._sections: dict[str, memoryview] = {}
+        for i in range(n_sections):
+            name, offset, length = _SECTION.unpack_from(buffer, _HEADER.size + i * _SECTION.size)
+            self._sections[name.rstrip(b"\x00").decode("ascii")] = buffer[offset : offset + length]
+        self._tables: dict[str, TermTable] = {}
+        self._term_dictionary: TermDictionary | None = None
+        self._documents: DocumentTable | None = None
+
+    def _table(self, name: str):
+        """Term table section with the given name, parsed on first access
+
+        Args:
+            name (str): section name
+
+        Returns:
+            TermTable: term table over the section
+        """
+        if name not in self._tables:
+            self._tables[name] = TermTable(self._sections[name], self.generation)
+        return self._tables[name]
+
+    @property
+    def inverted_list(self):
+        """Inverted index for each word in the corpus (TermTable)"""
+        return self._table("inverted")
+
+    @property
+    def term_dictionary(self):
+        """Term dictionary (TermDictionary) over the mapped trie arrays"""
+        if self._term_dictionary is None:
+            buffer = self._sections["terms"]
+            n, n_terms = struct.unpack_from("=II", buffer, 0)
+            position = 8
+            columns = []
+            for typecode, length in (("I", n + 1), ("I", n), ("I", n), ("i", n), ("I", n_terms)):
+                columns.append(buffer[position : position + 4 * length].cast(typecode))
+                position += 4 * length
+            self._term_dictionary = TermDictionary((), *columns)
+        return self._term_dictionary
+
+    @property
+    def spelling_index(self):
+        """Spelling index (SpellingIndex) over the mapped trigram table"""
+        return SpellingIndex(self.term_dictionary, self._table("grams"))
+
+    @property
+    def autocomplete_index(self):
+        """Autocomplete index (AutocompleteIndex) over the mapped completions and inflections"""
+        buffer = self._sections["complete"]
+        k, n_nodes, n_terms, n_inflections = struct.unpack_from("=IIII", buffer, 0)
+        position = 16
+        offsets = buffer[position : position + 4 * (n_nodes + 1)].cast("I")
+        position += 4 * (n_nodes + 1)
+        completions = buffer[position : position + 4 * offsets[n_nodes]].cast("I")
+        position += 4 * offsets[n_nodes]
+        ranges = buffer[position : position + 4 * (n_terms + 1)].cast("I")
+        position += 4 * (n_terms + 1)
+        inflection_offsets = buffer[position : position + 4 * (n_inflections + 1)].cast("I")
+        position += 4 * (n_inflections + 1)
+        pool = buffer[position : position + inflection_offsets[n_inflections]]
+        return AutocompleteIndex(
+            self.term_dictionary,
+            InflectionTable(ranges, inflection_offsets, pool),
+            offsets,
+            completions,
+            k,
+        )
+
+    @property
+    def query_analyzer(self):
+        """Query analyzer (QueryAnalyzer) over the mapped lemma table"""
+        return QueryAnalyzer(LemmaTable(self._sections["lemmas"]))
+
+    @property
+    def perm_index(self):
+        """Permuterm index (PermutermIndex) over the mapped rotation array"""
+        buffer = self._sections["perm"]
+        (n,) = struct.unpack_from("=I", buffer, 0)
+        return PermutermIndex(
+            self.term_dictionary,
+            buffer[8 : 8 + 4 * n].cast("I"),
+            buffer[8 + 4 * n : 8 + 6 * n].cast("H"),
+        )
+
+    @property
+    def corpus(self):
+        """Sorted words of the corpus (the term dictionary)"""
+        return self.term_dictionary
+
+    @property
+    def documents(self):
+        """Document table (DocumentTable)"""
+        if self._documents is None:
+            self._documents = DocumentTable(self._sections["docs"])
+        return self._documents
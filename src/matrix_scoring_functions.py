@@ -0,0 +1,229 @@
+# Copyright © 2023 Arunachala Amuda Murugan (@majimearun)
+#
+# License: GNU General Public License v3.0
+
+# importing libraries
+import numpy as np
+from collections import Counter
+from scipy import sparse
+from postings import PostingsList
+from permuterm import PermutermIndex
+from scoring_functions import get_scoring_words
+from query_analyzer import QueryAnalyzer
+from scorers import tfidf
+
+
+class TfidfMatrix:
+    def __init__(self, matrix: sparse.csr_matrix, terms: list[str]):
+        """Document-term matrix (CSR, one row per document and one column per word) with the tf*idf weighting of `scorers.tfidf` already applied, so scoring a query is a single sparse matrix-vector product
+
+        Args:
+            matrix (sparse.csr_matrix): weighted document-term matrix
+            terms (list[str]): word of each column
+
+        Returns:
+            None
+        """
+        self.matrix = matrix
+        self.terms = terms
+        self.term_ids: dict[str, int] = {term: i for i, term in enumerate(terms)}
+
+    @classmethod
+    def from_inverted_list(cls, inverted_list: dict[str, PostingsList], ndocs: int):
+        """Builds the weighted document-term matrix from the term frequencies stored in the inverted index
+
+        Args:
+            inverted_list (dict[str, PostingsList]): inverted index (with term frequencies) for each word in the corpus
+            ndocs (int): total number of documents in the corpus
+
+        Returns:
+            TfidfMatrix: weighted document-term matrix
+        """
+        terms = sorted(inverted_list)
+        rows: list[np.ndarray] = []
+        columns: list[np.ndarray] = []
+        weights: list[np.ndarray] = []
+        for term_id, term in enumerate(terms):
+            postings = inverted_list[term]
+            doc_ids = np.frombuffer(postings.to_array(), dtype=np.uint32)
+            tf = np.fromiter(postings.frequencies(), dtype=np.float64, count=len(postings))
+            _df = len(postings)
+            weights.append(tfidf(tf, _df, ndocs))
+            rows.append(doc_ids)
+            columns.append(np.full(len(doc_ids), term_id, dtype=np.uint32))
+        matrix = sparse.csr_matrix(
+            (
+                np.concatenate(weights) if weights else np.zeros(0),
+                (
+                    np.concatenate(rows) if rows else np.zeros(0, dtype=np.uint32),
+                    np.concatenate(columns) if columns else np.zeros(0, dtype=np.uint32),
+                ),
+            ),
+            shape=(ndocs, len(terms)),
+        )
+        return cls(matrix, terms)
+
+    def save(self, path: str):
+        """Saves the matrix and its column words into a single `.npz` file
+
+        Args:
+            path (str): path of the file to be written
+
+        Returns:
+            None
+        """
+        np.savez(
+            path,
+            data=self.matrix.data,
+            indices=self.matrix.indices,
+            indptr=self.matrix.indptr,
+            shape=np.array(self.matrix.shape),
+            terms=np.array(self.terms, dtype=str),
+        )
+
+    @classmethod
+    def load(cls, path: str):
+        """Loads a matrix written by `save`
+
+        Args:
+            path (str): path of the `.npz` file
+
+        Returns:
+            TfidfMatrix: weighted document-term matrix
+        """
+        with np.load(path) as f:
+            matrix = sparse.csr_matrix(
+                (f["data"], f["indices"], f["indptr"]), shape=tuple(f["shape"])
+            )
+            terms = f["terms"].tolist()
+        return cls(matrix, terms)
+
+    def query_vector(
+        self,
+        queries: list[str],
+        inverted_list: dict[str, PostingsList],
+        perm_index: PermutermIndex,
+        analyzer: QueryAnalyzer | None = None,
+    ):
+        """Turns the query words (lemmatized, wildcards expanded) into a column vector with the number of query words matching each word of the corpus
+
+        Args:
+            queries (list[str]): list of query words
+            inverted_list (dict[str, PostingsList]): inverted index for each word in the corpus
+            perm_index (PermutermIndex): permuterm index (sorted rotation array) of the words in the corpus
+            analyzer (QueryAnalyzer | None, optional): query analyzer lemmatizing the query words. Defaults to None (shared analyzer without a lemma table).
+
+        Returns:
+            sparse.csr_matrix: (number of words x 1) query vector
+        """
+        counts = Counter(
+            word
+            for word in get_scoring_words(queries, inverted_list, perm_index, analyzer)
+            if word in self.term_ids
+        )
+        return sparse.csr_matrix(
+            (
+                np.fromiter(counts.values(), dtype=np.float64, count=len(counts)),
+                (
+                    np.fromiter((self.term_ids[word] for word in counts), dtype=np.int64, count=len(counts)),
+                    np.zeros(len(counts), dtype=np.int64),
+                ),
+            ),
+            shape=(len(self.terms), 1),
+        )
+
+    def score(
+        self,
+        queries: list[str],
+        inverted_list: dict[str, PostingsList],
+        perm_index: PermutermIndex,
+        candidates: list[int] | None = None,
+        k: int | None = None,
+        analyzer: QueryAnalyzer | None = None,
+    ):
+        """Scores a query with one sparse matrix-vector product over the rows of the candidate documents. Gives the same scores as `scoring_functions.get_top_k_scores`
+
+        Args:
+            queries (list[str]): list of query words
+            inverted_list (dict[str, PostingsList]): inverted index for each word in the corpus
+            perm_index (PermutermIndex): permuterm index (sorted rotation array) of the words in the corpus
+            candidates (list[int] | None, optional): documents allowed in the results (e.g. the boolean filter results). Defaults to None (all documents).
+            k (int | None, optional): number of results to be returned. Defaults to None (all matching documents).
+            analyzer (QueryAnalyzer | None, optional): query analyzer lemmatizing the query words. Defaults to None (shared analyzer without a lemma table).
+
+        Returns:
+            list[tuple[int, float]]: sorted (descending based on score) list of tuples containing document id and tf*idf score
+        """
+        query = self.query_vector(queries, inverted_list, perm_index, analyzer)
+        if candidates is None:
+            doc_ids = np.arange(self.matrix.shape[0])
+            scores = (self.matrix @ query).toarray().ravel()
+        else:
+            doc_ids = np.asarray(candidates, dtype=np.int64)
+            scores = (self.matrix[doc_ids] @ query).toarray().ravel()
+        return _top_k(doc_ids, scores, k)
+
+    def score_batch(
+        self,
+        queries_list: list[list[str]],
+        inverted_list: dict[str, PostingsList],
+        perm_index: PermutermIndex,
+        k: int | None = None,
+        analyzer: QueryAnalyzer | None = None,
+    ):
+        """Scores many queries at once with a single sparse matrix-matrix product (one column per query), e.g. for batch evaluation
+
+        Args:
+            queries_list (list[list[str]]): list of queries, each a list of query words
+            inverted_list (dict[str, PostingsList]): inverted index for each word in the corpus
+            perm_index (PermutermIndex): permuterm index (sorted rotation array) of the words in the corpus
+            k (int | None, optional): number of results to be returned per query. Defaults to None (all matching documents).
+            analyzer (QueryAnalyzer | None, optional): query analyzer lemmatizing the query words. Defaults to None (shared analyzer without a lemma table).
+
+        Returns:
+            list[list[tuple[int, float]]]: for each query, sorted (descending based on score) list of tuples containing document id and tf*idf score
+        """
+        if len(queries_list) == 0:
+            return []
+        queries = sparse.hstack(
+            [
+                self.query_vector(queries, inverted_list, perm_index, analyzer)
+                for queries in queries_list
+            ],
+            format="csc",
+        )
+        # (number of documents x number of queries), kept sparse as most documents match none of the words
+        scores = (self.matrix @ queries).tocsc()
+        results: list[list[tuple[int, float]]] = []
+        for i in range(scores.shape[1]):
+            start, end = scores.indptr[i], scores.indptr[i + 1]
+            results.append(_top_k(scores.indices[start:end], scores.data[start:end], k))
+        return results
+
+
+def _top_k(doc_ids: np.ndarray, scores: np.ndarray, k: int | None):
+    """Picks the k best scoring documents (ignoring documents scoring 0, which contain none of the query words)
+
+    Args:
+        doc_ids (np.ndarray): document ids
+        scores (np.ndarray): score of each document
+        k (int | None): number of results to be returned, None for all
+
+    Returns:
+        list[tuple[int, float]]: sorted (descending based on score, then ascending on document id) list of tuples containing document id and score
+    """
+    matching = scores > 0
+    doc_ids = doc_ids[matching]
+    scores = scores[matching]
+    if k is not None and k < len(scores):
+        if k <= 0:
+            return []
+        # partition first so only the k best (and anything tied with the k-th) are sorted
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        keep = scores >= kth
+        doc_ids = doc_ids[keep]
+        scores = scores[keep]
+    order = np.lexsort((doc_ids, -scores))
+    if k is not None:
+        order = order[:k]
+    return [(int(doc_ids[i]), float(scores[i])) for i in order]
@@ -0,0 +1,141 @@
+# Copyright © 2023 Arunachala Amuda Murugan (@majimearun)
+#
+# License: GNU General Public License v3.0
+
+# importing libraries
+import heapq
+from bisect import bisect_left
+from typing import Iterable, Sequence
+from postings import DecodedPostingsList, PostingsList
+
+
+def _as_sequence(postings: Sequence[int] | PostingsList):
+    """Gives random access to a sorted postings list (decoding it if it is compressed)
+
+    Args:
+        postings (Sequence[int] | PostingsList): sorted postings list
+
+    Returns:
+        Sequence[int]: sorted doc IDs supporting indexing
+    """
+    if isinstance(postings, PostingsList):
+        return postings.to_array()
+    return postings
+
+
+def gallop_to(postings: Sequence[int], target: int, lo: int = 0):
+    """Finds the first position at or after `lo` holding a doc ID >= target, by doubling the step size (skip) until the target is passed and then binary searching the last skip
+
+    Args:
+        postings (Sequence[int]): sorted doc IDs
+        target (int): doc ID to be searched for
+        lo (int, optional): position to start searching from. Defaults to 0.
+
+    Returns:
+        int: position of the first doc ID >= target (len(postings) if there is none)
+    """
+    n = len(postings)
+    step = 1
+    hi = lo
+    while hi < n and postings[hi] < target:
+        lo = hi + 1
+        hi += step
+        step *= 2
+    return bisect_left(postings, target, lo, min(hi, n))
+
+
+def intersect_two(shorter: Sequence[int], longer: Sequence[int]):
+    """Intersects two sorted postings lists by walking the shorter one and galloping through the longer one
+
+    Args:
+        shorter (Sequence[int]): sorted doc IDs (ideally the shorter list)
+        longer (Sequence[int]): sorted doc IDs (ideally the longer list)
+
+    Returns:
+        list[int]: sorted doc IDs present in both lists
+    """
+    result: list[int] = []
+    position = 0
+    n = len(longer)
+    for doc_id in shorter:
+        position = gallop_to(longer, doc_id, position)
+        if position == n:
+            break
+        if longer[position] == doc_id:
+            result.append(doc_id)
+            position += 1
+    return result
+
+
+def intersect_skipping(shorter: Sequence[int], longer: PostingsList):
+    """Intersects a sorted postings list with an encoded one by galloping over the skip table of the encoded list, so only the blocks a doc ID of the shorter list falls into are decoded
+
+    Args:
+        shorter (Sequence[int]): sorted doc IDs (ideally the shorter list)
+        longer (PostingsList): sorted encoded postings list (ideally the longer list)
+
+    Returns:
+        list[int]: sorted doc IDs present in both lists
+    """
+    skip_doc_ids = longer.skips()[0]
+    result: list[int] = []
+    block = -1
+    decoded: Sequence[int] = ()
+    position = 0
+    for doc_id in shorter:
+        if doc_id > longer.last:
+            break
+        # last block starting after a doc ID smaller than doc_id
+        current = max(gallop_to(skip_doc_ids, doc_id, max(block, 0)) - 1, 0)
+        if current != block:
+            block = current
+            decoded = longer.decode_block(block)
+            position = 0
+        position = gallop_to(decoded, doc_id, position)
+        if position < len(decoded) and decoded[position] == doc_id:
+            result.append(doc_id)
+            position += 1
+    return result
+
+
+def intersect_postings(postings_lists: Iterable[Sequence[int] | PostingsList]):
+    """Intersects any number of sorted postings lists, starting from the shortest so the intermediate result never grows. Encoded postings lists are skipped through (see `intersect_skipping`) instead of being decoded
+
+    Args:
+        postings_lists (Iterable[Sequence[int] | PostingsList]): sorted postings lists
+
+    Returns:
+        list[int]: sorted doc IDs present in every list
+    """
+    postings_lists = sorted(postings_lists, key=len)
+    if len(postings_lists) == 0:
+        return []
+    result: list[int] = list(postings_lists[0])
+    for postings in postings_lists[1:]:
+        if len(result) == 0:
+            break
+        if (
+            isinstance(postings, PostingsList)
+            and not isinstance(postings, DecodedPostingsList)
+            and postings.is_sorted
+        ):
+            result = intersect_skipping(result, postings)
+        else:
+            result = intersect_two(result, _as_sequence(postings))
+    return result
+
+
+def union_postings(postings_lists: Iterable[Iterable[int]]):
+    """Unions any number of sorted postings lists with a k-way heap merge
+
+    Args:
+        postings_lists (Iterable[Iterable[int]]): sorted postings lists
+
+    Returns:
+        list[int]: sorted doc IDs present in at least one list (without duplicates)
+    """
+    result: list[int] = []
+    for doc_id in heapq.merge(*postings_lists):
+        if len(result) == 0 or result[-1] != doc_id:
+            result.append(doc_id)
+    return result
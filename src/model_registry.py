@@ -0,0 +1,137 @@
+# Copyright © 2023 Arunachala Amuda Murugan (@majimearun)
+#
+# License: GNU General Public License v3.0
+
+# importing libraries
+import os
+import pickle
+import threading
+from collections.abc import Callable
+from typing import Any
+
+# summarizer pipeline saved by running setup.py (from the repository root)
+SUMMARY_PIPELINE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, "models", "summary_pipeline.pkl"
+)
+# huggingface model of the summarizer pipeline saved by setup.py
+SUMMARY_MODEL = "sshleifer/distilbart-cnn-12-6"
+
+_loaders: dict[str, Callable[[], Any]] = {}
+_models: dict[str, Any] = {}
+_versions: dict[str, str] = {}
+_lock = threading.Lock()
+
+
+def register(name: str, loader: Callable[[], Any], version: str | None = None):
+    """Registers a model under a name. The loader is only called the first time the model is requested (see `get_model`). Registering a name again replaces its loader and drops the model if it was loaded
+
+    Args:
+        name (str): model name
+        loader (Callable[[], Any]): function loading the model
+        version (str | None, optional): name or version of the underlying model, which caches of the model's outputs are keyed on (see `model_version`). Defaults to None (the registered name).
+
+    Returns:
+        None
+    """
+    with _lock:
+        _loaders[name] = loader
+        _versions[name] = name if version is None else version
+        _models.pop(name, None)
+
+
+def get_model(name: str):
+    """Returns a registered model, loading it on first use. Every model is loaded at most once per process and shared by all the modules asking for it
+
+    Args:
+        name (str): model name
+
+    Raises:
+        KeyError: if no model is registered under the name
+
+    Returns:
+        Any: model
+    """
+    model = _models.get(name)
+    if model is None:
+        with _lock:
+            # another thread may have loaded it while this one was waiting
+            model = _models.get(name)
+            if model is None:
+                model = _loaders[name]()
+                _models[name] = model
+    return model
+
+
+def model_version(name: str):
+    """Name or version of the model registered under a name, known without loading it
+
+    Args:
+        name (str): model name
+
+    Raises:
+        KeyError: if no model is registered under the name
+
+    Returns:
+        str: model version given to `register`
+    """
+    return _versions[name]
+
+
+def is_loaded(name: str):
+    """Checks if a model has been loaded already
+
+    Args:
+        name (str): model name
+
+    Returns:
+        bool: True if the model is in memory, False otherwise
+    """
+    return name in _models
+
+
+def loaded_models():
+    """Names of the models loaded so far
+
+    Returns:
+        list[str]: model names
+    """
+    return list(_models)
+
+
+def unload(name: str):
+    """Drops a loaded model (it is loaded again on its next use)
+
+    Args:
+        name (str): model name
+
+    Returns:
+        None
+    """
+    with _lock:
+        _models.pop(name, None)
+
+
+def _load_spacy():
+    import spacy
+
+    return spacy.load("en_core_web_sm")
+
+
+def _load_lemmatizer():
+    import spacy
+
+    # the lemmatizer only needs the tagger and the attribute ruler, the parser and the entity recognizer are never loaded
+    return spacy.load("en_core_web_sm", exclude=["parser", "ner"])
+
+
+def _load_summarizer():
+    with open(SUMMARY_PIPELINE_PATH, "rb") as f:
+        return pickle.load(f)
+
+
+# full spaCy pipeline (tokenizing the corpus)
+register("spacy", _load_spacy)
+# lemmatizer only spaCy pipeline (query words)
+register("lemmatizer", _load_lemmatizer)
+# huggingface summarization pipeline (result summaries)
+register("summarizer", _load_summarizer, SUMMARY_MODEL)
@@ -0,0 +1,144 @@
+# Copyright © 2023 Arunachala Amuda Murugan (@majimearun)
+#
+# License: GNU General Public License v3.0
+
+# importing libraries
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from term_dictionary import TermDictionary
+
+
+class PermutermIndex:
+    """Permuterm index stored as a single sorted array of rotations.
+
+    Every rotation of every `word$` is represented by two integers, the term ID of the word (its position in the sorted
+    vocabulary, which doubles as the string pool) and the position the rotation starts at, instead of a dict entry and a list per
+    rotation. The array is sorted by the rotated strings, so all rotations starting with a given prefix form one contiguous range
+    that is found with two binary searches. Both arrays are flat, so they can be written to and memory mapped from a segment file.
+    """
+
+    __slots__ = ("terms", "term_ids", "shifts")
+
+    def __init__(
+        self,
+        terms: Sequence[str],
+        term_ids: Sequence[int] | None = None,
+        shifts: Sequence[int] | None = None,
+    ):
+        """Permuterm index class. Builds the sorted rotation array for the given vocabulary unless it is passed in (when loading it from disk)
+
+        Args:
+            terms (Sequence[str]): sorted vocabulary (term ID -> word), usually the TermDictionary
+            term_ids (Sequence[int] | None, optional): term ID of each sorted rotation. Defaults to None.
+            shifts (Sequence[int] | None, optional): start position (in `word$`) of each sorted rotation. Defaults to None.
+
+        Returns:
+            None
+        """
+        self.terms = terms
+        if term_ids is None or shifts is None:
+            rotations = sorted(
+                (
+                    (term_id, shift)
+                    for term_id, term in enumerate(terms)
+                    for shift in range(len(term) + 1)
+                ),
+                key=lambda x: self._rotate(x[0], x[1]),
+            )
+            term_ids = array("I", (term_id for term_id, _ in rotations))
+            shifts = array("H", (shift for _, shift in rotations))
+        self.term_ids = term_ids
+        self.shifts = shifts
+
+    def __len__(self):
+        """Number of rotations in the index
+
+        Returns:
+            int: number of rotations
+        """
+        return len(self.term_ids)
+
+    def _rotate(self, term_id: int, shift: int):
+        """Rotation of `word$` starting at the given position
+
+        Args:
+            term_id (int): term ID of the word
+            shift (int): start position of the rotation
+
+        Returns:
+            str: rotated string
+        """
+        word = self.terms[term_id] + "$"
+        return word[shift:] + word[:shift]
+
+    def rotation(self, i: int):
+        """Rotation at the given position of the sorted array
+
+        Args:
+            i (int): position in the sorted rotation array
+
+        Returns:
+            str: rotated string
+        """
+        return self._rotate(self.term_ids[i], self.shifts[i])
+
+    def prefix_range(self, prefix: str):
+        """Positions of all the rotations starting with the given prefix
+
+        Args:
+            prefix (str): prefix to be searched for
+
+        Returns:
+            range: contiguous range of positions in the sorted rotation array
+        """
+        positions = range(len(self.term_ids))
+        lo = bisect_left(positions, prefix, key=self.rotation)
+        hi = bisect_right(
+            positions, prefix, lo=lo, key=lambda i: self.rotation(i)[: len(prefix)]
+        )
+        return range(lo, hi)
+
+    def match(self, query: str):
+        """Finds all the words matching a wildcard query (any number of `*`, each matching any number of characters)
+
+        The query is rotated so its last `*` moves to the end (`a*b*c` -> `c$a*b*`) and the literal text before the remaining
+        wildcards becomes a prefix scan. A literal piece between two wildcards is scanned instead if it is longer. When the query
+        has more than one `*`, the words found by the scan are checked against the full pattern.
+
+        Args:
+            query (str): query word (including wildcards)
+
+        Returns:
+            list[str]: sorted list of the words in the corpus matching the query
+        """
+        pieces = query.split("*")
+        if len(pieces) == 1:
+            # no wildcard, the only possible match is the word itself
+            return [query] if self._contains(query) else []
+        if len(pieces) == 2 and pieces[1] == "" and isinstance(self.terms, TermDictionary):
+            # plain prefix query, the words are already in order below the prefix node of the trie
+            return [word for word, _ in self.terms.prefix(pieces[0])]
+        # prefix of the rotation `last$first*...*`, or the longest literal piece between two wildcards
+        prefix = max([pieces[-1] + "$" + pieces[0]] + pieces[1:-1], key=len)
+        term_ids = {self.term_ids[i] for i in self.prefix_range(prefix)}
+        words = [self.terms[term_id] for term_id in sorted(term_ids)]
+        if len(pieces) > 2 or prefix != pieces[-1] + "$" + pieces[0]:
+            pattern = re.compile(".*".join(re.escape(piece) for piece in pieces))
+            words = [word for word in words if pattern.fullmatch(word)]
+        return words
+
+    def _contains(self, word: str):
+        """Checks if a word is in the vocabulary (trie lookup, or binary search over the sorted terms)
+
+        Args:
+            word (str): word to be searched for
+
+        Returns:
+            bool: True if the word is in the vocabulary, False otherwise
+        """
+        if isinstance(self.terms, TermDictionary):
+            return word in self.terms
+        i = bisect_left(self.terms, word)
+        return i < len(self.terms) and self.terms[i] == word
@@ -3,113 +3,159 @@
 # License: GNU General Public License v3.0
 
 # importing libraries
-import sys
-import spacy
-from LinkedList import LinkedList
+import re
+from bisect import bisect_left
+from postings import PostingsList
+from permuterm import PermutermIndex
 from wildcard_query_functions import query_permuterm_index
+from merge_functions import intersect_postings, union_postings
+from query_analyzer import QueryAnalyzer, default_analyzer
 
 
-# loading the spacy model for lemmitization of queries
-nlp = spacy.load("en_core_web_sm")
+# proximity operator between two phrases, e.g. `data NEAR/3 officer`
+NEAR_OPERATOR = re.compile(r"near/(\d+)", re.IGNORECASE)
 
-# setting recursion limit for functions on linked list
-sys.setrecursionlimit(10000)
 
-
-def query_bi_word_index(query: str, bi_word_index: dict[str, LinkedList]):
-    """Finds all the documents that match the biword query
+def match_word(
+    word: str, perm_index: PermutermIndex, analyzer: QueryAnalyzer | None = None
+):
+    """Finds all the words of the corpus a query word can match at one position of a phrase
 
     Args:
-        query (str): biword query string
-        bi_word_index (dict[str, LinkedList]): biword index for each biword in the corpus
+        word (str): query word (can contain wildcards)
+        perm_index (PermutermIndex): permuterm index (sorted rotation array) of the words in the corpus
+        analyzer (QueryAnalyzer | None, optional): query analyzer lemmatizing the query words. Defaults to None (shared analyzer without a lemma table).
 
     Returns:
-        list[int]: sorted list of documents that match the biword query string
+        list[str]: words matching the wildcard query, or the lemma of the word if it does not contain a wildcard
     """
-    result: list[int] = []
-    if query in bi_word_index:
-        for id in bi_word_index[query]:
-            result.append(id.data)
-    return sorted(result)
+    if "*" in word:
+        # No need for inverse list as we want only the words and we are setting ret_words = True
+        return query_permuterm_index(word, perm_index, None, ret_words=True)
+    # if it doesnt contain a wildcard, then it is a normal word and only possible match is itself
+    if analyzer is None:
+        analyzer = default_analyzer()
+    return [analyzer.lemma(word)]
+
+
+def phrase_positions(
+    words: list[str],
+    inverted_list: dict[str, PostingsList],
+    perm_index: PermutermIndex,
+    analyzer: QueryAnalyzer | None = None,
+):
+    """Finds every occurrence of an exact phrase by intersecting the position lists of its words. Documents containing all the words are found first (doc ID intersection), and positions are only compared within those
 
+    Args:
+        words (list[str]): words of the phrase in order (can contain wildcards)
+        inverted_list (dict[str, PostingsList]): positional inverted index for each word in the corpus
+        perm_index (PermutermIndex): permuterm index (sorted rotation array) of the words in the corpus
+        analyzer (QueryAnalyzer | None, optional): query analyzer lemmatizing the query words. Defaults to None (shared analyzer without a lemma table).
 
-def match_all_wildcards_in_biwords(
-    biwords: list[str],
-    perm_index: dict[str, LinkedList],
-    rev_perm_index: dict[str, LinkedList],
+    Returns:
+        dict[int, list[int]]: sorted start positions of the phrase in each document containing it
+    """
+    # postings of every word the query word at each position of the phrase can match
+    slots: list[list[PostingsList]] = [
+        [inverted_list[word] for word in match_word(query_word, perm_index, analyzer) if word in inverted_list]
+        for query_word in words
+    ]
+    if len(slots) == 0 or any(len(slot) == 0 for slot in slots):
+        return {}
+    # a slot of one word keeps its postings list, so the intersection can skip through it
+    candidates = intersect_postings([slot[0] if len(slot) == 1 else union_postings(slot) for slot in slots])
+    starts: dict[int, set[int]] = {}
+    for offset, slot in enumerate(slots):
+        # positions of the slot in every candidate document, shifted back to where the phrase would start. Only the
+        # blocks of the postings holding candidates are decoded (see `PostingsList.positions_of`)
+        shifted: dict[int, set[int]] = {}
+        for postings in slot:
+            for doc_id, positions in postings.positions_of(candidates):
+                shifted.setdefault(doc_id, set()).update(
+                    position - offset for position in positions
+                )
+        if offset == 0:
+            starts = shifted
+        else:
+            starts = {
+                doc_id: starts[doc_id] & shifted[doc_id]
+                for doc_id in starts
+                if doc_id in shifted and starts[doc_id] & shifted[doc_id]
+            }
+        candidates = sorted(starts)
+    return {doc_id: sorted(starts[doc_id]) for doc_id in sorted(starts)}
+
+
+def near_positions(
+    first: list[int], first_length: int, second: list[int], second_length: int, k: int
 ):
-    """Finds all the possible biwords from the biword query string that contain wildcard matches
+    """Keeps the occurrences of the second phrase that are at most k words away from an occurrence of the first (in either order)
 
     Args:
-        biwords (list[str]): list of biwords in the query string
-        perm_index (dict[str, LinkedList]): permuterm index for each possible rotation of words in the corpus
-        rev_perm_index (dict[str, LinkedList]): reverse permuterm index for each possible rotation of words in the corpus
+        first (list[int]): sorted start positions of the first phrase
+        first_length (int): number of words in the first phrase
+        second (list[int]): sorted start positions of the second phrase
+        second_length (int): number of words in the second phrase
+        k (int): maximum distance in words (1 means adjacent)
 
     Returns:
-        list[str]: list of all possible biwords that match the wildcard query
+        list[int]: sorted start positions of the second phrase near the first
     """
-    word_possibilites: dict[str, list[str]] = {}
-    for bw in biwords:
-        words = bw.split()
-        for i in range(len(words)):
-            if "*" in words[i]:
-                # No need for inverse list as we want only the words and we are setting ret_words = True
-                word_possibilites[words[i]] = query_permuterm_index(
-                    words[i], perm_index, rev_perm_index, None, ret_words=True
-                )
-            else:
-                # if it doesnt contain a wildcard, then it is a normal word and only possible match is itself
-                word_possibilites[words[i]] = [nlp(words[i])[0].lemma_.lower()]
-
-    new_biwords: list[str] = []
-    for bw in biwords:
-        words = bw.split()
-        # creating a list with all possible biwrds matching the wildcard(s) it contains
-        possibilities = [
-            " ".join([word_possibilites[words[0]][i], word_possibilites[words[1]][j]])
-            for i in range(len(word_possibilites[words[0]]))
-            for j in range(len(word_possibilites[words[1]]))
-        ]
-        new_biwords.extend(possibilities)
-    return new_biwords
+    result: list[int] = []
+    for start in second:
+        # the first phrase has to start in this window for the two to be within k words
+        lo = start - k - first_length + 1
+        hi = start + k + second_length - 1
+        i = bisect_left(first, lo)
+        if i < len(first) and first[i] <= hi:
+            result.append(start)
+    return result
 
 
 def phrase_query(
     query: str,
-    bi_word_index: dict[str, LinkedList],
-    perm_index: dict[str, LinkedList],
-    rev_perm_index: list[str, LinkedList],
+    inverted_list: dict[str, PostingsList],
+    perm_index: PermutermIndex,
+    analyzer: QueryAnalyzer | None = None,
 ):
-    """Finds all the documents that match the phrase query string
+    """Finds all the documents that match the phrase query string. The words have to occur at consecutive positions in the document. Phrases can be joined with `NEAR/k` (e.g. `data protection NEAR/5 officer`), in which case each phrase has to occur within k words of the previous one, in any order
 
     Args:
         query (str): phrase query string
-        bi_word_index (dict[str, LinkedList]): biword index for each biword in the corpus
-        perm_index (dict[str, LinkedList]): permuterm index for each possible rotation of words in the corpus
-        rev_perm_index (list[str, LinkedList]): reverse permuterm index for each possible rotation of words in the corpus
+        inverted_list (dict[str, PostingsList]): positional inverted index for each word in the corpus
+        perm_index (PermutermIndex): permuterm index (sorted rotation array) of the words in the corpus
+        analyzer (QueryAnalyzer | None, optional): query analyzer lemmatizing the query words. Defaults to None (shared analyzer without a lemma table).
 
     Returns:
         list[int]: sorted list of documents that match the phrase query string
     """
-    words: list[str] = query.split()
-    biwords: list[str] = []
-    for i in range(len(words) - 1):
-        biwords.append(words[i] + " " + words[i + 1])
-    # new biwords is a list of all possible biwords that match the wildcard(s) in the query
-    new_biwords = match_all_wildcards_in_biwords(biwords, perm_index, rev_perm_index)
-    result = []
-    for bw in new_biwords:
-        result.append(query_bi_word_index(bw, bi_word_index))
-    if len(result) == 0:
-        # to prevent overflow error in next step
+    phrases: list[list[str]] = [[]]
+    distances: list[int] = []
+    for word in query.split():
+        operator = NEAR_OPERATOR.fullmatch(word)
+        if operator is not None:
+            phrases.append([])
+            distances.append(int(operator.group(1)))
+        else:
+            phrases[-1].append(word)
+    if any(len(phrase) == 0 for phrase in phrases):
         return []
-    final = set(result[0])
-    if len(new_biwords) > len(biwords):
-        # if length of the new biwords is greater than the original biwords, then there were wildcards in the query, so we need to take union so we dont lose any results
-        for l in result:
-            final = final.union(set(l))
-    else:
-        # if length of the new biwords is less than the original biwords, then there were no wildcards in the query, so we need can take intersection without losing any results
-        for l in result:
-            final = final.intersection(set(l))
-    return sorted(list(final))
+
+    matches = [
+        phrase_positions(phrase, inverted_list, perm_index, analyzer) for phrase in phrases
+    ]
+    doc_ids = set(matches[0])
+    for match in matches[1:]:
+        doc_ids &= set(match)
+    result: list[int] = []
+    for doc_id in sorted(doc_ids):
+        starts = matches[0][doc_id]
+        for i, k in enumerate(distances):
+            starts = near_positions(
+                starts, len(phrases[i]), matches[i + 1][doc_id], len(phrases[i + 1]), k
+            )
+            if len(starts) == 0:
+                break
+        if len(starts) > 0:
+            result.append(doc_id)
+    return result
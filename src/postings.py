@@ -0,0 +1,645 @@
+# Copyright © 2023 Arunachala Amuda Murugan (@majimearun)
+#
+# License: GNU General Public License v3.0
+
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Iterator, Sequence
+
+# number of postings between two entries of the skip table of a postings list
+SKIP_INTERVAL = 128
+
+
+def encode_varint(value: int, out: bytearray):
+    """Appends the variable byte encoding of a non negative integer to a buffer (7 bits per byte, high bit set on every byte except the last)
+
+    Args:
+        value (int): non negative integer to be encoded
+        out (bytearray): buffer to which the encoded bytes are appended
+
+    Returns:
+        None
+    """
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varints(data: bytes | bytearray | memoryview):
+    """Decodes a buffer of variable byte encoded integers
+
+    Args:
+        data (bytes | bytearray | memoryview): buffer containing the encoded integers
+
+    Yields:
+        int: decoded integers in the order they were encoded
+    """
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            yield value
+            value = 0
+            shift = 0
+
+
+class PostingsList:
+    """Postings list of integer doc IDs stored as delta (gap) + variable byte encoded bytes in a single contiguous buffer, with the
+    term frequency of each posting variable byte encoded in a parallel buffer.
+
+    Doc IDs appended in ascending order are encoded straight into the buffer, so appending is amortized O(1) and each posting takes
+    one or two bytes instead of a whole python object. Every doc ID is stored once: appending the last doc ID again adds to its
+    term frequency instead (the frequency of the last posting is only encoded once the next doc ID arrives).
+    IDs appended out of order are held in uncompressed `array('I')`s until `sort` is called.
+
+    Lists built with `add_positions` are positional: the token positions of every posting are gap + variable byte encoded in a
+    third buffer (the gaps restart at every document, and the number of positions of a document is its term frequency), which is
+    what phrase and proximity queries match on.
+
+    The skip table of a list holds, every SKIP_INTERVAL postings, the doc ID the block of postings starting there is gap encoded
+    from and the byte offsets of the block in the three buffers, so intersections and phrase matching can jump to the block holding a
+    doc ID and decode only that block.
+    """
+
+    __slots__ = (
+        "_data",
+        "_frequencies",
+        "_length",
+        "_last",
+        "_last_frequency",
+        "_max_frequency",
+        "_pending",
+        "_pending_frequencies",
+        "_positions",
+        "_last_position",
+        "_skips",
+    )
+
+    def __init__(self, doc_ids: Iterable[int] = ()):
+        """Postings list class
+
+        Args:
+            doc_ids (Iterable[int], optional): doc IDs to initialise the postings list with. Defaults to ().
+
+        Returns:
+            None
+        """
+        self._data = bytearray()
+        self._frequencies = bytearray()
+        self._length: int = 0
+        self._last: int = 0
+        self._last_frequency: int = 0
+        self._max_frequency: int = 0
+        self._pending: array | None = None
+        self._pending_frequencies: array | None = None
+        self._positions: bytearray | None = None
+        self._last_position: int = 0
+        self._skips: tuple[Sequence[int], Sequence[int], Sequence[int], Sequence[int]] | None = None
+        for doc_id in doc_ids:
+            self.append(doc_id)
+
+    @classmethod
+    def from_bytes(
+        cls,
+        data: bytes | bytearray | memoryview,
+        frequencies: bytes | bytearray | memoryview,
+        length: int,
+        last: int,
+        max_frequency: int,
+        positions: bytes | bytearray | memoryview | None = None,
+        skips: tuple[Sequence[int], Sequence[int], Sequence[int], Sequence[int]] | None = None,
+    ):
+        """Creates a postings list over already encoded buffers without decoding them
+
+        Args:
+            data (bytes | bytearray | memoryview): gap + variable byte encoded doc IDs (as returned by `to_bytes`)
+            frequencies (bytes | bytearray | memoryview): variable byte encoded term frequencies (as returned by `frequencies_to_bytes`)
+            length (int): number of doc IDs in the buffer
+            last (int): largest (last) doc ID in the buffer
+            max_frequency (int): largest term frequency in the buffer
+            positions (bytes | bytearray | memoryview | None, optional): encoded token positions (as returned by `positions_to_bytes`). Defaults to None (not positional).
+            skips (tuple[Sequence[int], Sequence[int], Sequence[int], Sequence[int]] | None, optional): skip table of the list (as returned by `skips`). Defaults to None (built on first use).
+
+        Returns:
+            PostingsList: postings list backed by the given buffers
+        """
+        postings = cls.__new__(cls)
+        postings._data = data
+        postings._frequencies = frequencies
+        postings._length = length
+        postings._last = last
+        # every frequency (including the last one) is already encoded
+        postings._last_frequency = 0
+        postings._max_frequency = max_frequency
+        postings._pending = None
+        postings._pending_frequencies = None
+        postings._positions = positions
+        postings._last_position = -1
+        postings._skips = skips
+        return postings
+
+    def __len__(self):
+        """Number of doc IDs in the postings list
+
+        Returns:
+            int: length of the postings list
+        """
+        if self._pending is not None:
+            return self._length + len(self._pending)
+        return self._length
+
+    def __iter__(self) -> Iterator[int]:
+        """Iterates over the doc IDs (ascending, followed by any out of order IDs not sorted in yet)
+
+        Yields:
+            int: doc ID
+        """
+        doc_id = 0
+        for gap in decode_varints(self._data):
+            doc_id += gap
+            yield doc_id
+        if self._pending is not None:
+            yield from self._pending
+
+    def frequencies(self) -> Iterator[int]:
+        """Iterates over the term frequencies, in the same order as the doc IDs
+
+        Yields:
+            int: number of times the term occurs in the document
+        """
+        yield from decode_varints(self._frequencies)
+        if self._last_frequency:
+            yield self._last_frequency
+        if self._pending_frequencies is not None:
+            yield from self._pending_frequencies
+
+    def items(self) -> Iterator[tuple[int, int]]:
+        """Iterates over (doc ID, term frequency) pairs
+
+        Yields:
+            tuple[int, int]: doc ID and the number of times the term occurs in it
+        """
+        return zip(self, self.frequencies())
+
+    def positions(self) -> Iterator[array]:
+        """Iterates over the token positions of every posting of a positional list, in the same order as the doc IDs
+
+        Yields:
+            array: array('I') of the ascending positions of the term in the document
+        """
+        if self._positions is None:
+            raise ValueError("postings list was not built with positions")
+        gaps = decode_varints(self._positions)
+        for frequency in self.frequencies():
+            positions = array("I")
+            position = 0
+            for _ in range(frequency):
+                position += next(gaps)
+                positions.append(position)
+            yield positions
+
+    def __contains__(self, data: int):
+        return self.is_present(data)
+
+    def __eq__(self, other: object):
+        if not isinstance(other, PostingsList):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __str__(self):
+        """String representation of the postings list
+
+        Returns:
+            str: string representation of the postings list
+        """
+        return " -> ".join(str(doc_id) for doc_id in self)
+
+    def __repr__(self):
+        return f"PostingsList([{', '.join(str(doc_id) for doc_id in self)}])"
+
+    @property
+    def last(self):
+        """Largest doc ID in the sorted part of the postings list (0 if empty)"""
+        return self._last
+
+    @property
+    def is_positional(self):
+        """Whether the token positions of the postings are stored"""
+        return self._positions is not None
+
+    @property
+    def is_sorted(self):
+        """Whether every doc ID is in the encoded (ascending) buffer, i.e. none was appended out of order since the last `sort`"""
+        return self._pending is None
+
+    @property
+    def max_frequency(self):
+        """Largest term frequency of any posting (upper bound used to prune ranking)"""
+        return self._max_frequency
+
+    def is_present(self, data: int):
+        """Check if the doc ID is present in the postings list
+
+        Args:
+            data (int): doc ID to be searched for
+
+        Returns:
+            bool: True if the doc ID is present in the postings list, False otherwise
+        """
+        if self._pending is not None and data in self._pending:
+            return True
+        if self._length == 0 or data > self._last:
+            return False
+        for doc_id in self:
+            if doc_id >= data:
+                return doc_id == data
+        return False
+
+    def append(self, data: int, frequency: int = 1):
+        """Append a doc ID to the postings list (or add to its term frequency if it is the last doc ID)
+
+        Args:
+            data (int): doc ID to be appended
+            frequency (int, optional): number of occurrences of the term in the document. Defaults to 1.
+
+        Returns:
+            None
+        """
+        if self._positions is not None:
+            raise ValueError("positional postings lists are appended to with add_positions")
+        self._append(data, frequency)
+
+    def add_positions(self, data: int, positions: Sequence[int]):
+        """Append a doc ID along with the positions of the term in it (or add to the positions of the last doc ID). Documents have to be added in ascending order
+
+        Args:
+            data (int): doc ID to be appended
+            positions (Sequence[int]): ascending token positions of the term in the document, all after the positions already added for it
+
+        Returns:
+            None
+        """
+        if not positions:
+            return
+        if self._positions is None:
+            if self._length or self._pending is not None:
+                raise ValueError("positions can only be added to an empty or positional postings list")
+            self._positions = bytearray()
+        elif not isinstance(self._positions, bytearray):
+            self._positions = bytearray(self._positions)
+        if self._length and data < self._last:
+            raise ValueError("positions have to be added in ascending doc ID order")
+        if self._length and data == self._last:
+            if self._last_position == -1:
+                # lists created by `from_bytes` do not know the last position of their last document
+                *_, last_positions = self.positions()
+                self._last_position = last_positions[-1]
+            previous = self._last_position
+        else:
+            previous = 0
+        for position in positions:
+            encode_varint(position - previous, self._positions)
+            previous = position
+        self._last_position = previous
+        self._append(data, len(positions))
+
+    def _append(self, data: int, frequency: int):
+        """Appends a doc ID (or adds to the frequency of the last one), see `append`
+
+        Args:
+            data (int): doc ID to be appended
+            frequency (int): number of occurrences of the term in the document
+
+        Returns:
+            None
+        """
+        self._skips = None
+        if not isinstance(self._data, bytearray):
+            # copy on write for lists backed by read only buffers (see `from_bytes`)
+            self._data = bytearray(self._data)
+            self._frequencies = bytearray(self._frequencies)
+        if self._length and data <= self._last:
+            if data == self._last:
+                self._add_to_last_frequency(frequency)
+            else:
+                # out of order, kept aside until the list is sorted
+                if self._pending is None:
+                    self._pending = array("I")
+                    self._pending_frequencies = array("I")
+                self._pending.append(data)
+                self._pending_frequencies.append(frequency)
+                self._max_frequency = max(self._max_frequency, frequency)
+            return
+        if self._last_frequency:
+            encode_varint(self._last_frequency, self._frequencies)
+        encode_varint(data - self._last, self._data)
+        self._last = data
+        self._last_frequency = frequency
+        self._max_frequency = max(self._max_frequency, frequency)
+        self._length += 1
+
+    def _add_to_last_frequency(self, frequency: int):
+        """Adds to the term frequency of the last doc ID, decoding it back out of the buffer if it was already encoded (lists created by `from_bytes`)
+
+        Args:
+            frequency (int): number of occurrences to be added
+
+        Returns:
+            None
+        """
+        if not self._last_frequency:
+            frequencies = list(decode_varints(self._frequencies))
+            self._last_frequency = frequencies.pop()
+            self._frequencies = bytearray()
+            for value in frequencies:
+                encode_varint(value, self._frequencies)
+        self._last_frequency += frequency
+        self._max_frequency = max(self._max_frequency, self._last_frequency)
+
+    def sort(self):
+        """Sorts the out of order doc IDs (if any) into the encoded buffers, adding up the frequencies of duplicates
+
+        Returns:
+            None
+        """
+        if self._pending is None:
+            return
+        merged: dict[int, int] = {}
+        for doc_id, frequency in self.items():
+            merged[doc_id] = merged.get(doc_id, 0) + frequency
+        self._data = bytearray()
+        self._frequencies = bytearray()
+        self._length = 0
+        self._last = 0
+        self._last_frequency = 0
+        self._max_frequency = 0
+        self._pending = None
+        self._pending_frequencies = None
+        for doc_id in sorted(merged):
+            self.append(doc_id, merged[doc_id])
+
+    def skips(self):
+        """Skip table of the encoded postings, built (in one pass over the buffers) the first time it is needed if it was not read with the list
+
+        Returns:
+            tuple[Sequence[int], Sequence[int], Sequence[int], Sequence[int]]: for every block of SKIP_INTERVAL postings, the doc ID preceding the block (0 for the first one) and the byte offsets of the block in the encoded doc IDs, term frequencies and positions (0 if the list is not positional)
+        """
+        if self._skips is None:
+            doc_ids = array("I")
+            offsets = array("I")
+            data = self._data
+            n = len(data)
+            position = 0
+            doc_id = 0
+            i = 0
+            while position < n:
+                if i % SKIP_INTERVAL == 0:
+                    doc_ids.append(doc_id)
+                    offsets.append(position)
+                gap = 0
+                shift = 0
+                while True:
+                    byte = data[position]
+                    position += 1
+                    gap |= (byte & 0x7F) << shift
+                    if byte < 0x80:
+                        break
+                    shift += 7
+                doc_id += gap
+                i += 1
+            frequency_offsets = array("I", [0] * min(len(doc_ids), 1))
+            position_offsets = array("I", frequency_offsets)
+            if len(doc_ids) > 1:
+                # the positions of a block start after the positions of every earlier posting (the sum of their frequencies)
+                positions = self._positions
+                frequency = 0
+                shift = 0
+                i = 0
+                occurrences = 0
+                ends = 0
+                position = 0
+                for offset, byte in enumerate(self._frequencies):
+                    frequency |= (byte & 0x7F) << shift
+                    if byte & 0x80:
+                        shift += 7
+                        continue
+                    i += 1
+                    occurrences += frequency
+                    frequency = 0
+                    shift = 0
+                    if i % SKIP_INTERVAL == 0:
+                        frequency_offsets.append(offset + 1)
+                        if positions is not None:
+                            while ends < occurrences:
+                                if positions[position] < 0x80:
+                                    ends += 1
+                                position += 1
+                        position_offsets.append(position)
+                        if len(frequency_offsets) == len(doc_ids):
+                            break
+            self._skips = (doc_ids, offsets, frequency_offsets, position_offsets)
+        return self._skips
+
+    def decode_block(self, block: int):
+        """Decodes one block of the encoded doc IDs (see `skips`)
+
+        Args:
+            block (int): position of the block in the skip table
+
+        Returns:
+            array: array('I') of the (at most SKIP_INTERVAL) doc IDs of the block
+        """
+        doc_ids, offsets, _, _ = self.skips()
+        end = offsets[block + 1] if block + 1 < len(offsets) else len(self._data)
+        decoded = array("I")
+        doc_id = doc_ids[block]
+        for gap in decode_varints(self._data[offsets[block] : end]):
+            doc_id += gap
+            decoded.append(doc_id)
+        return decoded
+
+    def decode_block_positions(self, block: int):
+        """Decodes the doc IDs and token positions of one block of a positional list (see `skips`)
+
+        Args:
+            block (int): position of the block in the skip table
+
+        Returns:
+            tuple[array, list[array]]: array('I') of the doc IDs of the block, and the array('I') of the positions of the term in each of them
+        """
+        if self._positions is None:
+            raise ValueError("postings list was not built with positions")
+        doc_ids = self.decode_block(block)
+        _, _, frequency_offsets, position_offsets = self.skips()
+        if block + 1 < len(frequency_offsets):
+            frequencies = list(decode_varints(self._frequencies[frequency_offsets[block] : frequency_offsets[block + 1]]))
+            gaps = decode_varints(self._positions[position_offsets[block] : position_offsets[block + 1]])
+        else:
+            frequencies = list(decode_varints(self._frequencies[frequency_offsets[block] :]))
+            if self._last_frequency:
+                frequencies.append(self._last_frequency)
+            gaps = decode_varints(self._positions[position_offsets[block] :])
+        block_positions: list[array] = []
+        for frequency in frequencies:
+            positions = array("I")
+            position = 0
+            for _ in range(frequency):
+                position += next(gaps)
+                positions.append(position)
+            block_positions.append(positions)
+        return doc_ids, block_positions
+
+    def positions_of(self, doc_ids: Iterable[int]) -> Iterator[tuple[int, array]]:
+        """Iterates over the token positions of some documents of a positional list, decoding only the blocks (see `skips`) holding them instead of every position of the list
+
+        Args:
+            doc_ids (Iterable[int]): ascending doc IDs
+
+        Yields:
+            tuple[int, array]: every given doc ID present in the list, with the array('I') of the ascending positions of the term in it
+        """
+        if not self.is_sorted:
+            wanted = set(doc_ids)
+            for doc_id, positions in zip(self, self.positions()):
+                if doc_id in wanted:
+                    yield doc_id, positions
+            return
+        if self._length == 0:
+            return
+        skip_doc_ids = self.skips()[0]
+        block = -1
+        block_doc_ids: Sequence[int] = ()
+        block_positions: list[array] = []
+        for doc_id in doc_ids:
+            if doc_id > self._last:
+                break
+            # last block starting after a doc ID smaller than doc_id
+            current = max(bisect_left(skip_doc_ids, doc_id) - 1, 0)
+            if current != block:
+                block = current
+                block_doc_ids, block_positions = self.decode_block_positions(block)
+            i = bisect_left(block_doc_ids, doc_id)
+            if i < len(block_doc_ids) and block_doc_ids[i] == doc_id:
+                yield doc_id, block_positions[i]
+
+    def to_array(self):
+        """Decodes the postings list into a contiguous array (for random access, e.g. while merging)
+
+        Returns:
+            array: array('I') of the doc IDs
+        """
+        return array("I", self)
+
+    def to_bytes(self):
+        """Encoded doc IDs of the postings list (see `from_bytes`)
+
+        Returns:
+            bytes: gap + variable byte encoded doc IDs
+        """
+        self.sort()
+        return bytes(self._data)
+
+    def frequencies_to_bytes(self):
+        """Encoded term frequencies of the postings list (see `from_bytes`)
+
+        Returns:
+            bytes: variable byte encoded term frequencies
+        """
+        self.sort()
+        if not self._last_frequency:
+            return bytes(self._frequencies)
+        last = bytearray()
+        encode_varint(self._last_frequency, last)
+        return bytes(self._frequencies) + bytes(last)
+
+    def positions_to_bytes(self):
+        """Encoded token positions of a positional postings list (see `from_bytes`)
+
+        Returns:
+            bytes: gap + variable byte encoded positions, empty if the list is not positional
+        """
+        if self._positions is None:
+            return b""
+        return bytes(self._positions)
+
+    def print_list(self):
+        """Print the postings list
+
+        Returns:
+            None
+        """
+        for doc_id in self:
+            print(doc_id, end=" -> ")
+        print("None\n")
+
+
+class DecodedPostingsList(PostingsList):
+    """Read only postings list whose doc IDs and term frequencies are held decoded in `array('I')`s (positions stay encoded),
+    so iterating, galloping or scoring it does not decode any varints. This is the form the postings cache keeps hot terms in.
+    """
+
+    __slots__ = ("_doc_ids", "_frequency_array")
+
+    @classmethod
+    def decode(cls, postings: PostingsList):
+        """Decodes a postings list
+
+        Args:
+            postings (PostingsList): postings list to be decoded
+
+        Returns:
+            DecodedPostingsList: decoded copy of the postings list
+        """
+        decoded = cls.from_bytes(
+            postings.to_bytes(),
+            postings.frequencies_to_bytes(),
+            len(postings),
+            postings.last,
+            postings.max_frequency,
+            postings.positions_to_bytes() if postings.is_positional else None,
+        )
+        decoded._doc_ids = postings.to_array()
+        decoded._frequency_array = array("I", postings.frequencies())
+        return decoded
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._doc_ids)
+
+    def frequencies(self) -> Iterator[int]:
+        return iter(self._frequency_array)
+
+    def is_present(self, data: int):
+        i = bisect_left(self._doc_ids, data)
+        return i < len(self._doc_ids) and self._doc_ids[i] == data
+
+    def to_array(self):
+        """Decoded doc IDs (shared with the postings list, not to be modified)
+
+        Returns:
+            array: array('I') of the doc IDs
+        """
+        return self._doc_ids
+
+    def append(self, data: int, frequency: int = 1):
+        raise TypeError("decoded postings lists are read only")
+
+    def add_positions(self, data: int, positions: Sequence[int]):
+        raise TypeError("decoded postings lists are read only")
+
+    def nbytes(self):
+        """Approximate memory held by the postings list (used to bound the postings cache)
+
+        Returns:
+            int: size in bytes
+        """
+        return (
+            self._doc_ids.itemsize * len(self._doc_ids)
+            + self._frequency_array.itemsize * len(self._frequency_array)
+            + len(self._data)
+            + len(self._frequencies)
+            + (len(self._positions) if self._positions is not None else 0)
+        )
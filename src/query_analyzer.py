@@ -0,0 +1,131 @@
+# Copyright © 2023 Arunachala Amuda Murugan (@majimearun)
+#
+# License: GNU General Public License v3.0
+
+# importing libraries
+import sys
+from collections.abc import Iterable, Mapping
+from typing import TYPE_CHECKING
+from cache import Cache
+from model_registry import get_model
+
+if TYPE_CHECKING:
+    from spacy.language import Language
+
+
+class QueryAnalyzer:
+    def __init__(
+        self,
+        lemmas: Mapping[str, str] | None = None,
+        max_memo_bytes: int = 4 * 1024 * 1024,
+        nlp: "Language | None" = None,
+    ):
+        """Query analyzer: lemmatizes query words the same way `nlp(word)[0].lemma_.lower()` does, without running the spaCy pipeline for every word of every query. Words are looked up in a lemma table built at index time (see `build`), then in a memo of the words lemmatized so far, and only the remaining ones go through a lemmatizer only pipeline, all of them in one batch (see `analyze`)
+
+        Args:
+            lemmas (Mapping[str, str] | None, optional): lemma of each word expected in queries (the words of the corpus and their inflections). Defaults to None (empty table).
+            max_memo_bytes (int, optional): memory bound of the memo of words missing from the table. Defaults to 4 MiB.
+            nlp (Language | None, optional): pipeline used for words missing from both. Defaults to None (the shared lemmatizer of the model registry: en_core_web_sm without the parser and entity recognizer, loaded on first use).
+
+        Returns:
+            None
+        """
+        self.lemmas = lemmas if lemmas is not None else {}
+        self.memo = Cache(max_memo_bytes)
+        self._nlp = nlp
+
+    @property
+    def nlp(self):
+        """Lemmatizer pipeline, loaded on first use"""
+        if self._nlp is None:
+            self._nlp = get_model("lemmatizer")
+        return self._nlp
+
+    @classmethod
+    def build(
+        cls,
+        words: Iterable[str],
+        nlp: "Language | None" = None,
+        batch_size: int = 1000,
+    ):
+        """Builds the lemma table for the given words (usually the words of the corpus and their inflections) with batched pipeline runs
+
+        Args:
+            words (Iterable[str]): words expected in queries
+            nlp (Language | None, optional): pipeline used to lemmatize them. Defaults to None (lemmatizer only en_core_web_sm).
+            batch_size (int, optional): number of words per pipeline batch. Defaults to 1000.
+
+        Returns:
+            QueryAnalyzer: analyzer with the lemma table
+        """
+        analyzer = cls(nlp=nlp)
+        analyzer.lemmas = analyzer._lemmatize(list(dict.fromkeys(words)), batch_size)
+        return analyzer
+
+    def _lemmatize(self, words: list[str], batch_size: int = 1000):
+        """Runs the pipeline over the words, one document per word
+
+        Args:
+            words (list[str]): unique words
+            batch_size (int, optional): number of words per pipeline batch. Defaults to 1000.
+
+        Returns:
+            dict[str, str]: lemma of each word (lowercased, the lemma of its first token)
+        """
+        return {
+            word: doc[0].lemma_.lower() if len(doc) > 0 else word
+            for word, doc in zip(words, self.nlp.pipe(words, batch_size=batch_size))
+        }
+
+    def analyze(self, words: Iterable[str]):
+        """Lemmatizes the words of a query at once. Words found neither in the lemma table nor in the memo are lemmatized in a single pipeline run and memoized, so every stage of the search (filter, phrase matching, scoring) gets them from the memo afterwards
+
+        Args:
+            words (Iterable[str]): query words (without wildcards)
+
+        Returns:
+            dict[str, str]: lemma of each word
+        """
+        lemmas: dict[str, str] = {}
+        missing: list[str] = []
+        for word in words:
+            if word in lemmas:
+                continue
+            lemma = self.lemmas.get(word)
+            if lemma is None:
+                lemma = self.memo.get(word)
+            if lemma is None:
+                missing.append(word)
+            else:
+                lemmas[word] = lemma
+        if missing:
+            for word, lemma in self._lemmatize(list(dict.fromkeys(missing))).items():
+                self.memo.put(word, lemma, sys.getsizeof(word) + sys.getsizeof(lemma))
+                lemmas[word] = lemma
+        return lemmas
+
+    def lemma(self, word: str):
+        """Lemma of a single query word (see `analyze`)
+
+        Args:
+            word (str): query word (without wildcards)
+
+        Returns:
+            str: lemma of the word
+        """
+        return self.analyze((word,))[word]
+
+
+_default_analyzer: QueryAnalyzer | None = None
+
+
+def default_analyzer():
+    """Analyzer used when none is passed in: no lemma table, so every new word goes through the pipeline once and is memoized
+
+    Returns:
+        QueryAnalyzer: shared analyzer without a lemma table
+    """
+    global _default_analyzer
+    if _default_analyzer is None:
+        _default_analyzer = QueryAnalyzer()
+    return _default_analyzer
@@ -3,97 +3,82 @@
 # License: GNU General Public License v3.0
 
 # importing libraries
-import sys
-import spacy
 import pandas as pd
-import pickle
-import re
-from LinkedList import LinkedList
+from postings import PostingsList
+from permuterm import PermutermIndex
+from term_dictionary import TermDictionary
+from spelling_index import SpellingIndex
+from autocomplete_index import AutocompleteIndex
+from merge_functions import intersect_postings, union_postings
 from phrase_query_functions import phrase_query
-from scoring_functions import get_term_frequency_scores
+from scoring_functions import get_top_k_scores
+from matrix_scoring_functions import TfidfMatrix
+from scorers import Scorer
+from cache import SearchCache
+from index_io import DocumentTable
+from query_analyzer import QueryAnalyzer, default_analyzer
+from search_results import SearchResults
 from edit_distance_functions import spell_check_query, autocomplete_result
 from wildcard_query_functions import query_permuterm_index
 
-# getting the summarizer pipeline which we earlier loaded in the setup.py file
-with open("../models/summary_pipeline.pkl", "rb") as f:
-    summary_pipeline = pickle.load(f)
-
-# loading the spacy model for lemmitization of queries
-nlp = spacy.load("en_core_web_sm")
-
-# setting recursion limit for functions on linked list
-sys.setrecursionlimit(10000)
-
 
 def multi_query(
     queries: str,
-    inverted_list: dict[str, LinkedList],
-    perm_index: dict[str, LinkedList],
-    rev_perm_index: dict[str, LinkedList],
+    inverted_list: dict[str, PostingsList],
+    perm_index: PermutermIndex,
     _and: bool = False,
+    analyzer: QueryAnalyzer | None = None,
 ):
     """Finds all the documents that match/contain words from the query string
 
     Args:
         queries (str): query string
-        inverted_list (dict[str, LinkedList]): inverted list for each word in the corpus
-        perm_index (dict[str, LinkedList]): permuterm index for each possible rotation of words in the corpus
-        rev_perm_index (dict[str, LinkedList]): reverse permuterm index for each possible rotation of words in the corpus
+        inverted_list (dict[str, PostingsList]): inverted list for each word in the corpus
+        perm_index (PermutermIndex): permuterm index (sorted rotation array) of the words in the corpus
         _and (bool, optional): Whether to return the intersection of the documents matching the query words. Defaults to False.
+        analyzer (QueryAnalyzer | None, optional): query analyzer lemmatizing the query words. Defaults to None (shared analyzer without a lemma table).
     Returns:
         list[int]: sorted list of documents that match the query string
     """
+    if analyzer is None:
+        analyzer = default_analyzer()
     docs: list[int] = []
     for query in queries:
         if "*" in query:
             docs.append(
-                query_permuterm_index(query, perm_index, rev_perm_index, inverted_list)
+                query_permuterm_index(query, perm_index, inverted_list)
             )
 
         else:
-            query: str = nlp(query)[0].lemma_.lower()
-            intermediate_docs: list[int] = []
+            query: str = analyzer.lemma(query)
             try:
-                for id in inverted_list[query]:
-                    intermediate_docs.append(id.data)
-            except:
+                intermediate_docs: PostingsList = inverted_list[query]
+            except KeyError:
                 continue
             docs.append(intermediate_docs)
     if not _and:
-        # return union of all sublists in docs
-        result: list[int] = []
-        for l in docs:
-            for id in l:
-                if id not in result:
-                    result.append(id)
-        return sorted(result)
+        # return union of all sublists in docs (k-way merge, as they are all sorted)
+        return union_postings(docs)
     else:
-        if len(docs) == 0:
-            return []
-        # return intersection of all sublists in docs
-        result: set[int] = set(docs[0])
-        for l in docs:
-            result = result.intersection(set(l))
-        return sorted(list(result))
+        # return intersection of all sublists in docs (starting from the shortest one)
+        return intersect_postings(docs)
 
 
 def boolean_filter(
     queries: str,
-    inverted_list: dict[str, LinkedList],
-    perm_index: dict[str, LinkedList],
-    rev_perm_index: dict[str, LinkedList],
-    bi_word_index: dict[str, LinkedList],
+    inverted_list: dict[str, PostingsList],
+    perm_index: PermutermIndex,
     _phrase=False,
+    analyzer: QueryAnalyzer | None = None,
 ):
     """Filters out documents using a simple boolean retrieval
 
     Args:
         queries (str): query string
-        inverted_list (dict[str, LinkedList]): inverse index for each word in the corpus
-        perm_index (dict[str, LinkedList]): permuterm index for each possible rotation of words in the corpus
-        rev_perm_index (dict[str, LinkedList]): reverse permuterm index for each possible rotation of words in the corpus
-        bi_word_index (dict[str, LinkedList]): biword index for each biword in the corpus
+        inverted_list (dict[str, PostingsList]): positional inverse index for each word in the corpus
+        perm_index (PermutermIndex): permuterm index (sorted rotation array) of the words in the corpus
         _phrase (bool, optional): Whether the query is a phrase query or not. Defaults to False.
+        analyzer (QueryAnalyzer | None, optional): query analyzer lemmatizing the query words. Defaults to None (shared analyzer without a lemma table).
 
     Returns:
         list[int]: sorted list of documents that match the query string
@@ -110,86 +95,48 @@ def boolean_filter(
             else:
                 or_queries.append(query)
         if len(and_queries) == 0:
-            return multi_query(or_queries, inverted_list, perm_index, rev_perm_index)
+            return multi_query(or_queries, inverted_list, perm_index, analyzer=analyzer)
         # If there are any and queries we only take care of thyem as those in OR may or may not be present
         # Scoring takes care of the order (or queries are still part of the ranking later on)
         else:
             return multi_query(
-                and_queries, inverted_list, perm_index, rev_perm_index, _and=True
+                and_queries, inverted_list, perm_index, _and=True, analyzer=analyzer
             )
         # If you want to filter using both the AND and OR queries uncomment the following lines and change the else statement above to (elif len(or_queries) == 0):
 
         # and_results: list[int] = multi_query(
-        #     and_queries, inverted_list, perm_index, rev_perm_index, _and=True
+        #     and_queries, inverted_list, perm_index, _and=True
         # )
         # or_results: list[int] = multi_query(
-        #     or_queries, inverted_list, perm_index, rev_perm_index
+        #     or_queries, inverted_list, perm_index
         # )
         # considering if even one word contains an and all words do, otherwise there is no point of the or words
         # return sorted(list(set(and_results) & set(or_results)))
     else:
         # all phrase queries are (logically) of and type, so removing all double quotes
         queries: list[str] = queries.replace('"', "")
-        return phrase_query(queries, bi_word_index, perm_index, rev_perm_index)
+        return phrase_query(queries, inverted_list, perm_index, analyzer)
 
 
 def print_results(
-    scores: list[tuple[int, float]], df: pd.DataFrame, show_summary: bool, ranked: bool
+    scores: list[tuple[int, float]], df: pd.DataFrame | DocumentTable, show_summary: bool, ranked: bool
 ):
-    """Prints the results of the search
+    """Prints the results of the search (see `SearchResults.print`)
 
     Args:
         scores (list[tuple[int, float]]): sorted list of tuples containing document id and score
-        df (pd.DataFrame): dataframe containing the corpus
+        df (pd.DataFrame | DocumentTable): dataframe containing the corpus, or its document table
         show_summary (bool): whether to show the summary of the document or not
         ranked (bool): whether the search was ranked or not
     """
-    print(f"Documents Retrieved: {len(scores)}")
-    if not ranked:
-        print("Unranked Search Results: Boolean Retrieval")
-    print(
-        "------------------------------------------------------------------------------------------"
-    )
-    print(
-        "------------------------------------------------------------------------------------------"
-    )
-    for i, score in enumerate(scores):
-        row = df.loc[score[0]]
-        print(f"Rank: {i + 1}")
-        print(f"Document Name: {row.document_name}")
-        print(f"Page Number: {row.page_number + 1}")
-        print(f"Paragraph Number: {row.paragraph_number + 1}")
-        print(f"Score: {score[1]}")
-        print(
-            "------------------------------------------------------------------------------------------"
-        )
-        if show_summary:
-            summary = summary_pipeline(row.text, truncation=True)
-            print(f"Summary: {summary[0]['summary_text']}")
-        print(
-            "------------------------------------------------------------------------------------------"
-        )
-        # replace any number f spaces with a single space
-        print_text = re.sub(r"\s+", " ", row.text)
-        print(f"Paragraph Text: \n{print_text}")
-        print(
-            "------------------------------------------------------------------------------------------"
-        )
-        print(
-            "------------------------------------------------------------------------------------------"
-        )
-        print(
-            "------------------------------------------------------------------------------------------"
-        )
+    SearchResults(scores, df, ranked).print(show_summary)
 
 
 def search(
     query: str,
-    inverted_list: dict[str, LinkedList],
-    perm_index: dict[str, LinkedList],
-    rev_perm_index: dict[str, LinkedList],
-    bi_word_index: dict[str, LinkedList],
-    main_df: pd.DataFrame,
+    inverted_list: dict[str, PostingsList],
+    perm_index: PermutermIndex,
+    main_df: pd.DataFrame | DocumentTable,
     is_phrase: bool = False,
     ranked: bool = True,
     show_summary: bool = False,
@@ -197,89 +144,177 @@ def search(
     spell_check: bool = False,
     autocomplete: bool = False,
     n_auto_results: int = 5,
+    tfidf_matrix: TfidfMatrix | None = None,
+    scorer: Scorer | None = None,
+    term_dictionary: TermDictionary | None = None,
+    spelling_index: SpellingIndex | None = None,
+    autocomplete_index: AutocompleteIndex | None = None,
+    cache: SearchCache | None = None,
+    analyzer: QueryAnalyzer | None = None,
+    display: bool = True,
 ):
-    """Searches the corpus for documents that match the query string
+    """Searches the corpus for documents that match the query string, and returns the results as a lazy `SearchResults` (doc IDs and scores, the text and summaries of the hits are only read and generated when asked for)
 
     Args:
         query (str): query string
-        inverted_list (dict[str, LinkedList]): inverted index for each word in the corpus
-        perm_index (dict[str, LinkedList]): permuterm index for each possible rotation of words in the corpus
-        rev_perm_index (dict[str, LinkedList]): reverse permuterm index for each possible rotation of words in the corpus
-        bi_word_index (dict[str, LinkedList]): biword index for each biword in the corpus
-        main_df (pd.DataFrame): dataframe containing the corpus
-        is_phrase (bool, optional): Whether the query is a phrase query or not. Defaults to False.
+        inverted_list (dict[str, PostingsList]): positional inverted index for each word in the corpus
+        perm_index (PermutermIndex): permuterm index (sorted rotation array) of the words in the corpus
+        main_df (pd.DataFrame | DocumentTable): dataframe containing the corpus, or its document table (see `load_engine`), which scores and prints the hits without pandas
+        is_phrase (bool, optional): Whether the query is a phrase query (words at consecutive positions, phrases can be joined with NEAR/k) or not. Defaults to False.
         ranked (bool, optional): SWhether the results should be ranked or not. Defaults to True.
         show_summary (bool, optional): Whether we need to show the summary of the retrieved documents. Defaults to False.
         retrieve_n (int, optional): Number of documents to be retrieved. Defaults to None.
         spell_check (bool, optional): Whether to perform spell check or not. Defaults to False.
         auto_complete (bool, optional): Whether to print auto complete options instead of search or not. Defaults to False.
         n_auto_results (int, optional): Number of auto complete results to be printed. Defaults to 5.
+        tfidf_matrix (TfidfMatrix, optional): Weighted document-term matrix to rank with (one sparse matrix-vector product) instead of walking the postings. Only applies to tf*idf ranking (when no scorer is given). Defaults to None.
+        scorer (Scorer, optional): Ranking function (e.g. BM25Scorer, CosineTfIdfScorer), created once for the corpus. Defaults to None (tf*idf).
+        term_dictionary (TermDictionary, optional): Trie of the words in the corpus used for autocomplete and spell check. Defaults to None (the term dictionary the permuterm index is built over).
+        spelling_index (SpellingIndex, optional): Trigram index of the words in the corpus, narrows spell check down to a few candidates. Defaults to None (trie walk only).
+        autocomplete_index (AutocompleteIndex, optional): Precomputed completions of every prefix for autocomplete. Defaults to None (ranks the words below the prefix on every call).
+        cache (SearchCache, optional): Result and postings caches shared between searches, emptied when the index generation changes. Indexes without a generation (plain dicts) are not cached. Defaults to None (no caching).
+        analyzer (QueryAnalyzer, optional): Query analyzer (lemma table built with the index, see `startup_engine`). The query words are lemmatized once and shared by the filter, phrase and scoring stages. Defaults to None (shared analyzer without a lemma table).
+        display (bool, optional): Whether to print the results (and messages) as well. Defaults to True.
+
+    Returns:
+        SearchResults | list[str]: results of the search, or the completions of the query if autocomplete is set
     """
     query = query.lower()
+    if term_dictionary is None:
+        term_dictionary = perm_index.terms
     if autocomplete:
-        results = autocomplete_result(query, inverted_list, n_auto_results)
-        print("Possible Options:")
-        print(
-            "------------------------------------------------------------------------------------------"
+        results = autocomplete_result(
+            query, inverted_list, term_dictionary, n_auto_results, autocomplete_index
         )
-        for i, result in enumerate(results):
-            print(f"{i + 1}. {result}")
-        print(
-            "------------------------------------------------------------------------------------------"
+        if display:
+            print("Possible Options:")
+            print(
+                "------------------------------------------------------------------------------------------"
+            )
+            for i, result in enumerate(results):
+                print(f"{i + 1}. {result}")
+            print(
+                "------------------------------------------------------------------------------------------"
+            )
+        return results
+
+    if cache is not None and not cache.validate(inverted_list):
+        # an index without a generation can change without notice, so it is not cached
+        cache = None
+    if cache is not None:
+        key = cache.result_key(
+            query,
+            is_phrase=is_phrase,
+            ranked=ranked,
+            retrieve_n=retrieve_n,
+            spell_check=spell_check,
+            tfidf_matrix=tfidf_matrix,
+            scorer=scorer,
+            analyzer=analyzer,
         )
-        return
+        cached = cache.results.get(key)
+        if cached is not None:
+            scores, corrected_query = cached
+            if display and corrected_query is not None:
+                # same messages as the search that found the results
+                print(
+                    f"No documents found with direct match with {query}. Performing spell check..."
+                )
+                print(f"Corrected Query: {corrected_query}")
+            results = SearchResults(scores, main_df, ranked, query, corrected_query)
+            if display:
+                results.print(show_summary)
+            return results
+        # postings of hot words are decoded once and then served from the cache
+        inverted_list = cache.inverted_list(inverted_list)
+
+    if analyzer is None:
+        analyzer = default_analyzer()
+    # lemmatizing all the query words in one go, the stages below read them from the analyzer's memo
+    analyzer.analyze(
+        word for word in query.replace('"', " ").split() if "*" not in word
+    )
 
     # first we filter results using boolean retrieval
     filtered = boolean_filter(
         query,
         inverted_list,
         perm_index,
-        rev_perm_index,
-        bi_word_index,
         _phrase=is_phrase,
+        analyzer=analyzer,
     )
+    original_query = query
     if len(filtered) == 0:
         if spell_check:
-            print(
-                f"No documents found with direct match with {query}. Performing spell check..."
-            )
+            if display:
+                print(
+                    f"No documents found with direct match with {query}. Performing spell check..."
+                )
             corrected_queries: list[str] = []
             for q in query.split():
                 if "*" not in q:
-                    corrected_queries.append(spell_check_query(q, inverted_list))
+                    corrected_queries.append(
+                        spell_check_query(
+                            q, term_dictionary, inverted_list, spelling_index
+                        )
+                    )
                 else:
                     corrected_queries.append(q)
             query = " ".join(corrected_queries)
-            print(f"Corrected Query: {query}")
+            if display:
+                print(f"Corrected Query: {query}")
+            # the corrected words go through the same analyzer as the first pass, so every stage sees the same lemmas
+            analyzer.analyze(
+                word for word in query.replace('"', " ").split() if "*" not in word
+            )
             filtered = boolean_filter(
                 query,
                 inverted_list,
                 perm_index,
-                rev_perm_index,
-                bi_word_index,
                 _phrase=is_phrase,
+                analyzer=analyzer,
             )
             if len(filtered) == 0:
-                print("No documents found even after spell check")
-                return
+                if display:
+                    print("No documents found even after spell check")
+                return SearchResults([], main_df, ranked, original_query, query)
         else:
-            print("No documents found")
-            return
-    if ranked:
-        scores = get_term_frequency_scores(
+            if display:
+                print("No documents found")
+            return SearchResults([], main_df, ranked, query)
+    if ranked and tfidf_matrix is not None and scorer is None:
+        scores = tfidf_matrix.score(
+            query.split(),
+            inverted_list,
+            perm_index,
+            candidates=filtered,
+            k=retrieve_n,
+            analyzer=analyzer,
+        )
+    elif ranked:
+        # only the documents in filtered are scored, and only the best retrieve_n of them are kept
+        scores = get_top_k_scores(
             main_df,
             query.split(),
             inverted_list,
             perm_index,
-            rev_perm_index,
+            candidates=filtered,
+            k=retrieve_n,
+            scorer=scorer,
+            analyzer=analyzer,
         )
-        # get only scores for those documents that are in filtered
-        scores = [x for x in scores if x[0] in filtered]
 
     else:
         scores = []
         for id in filtered:
             scores.append((id, None))
-    if retrieve_n is not None:
-        scores = scores[:retrieve_n]
-    print_results(scores, main_df, show_summary, ranked)
+        if retrieve_n is not None:
+            scores = scores[:retrieve_n]
+    corrected_query = query if query != original_query else None
+    if cache is not None:
+        # the corrected query is kept too, so a hit returns (and prints) the same as the search that found the results
+        cache.results.put(key, (scores, corrected_query), cache.result_size(key, scores, corrected_query))
+    results = SearchResults(scores, main_df, ranked, original_query, corrected_query)
+    if display:
+        results.print(show_summary)
+    return results
@@ -0,0 +1,196 @@
+# Copyright © 2023 Arunachala Amuda Murugan (@majimearun)
+#
+# License: GNU General Public License v3.0
+
+# importing libraries
+import numpy as np
+import pandas as pd
+from abc import ABC, abstractmethod
+from collections.abc import Mapping
+from postings import PostingsList
+from index_io import DocumentTable
+
+
+def tfidf(tf: int, _df: int, ndocs: int):
+    """Calculates the tf*idf score for a given term frequency and document frequency
+
+    Args:
+        tf (int): term frequency
+        _df (int): document frequency
+        ndocs (int): total number of documents in the corpus
+
+    Returns:
+        float: tf*idf score
+    """
+    return (np.log(1 + tf)) * (np.log((1 + ndocs) / (_df + 1)) + 1)
+
+
+def document_norms(
+    inverted_list: dict[str, PostingsList],
+    ndocs: int,
+    document_frequencies: Mapping[str, int] | None = None,
+    collection_ndocs: int | None = None,
+):
+    """Calculates the euclidean norm of the tf*idf vector of every document (used for cosine normalization). Done once while building the index
+
+    Args:
+        inverted_list (dict[str, PostingsList]): inverted index (with term frequencies) for each word in the corpus
+        ndocs (int): total number of documents in the corpus
+        document_frequencies (Mapping[str, int] | None, optional): document frequency of each word in the whole collection, when the inverted index only covers a shard of it. Defaults to None (the lengths of the postings lists).
+        collection_ndocs (int | None, optional): number of documents in the whole collection, when the inverted index only covers a shard of it. Defaults to None (ndocs).
+
+    Returns:
+        np.ndarray: norm of each document, indexed by document id
+    """
+    squares = np.zeros(ndocs)
+    for word in inverted_list:
+        postings = inverted_list[word]
+        doc_ids = np.frombuffer(postings.to_array(), dtype=np.uint32)
+        tf = np.fromiter(postings.frequencies(), dtype=np.float64, count=len(postings))
+        _df = len(postings) if document_frequencies is None else document_frequencies[word]
+        squares[doc_ids] += tfidf(tf, _df, ndocs if collection_ndocs is None else collection_ndocs) ** 2
+    return np.sqrt(squares)
+
+
+def document_column(df: pd.DataFrame | DocumentTable, column: str):
+    """Column of the document table precomputed while building the index, read from the engine dataframe or from the arrays of a `DocumentTable` (no dataframe is built)
+
+    Args:
+        df (pd.DataFrame | DocumentTable): dataframe containing the corpus, or its document table
+        column (str): column name ("length" or "norm")
+
+    Returns:
+        np.ndarray: value of the column for each document, indexed by document id
+    """
+    if isinstance(df, pd.DataFrame):
+        return df[column].to_numpy(dtype=np.float64)
+    return np.asarray(getattr(df, column + "s"), dtype=np.float64)
+
+
+class Scorer(ABC):
+    def __init__(self, df: pd.DataFrame | DocumentTable, ndocs: int | None = None):
+        """Base class for ranking functions. A scorer scores a document as the sum of the contributions of the query words it contains, so it can be used by any of the rankers in `scoring_functions`.
+
+        Everything a scorer needs about the collection (number of documents, document lengths, norms) is read from the columns precomputed while building the index when the scorer is created, so scoring a query never goes over the corpus.
+
+        Args:
+            df (pd.DataFrame | DocumentTable): dataframe containing the corpus, or its document table (see `load_engine`)
+            ndocs (int | None, optional): number of documents in the whole collection, when df only holds a shard of it (see `sharded_search`). Defaults to None (len(df)).
+
+        Returns:
+            None
+        """
+        self.ndocs: int = len(df) if ndocs is None else ndocs
+
+    @abstractmethod
+    def term_score(self, tf: int, _df: int, doc_id: int):
+        """Contribution of one query word to the score of a document
+
+        Args:
+            tf (int): term frequency of the word in the document
+            _df (int): document frequency of the word
+            doc_id (int): document id
+
+        Returns:
+            float: contribution to the score
+        """
+
+    @abstractmethod
+    def upper_bound(self, max_tf: int, _df: int):
+        """Largest contribution the word can make to the score of any document (used for MaxScore pruning)
+
+        Args:
+            max_tf (int): largest term frequency of the word in any document
+            _df (int): document frequency of the word
+
+        Returns:
+            float: upper bound of `term_score` for the word
+        """
+
+
+class TfIdfScorer(Scorer):
+    """Plain (unnormalized) tf*idf, the default ranking function"""
+
+    def term_score(self, tf: int, _df: int, doc_id: int):
+        return tfidf(tf, _df, self.ndocs)
+
+    def upper_bound(self, max_tf: int, _df: int):
+        return tfidf(max_tf, _df, self.ndocs)
+
+
+class CosineTfIdfScorer(Scorer):
+    def __init__(self, df: pd.DataFrame | DocumentTable, ndocs: int | None = None, norms: np.ndarray | None = None):
+        """tf*idf normalized by the norm of the document's tf*idf vector (cosine similarity up to the query norm, which is the same for every document), so long paragraphs do not win just by containing more words
+
+        Args:
+            df (pd.DataFrame | DocumentTable): dataframe containing the corpus (or its document table), with the norms computed while building the index
+            ndocs (int | None, optional): number of documents in the whole collection, when df only holds a shard of it (its norms then have to be computed with the document frequencies of the whole collection). Defaults to None (len(df)).
+            norms (np.ndarray | None, optional): norm of each document, in place of the saved ones (e.g. the norms of a shard computed with the document frequencies of the collection). Defaults to None.
+
+        Returns:
+            None
+        """
+        super().__init__(df, ndocs)
+        self.norms: np.ndarray = document_column(df, "norm") if norms is None else norms
+        nonzero = self.norms[self.norms > 0]
+        self.min_norm: float = float(nonzero.min()) if len(nonzero) else 1.0
+
+    def term_score(self, tf: int, _df: int, doc_id: int):
+        return tfidf(tf, _df, self.ndocs) / self.norms[doc_id]
+
+    def upper_bound(self, max_tf: int, _df: int):
+        return tfidf(max_tf, _df, self.ndocs) / self.min_norm
+
+
+class BM25Scorer(Scorer):
+    def __init__(
+        self,
+        df: pd.DataFrame | DocumentTable,
+        k1: float = 1.2,
+        b: float = 0.75,
+        ndocs: int | None = None,
+        average_length: float | None = None,
+    ):
+        """Okapi BM25: saturating term frequency and document length normalization relative to the average document length
+
+        Args:
+            df (pd.DataFrame | DocumentTable): dataframe containing the corpus (or its document table), with the lengths computed while building the index
+            k1 (float, optional): term frequency saturation. Defaults to 1.2.
+            b (float, optional): strength of the length normalization (0 is none, 1 is full). Defaults to 0.75.
+            ndocs (int | None, optional): number of documents in the whole collection, when df only holds a shard of it. Defaults to None (len(df)).
+            average_length (float | None, optional): average document length of the whole collection, when df only holds a shard of it. Defaults to None (average length in df).
+
+        Returns:
+            None
+        """
+        super().__init__(df, ndocs)
+        self.k1 = k1
+        self.b = b
+        lengths = document_column(df, "length")
+        if average_length is None:
+            average_length = float(lengths.mean()) if len(lengths) else 1.0
+        self.average_length: float = average_length
+        # k1 * length normalization of every document, so a term score is a lookup and a few operations
+        self.length_norms: np.ndarray = k1 * (
+            1 - b + b * lengths / (self.average_length or 1.0)
+        )
+        self.min_length_norm: float = (
+            float(self.length_norms.min()) if len(lengths) else k1
+        )
+
+    def idf(self, _df: int):
+        """BM25 inverse document frequency (never negative)
+
+        Args:
+            _df (int): document frequency of the word
+
+        Returns:
+            float: inverse document frequency
+        """
+        return np.log(1 + (self.ndocs - _df + 0.5) / (_df + 0.5))
+
+    def term_score(self, tf: int, _df: int, doc_id: int):
+        return self.idf(_df) * tf * (self.k1 + 1) / (tf + self.length_norms[doc_id])
+
+    def upper_bound(self, max_tf: int, _df: int):
+        return self.idf(_df) * max_tf * (self.k1 + 1) / (max_tf + self.min_length_norm)
@@ -3,95 +3,209 @@
 # License: GNU General Public License v3.0
 
 # importing libraries
-import numpy as np
-import sys
-import spacy
+import heapq
 import pandas as pd
-from LinkedList import LinkedList
-from wildcard_query_functions import (
-    left_permuterm_indexing,
-    query_permuterm_index,
-    right_permuterm_indexing,
-)
+from array import array
+from collections import Counter
+from collections.abc import Mapping
+from itertools import accumulate
+from postings import PostingsList
+from permuterm import PermutermIndex
+from merge_functions import gallop_to
+from index_io import DocumentTable
+from scorers import Scorer, TfIdfScorer
+from wildcard_query_functions import query_permuterm_index
+from query_analyzer import QueryAnalyzer, default_analyzer
 
 
-# loading the spacy model for lemmitization of queries
-nlp = spacy.load("en_core_web_sm")
-
-# setting recursion limit for functions on linked list
-sys.setrecursionlimit(10000)
-
-
-def tfidf(tf: int, _df: int, ndocs: int):
-    """Calculates the tf*idf score for a given term frequency and document frequency
+def get_scoring_words(
+    queries: list[str],
+    inverted_list: dict[str, PostingsList],
+    perm_index: PermutermIndex,
+    analyzer: QueryAnalyzer | None = None,
+):
+    """Lemmatizes the query words and expands wildcards into the words of the corpus that contribute to the score
 
     Args:
-        tf (int): term frequency
-        _df (int): document frequency
-        ndocs (int): total number of documents in the corpus
+        queries (list[str]): list of query words
+        inverted_list (dict[str, PostingsList]): inverted index for each word in the corpus
+        perm_index (PermutermIndex): permuterm index (sorted rotation array) of the words in the corpus
+        analyzer (QueryAnalyzer | None, optional): query analyzer lemmatizing the query words. Defaults to None (shared analyzer without a lemma table).
 
     Returns:
-        float: tf*idf score
+        list[str]: words of the corpus to be scored (a word appears once for every query word it matches)
     """
-    return (np.log(1 + tf)) * (np.log((1 + ndocs) / (_df + 1)) + 1)
+    # removing quotes from queries
+    queries = [q.replace('"', "") for q in queries]
+    # lemmatizing queries
+    if analyzer is None:
+        analyzer = default_analyzer()
+    lemmas = analyzer.analyze(q for q in queries if "*" not in q)
+    queries = [lemmas[q] if "*" not in q else q for q in queries]
+    words: list[str] = []
+    for query in queries:
+        if "*" not in query:
+            matches = [query]
+        else:
+            # all the words matching the wildcard contribute to the score
+            matches = query_permuterm_index(
+                query, perm_index, inverted_list, ret_words=True
+            )
+        words.extend(word for word in matches if word in inverted_list)
+    return words
 
 
 def get_term_frequency_scores(
-    df: pd.DataFrame,
+    df: pd.DataFrame | DocumentTable,
     queries: list[str],
-    inverted_list: dict[str, LinkedList],
-    perm_index: dict[str, LinkedList],
-    rev_perm_index: dict[str, LinkedList],
+    inverted_list: dict[str, PostingsList],
+    perm_index: PermutermIndex,
+    scorer: Scorer | None = None,
+    analyzer: QueryAnalyzer | None = None,
+    document_frequencies: Mapping[str, int] | None = None,
 ):
-    """Calculates the tf*idf scores for each document in the corpus
+    """Calculates the scores (tf*idf by default) for each document in the corpus containing at least one of the query words. Term frequencies and document frequencies are read from the inverted index (computed while building it), so only the postings of the query words are visited
 
     Args:
-        df (pd.DataFrame): dataframe containing the corpus
+        df (pd.DataFrame | DocumentTable): dataframe containing the corpus, or its document table
         queries (list[str]): list of query words
-        inverted_list (dict[str, LinkedList]): inverted index for each word in the corpus
-        perm_index (dict[str, LinkedList]): permuterm index for each possible rotation of words in the corpus
-        rev_perm_index (dict[str, LinkedList]): reverse permuterm index for each possible rotation of words in the corpus
+        inverted_list (dict[str, PostingsList]): inverted index (with term frequencies) for each word in the corpus
+        perm_index (PermutermIndex): permuterm index (sorted rotation array) of the words in the corpus
+        scorer (Scorer | None, optional): ranking function. Defaults to None (TfIdfScorer).
+        analyzer (QueryAnalyzer | None, optional): query analyzer lemmatizing the query words. Defaults to None (shared analyzer without a lemma table).
+        document_frequencies (Mapping[str, int] | None, optional): document frequency of each word in the whole collection, when the inverted index only covers a shard of it (see `sharded_search`). Defaults to None (the lengths of the postings lists).
 
     Returns:
-        list[tuple[int, float]]: sorted (descending based on score) list of tuples containing document id and tf*idf score
+        list[tuple[int, float]]: sorted (descending based on score) list of tuples containing document id and score
     """
-    # removing quotes from queries
-    queries = [q.replace('"', "") for q in queries]
-    # lemmatizing queries
-    queries = [nlp(q)[0].lemma_ if "*" not in q else q for q in queries]
+    if scorer is None:
+        scorer = TfIdfScorer(df)
     scores: dict[int, float] = {}
-    for index, row in df.iterrows():
-        score = 0
-        text: str = row["tokenized"]
-        for query in queries:
-            if "*" not in query:
-                tf = text.count(query)
-                if query in inverted_list:
-                    _df = len(inverted_list[query])
-                    score += tfidf(tf, _df, len(df))
-            else:
-                if query[-1] == "*":
-                    left_matches = left_permuterm_indexing(query, perm_index)
-                    for word in left_matches:
-                        _df = len(inverted_list[word])
-                        tf = text.count(word)
-                        score += tfidf(tf, _df, len(df))
-                elif query[0] == "*":
-                    right_matches = right_permuterm_indexing(query, rev_perm_index)
-                    for word in right_matches:
-                        _df = len(inverted_list[word])
-                        tf = text.count(word)
-                        score += tfidf(tf, _df, len(df))
-                else:
-                    matches = query_permuterm_index(
-                        query, perm_index, rev_perm_index, inverted_list, True
-                    )
-                    for word in matches:
-                        _df = len(inverted_list[word])
-                        tf = text.count(word)
-                        score += tfidf(tf, _df, len(df))
-        scores[index] = score
+    for word in get_scoring_words(queries, inverted_list, perm_index, analyzer):
+        postings = inverted_list[word]
+        _df = len(postings) if document_frequencies is None else document_frequencies[word]
+        for doc_id, tf in postings.items():
+            scores[doc_id] = scores.get(doc_id, 0) + scorer.term_score(tf, _df, doc_id)
     sorted_scores: list[tuple[int, float]] = sorted(
-        scores.items(), key=lambda x: x[1], reverse=True
+        scores.items(), key=lambda x: (-x[1], x[0])
     )
     return sorted_scores
+
+
+def get_top_k_scores(
+    df: pd.DataFrame | DocumentTable,
+    queries: list[str],
+    inverted_list: dict[str, PostingsList],
+    perm_index: PermutermIndex,
+    candidates: list[int] | None = None,
+    k: int | None = None,
+    scorer: Scorer | None = None,
+    analyzer: QueryAnalyzer | None = None,
+    document_frequencies: Mapping[str, int] | None = None,
+):
+    """Calculates the top k scores (tf*idf by default), document at a time with MaxScore pruning.
+
+    Query words are sorted by their maximum possible contribution (the scorer's upper bound for their largest term frequency). Once the k-th best
+    score so far is at least the sum of the smallest maximum contributions, those words become non essential: only documents
+    containing an essential word are visited, and the non essential words are only looked up (galloping through their postings)
+    while the document can still make it into the top k. A bounded heap keeps the k best documents.
+
+    Args:
+        df (pd.DataFrame | DocumentTable): dataframe containing the corpus, or its document table
+        queries (list[str]): list of query words
+        inverted_list (dict[str, PostingsList]): inverted index (with term frequencies) for each word in the corpus
+        perm_index (PermutermIndex): permuterm index (sorted rotation array) of the words in the corpus
+        candidates (list[int] | None, optional): documents allowed in the results (e.g. the boolean filter results). Defaults to None (all documents).
+        k (int | None, optional): number of results to be returned. Defaults to None (all matching documents, no pruning).
+        scorer (Scorer | None, optional): ranking function. Defaults to None (TfIdfScorer).
+        analyzer (QueryAnalyzer | None, optional): query analyzer lemmatizing the query words. Defaults to None (shared analyzer without a lemma table).
+        document_frequencies (Mapping[str, int] | None, optional): document frequency of each word in the whole collection, when the inverted index only covers a shard of it (see `sharded_search`). Defaults to None (the lengths of the postings lists).
+
+    Returns:
+        list[tuple[int, float]]: sorted (descending based on score) list of at most k tuples containing document id and score
+    """
+    if scorer is None:
+        scorer = TfIdfScorer(df)
+    allowed = set(candidates) if candidates is not None else None
+    # a word matched by several query words counts once for each of them
+    multipliers = Counter(
+        get_scoring_words(queries, inverted_list, perm_index, analyzer)
+    )
+    if k is None:
+        scores = get_term_frequency_scores(
+            df, queries, inverted_list, perm_index, scorer, analyzer, document_frequencies
+        )
+        if allowed is None:
+            return scores
+        return [x for x in scores if x[0] in allowed]
+    if k <= 0:
+        return []
+
+    # (maximum contribution, multiplier, document frequency, doc IDs, term frequencies, number of postings) for every word, cheapest word first
+    terms: list[tuple[float, int, int, array, array, int]] = []
+    for word, multiplier in multipliers.items():
+        postings = inverted_list[word]
+        _df = len(postings) if document_frequencies is None else document_frequencies[word]
+        upper_bound = multiplier * scorer.upper_bound(postings.max_frequency, _df)
+        terms.append(
+            (
+                upper_bound,
+                multiplier,
+                _df,
+                postings.to_array(),
+                array("I", postings.frequencies()),
+                len(postings),
+            )
+        )
+    terms.sort(key=lambda x: x[0])
+    # cumulative[i] is the largest score a document can get from words 0..i
+    cumulative = list(accumulate(term[0] for term in terms))
+    positions = [0] * len(terms)
+
+    # min heap of (score, -doc id), so the root is the result that would be dropped first
+    heap: list[tuple[float, int]] = []
+    threshold = float("-inf")
+    first_essential = 0
+    while first_essential < len(terms):
+        doc_id = min(
+            (
+                terms[i][3][positions[i]]
+                for i in range(first_essential, len(terms))
+                if positions[i] < terms[i][5]
+            ),
+            default=None,
+        )
+        if doc_id is None:
+            break
+        score = 0
+        for i in range(first_essential, len(terms)):
+            _, multiplier, _df, doc_ids, frequencies, length = terms[i]
+            position = positions[i]
+            if position < length and doc_ids[position] == doc_id:
+                score += multiplier * scorer.term_score(frequencies[position], _df, doc_id)
+                positions[i] = position + 1
+        if allowed is not None and doc_id not in allowed:
+            continue
+        for i in range(first_essential - 1, -1, -1):
+            if score + cumulative[i] <= threshold:
+                # even with every remaining word it can not beat the current top k
+                break
+            _, multiplier, _df, doc_ids, frequencies, length = terms[i]
+            position = gallop_to(doc_ids, doc_id, positions[i])
+            positions[i] = position
+            if position < length and doc_ids[position] == doc_id:
+                score += multiplier * scorer.term_score(frequencies[position], _df, doc_id)
+        if len(heap) < k:
+            heapq.heappush(heap, (score, -doc_id))
+        elif score > threshold:
+            heapq.heapreplace(heap, (score, -doc_id))
+        else:
+            continue
+        if len(heap) == k:
+            threshold = heap[0][0]
+            while (
+                first_essential < len(terms)
+                and cumulative[first_essential] <= threshold
+            ):
+                first_essential += 1
+    return sorted(((-doc, score) for score, doc in heap), key=lambda x: (-x[1], x[0]))
@@ -0,0 +1,328 @@
+# Copyright © 2023 Arunachala Amuda Murugan (@majimearun)
+#
+# License: GNU General Public License v3.0
+
+# importing libraries
+import re
+from collections.abc import Iterator, Sequence
+import pandas as pd
+from index_io import DocumentTable
+from summarizer import Summarizer, default_summarizer
+
+_RULE = "------------------------------------------------------------------------------------------"
+
+
+class DataFrameDocuments:
+    def __init__(self, df: pd.DataFrame):
+        """Document lookups by doc ID over the engine dataframe, with the same methods as `DocumentTable`, so results can read their documents from either
+
+        Args:
+            df (pd.DataFrame): dataframe containing the corpus, indexed by doc ID
+
+        Returns:
+            None
+        """
+        self.df = df
+
+    def __len__(self):
+        """Number of documents"""
+        return len(self.df)
+
+    def document_name(self, doc_id: int):
+        """Name of the pdf a document (paragraph) comes from
+
+        Args:
+            doc_id (int): doc ID
+
+        Returns:
+            str: document name
+        """
+        return str(self.df.at[doc_id, "document_name"])
+
+    def page_number(self, doc_id: int):
+        """Page number (0 indexed) of a document
+
+        Args:
+            doc_id (int): doc ID
+
+        Returns:
+            int: page number
+        """
+        return int(self.df.at[doc_id, "page_number"])
+
+    def paragraph_number(self, doc_id: int):
+        """Paragraph number (0 indexed) of a document in its page
+
+        Args:
+            doc_id (int): doc ID
+
+        Returns:
+            int: paragraph number
+        """
+        return int(self.df.at[doc_id, "paragraph_number"])
+
+    def text(self, doc_id: int):
+        """Raw text of a document (paragraph)
+
+        Args:
+            doc_id (int): doc ID
+
+        Returns:
+            str: raw text
+        """
+        text = self.df.at[doc_id, "text"]
+        # empty paragraphs are read back from the csv as NaN
+        return "" if pd.isna(text) else str(text)
+
+
+class SearchResult:
+    def __init__(self, results: "SearchResults", i: int):
+        """One hit of a search. The doc ID and score come from the ranking, everything else is read from the doc store when asked for
+
+        Args:
+            results (SearchResults): results the hit belongs to
+            i (int): position of the hit in the results
+
+        Returns:
+            None
+        """
+        self._results = results
+        self._i = i
+
+    @property
+    def rank(self):
+        """Rank of the hit (1 for the best one)"""
+        return self._results.first_rank + self._i
+
+    @property
+    def doc_id(self):
+        """Doc ID of the hit"""
+        return self._results.doc_ids[self._i]
+
+    @property
+    def score(self):
+        """Score of the hit (None for unranked searches)"""
+        return self._results.scores[self._i]
+
+    @property
+    def document_name(self):
+        """Name of the pdf the paragraph comes from"""
+        return self._results.documents.document_name(self.doc_id)
+
+    @property
+    def page_number(self):
+        """Page number of the paragraph (1 indexed, as printed)"""
+        return self._results.documents.page_number(self.doc_id) + 1
+
+    @property
+    def paragraph_number(self):
+        """Paragraph number in its page (1 indexed, as printed)"""
+        return self._results.documents.paragraph_number(self.doc_id) + 1
+
+    @property
+    def text(self):
+        """Raw text of the paragraph"""
+        return self._results.documents.text(self.doc_id)
+
+    @property
+    def summary(self):
+        """Summary of the paragraph, read from the summary store or generated the first time it is asked for"""
+        return self._results.summary(self._i)
+
+    def to_dict(self, text: bool = True):
+        """Plain (JSON serializable) form of the hit
+
+        Args:
+            text (bool, optional): whether to include the text of the paragraph. Defaults to True.
+
+        Returns:
+            dict: rank, doc ID, score, document name, page number, paragraph number and (optionally) text
+        """
+        hit = {
+            "rank": self.rank,
+            "doc_id": int(self.doc_id),
+            "score": None if self.score is None else float(self.score),
+            "document_name": self.document_name,
+            "page_number": self.page_number,
+            "paragraph_number": self.paragraph_number,
+        }
+        if text:
+            hit["text"] = self.text
+        return hit
+
+    def __repr__(self):
+        return f"SearchResult(rank={self.rank}, doc_id={self.doc_id}, score={self.score})"
+
+
+class SearchResults(Sequence):
+    def __init__(
+        self,
+        scores: list[tuple[int, float | None]],
+        documents: "pd.DataFrame | DocumentTable | DataFrameDocuments",
+        ranked: bool = True,
+        query: str = "",
+        corrected_query: str | None = None,
+        first_rank: int = 1,
+        summaries: dict[int, str] | None = None,
+        summarizer: Summarizer | None = None,
+    ):
+        """Lazy results of a search: the doc IDs and scores of the hits, best first. The document name, page, paragraph and text of a hit are only read from the doc store when asked for, and summaries are only generated for the hits they are asked for (e.g. the ones printed), so results can be paged through without formatting or summarizing the hits that are never shown
+
+        Args:
+            scores (list[tuple[int, float | None]]): doc ID and score of each hit, best first
+            documents (pd.DataFrame | DocumentTable | DataFrameDocuments): doc store the hits are read from (the engine dataframe, the columnar `DocumentTable`, or anything else with the methods of `DataFrameDocuments`)
+            ranked (bool, optional): whether the hits are ranked. Defaults to True.
+            query (str, optional): query string. Defaults to "".
+            corrected_query (str | None, optional): query after spell check, if the original one found nothing. Defaults to None.
+            first_rank (int, optional): rank of the first hit (for a page of larger results). Defaults to 1.
+            summaries (dict[int, str] | None, optional): summaries generated so far, by doc ID (shared with the pages of the results). Defaults to None.
+            summarizer (Summarizer | None, optional): summarization stage (batched pipeline calls and persistent cache). Defaults to None (the default summarizer, loaded on first use).
+
+        Returns:
+            None
+        """
+        self._scores = scores
+        self.documents = DataFrameDocuments(documents) if isinstance(documents, pd.DataFrame) else documents
+        self.ranked = ranked
+        self.query = query
+        self.corrected_query = corrected_query
+        self.first_rank = first_rank
+        self._summaries = summaries if summaries is not None else {}
+        self.summarizer = summarizer
+
+    @property
+    def doc_ids(self):
+        """Doc IDs of the hits, best first"""
+        return [doc_id for doc_id, _ in self._scores]
+
+    @property
+    def scores(self):
+        """Scores of the hits, best first (None for unranked searches)"""
+        return [score for _, score in self._scores]
+
+    def __len__(self):
+        """Number of hits"""
+        return len(self._scores)
+
+    def __getitem__(self, i: int | slice):
+        """Hit at a position, or the hits of a slice (as results keeping their ranks)
+
+        Args:
+            i (int | slice): position or slice
+
+        Returns:
+            SearchResult | SearchResults: hit or hits
+        """
+        if isinstance(i, slice):
+            start, _, step = i.indices(len(self))
+            if step != 1:
+                raise ValueError("slices of search results can not have a step")
+            return SearchResults(
+                self._scores[i],
+                self.documents,
+                self.ranked,
+                self.query,
+                self.corrected_query,
+                self.first_rank + start,
+                self._summaries,
+                self.summarizer,
+            )
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("search result index out of range")
+        return SearchResult(self, i)
+
+    def __iter__(self) -> Iterator[SearchResult]:
+        for i in range(len(self)):
+            yield SearchResult(self, i)
+
+    def __repr__(self):
+        return f"SearchResults(query={self.query!r}, hits={len(self)}, ranked={self.ranked})"
+
+    def page(self, number: int, size: int = 10):
+        """One page of the hits
+
+        Args:
+            number (int): page number (0 for the best hits)
+            size (int, optional): number of hits per page. Defaults to 10.
+
+        Returns:
+            SearchResults: hits of the page
+        """
+        return self[number * size : (number + 1) * size]
+
+    def summary(self, i: int):
+        """Summary of the hit at a position (see `summaries`)
+
+        Args:
+            i (int): position of the hit
+
+        Returns:
+            str: summary of the paragraph
+        """
+        return self.summaries(i, i + 1)[0]
+
+    def summaries(self, start: int = 0, stop: int | None = None):
+        """Summaries of the hits between two positions. Summaries missing from the summary store are generated together, in a single batched pipeline call
+
+        Args:
+            start (int, optional): position of the first hit. Defaults to 0.
+            stop (int | None, optional): position after the last hit. Defaults to None (the last hit).
+
+        Returns:
+            list[str]: summary of each hit
+        """
+        doc_ids = [doc_id for doc_id, _ in self._scores[start:stop]]
+        missing = list(dict.fromkeys(doc_id for doc_id in doc_ids if doc_id not in self._summaries))
+        if missing:
+            if self.summarizer is None:
+                self.summarizer = default_summarizer()
+            texts = [self.documents.text(doc_id) for doc_id in missing]
+            self._summaries.update(zip(missing, self.summarizer.summarize(texts)))
+        return [self._summaries[doc_id] for doc_id in doc_ids]
+
+    def to_list(self, text: bool = True):
+        """Plain (JSON serializable) form of the hits
+
+        Args:
+            text (bool, optional): whether to include the text of the paragraphs. Defaults to True.
+
+        Returns:
+            list[dict]: hits (see `SearchResult.to_dict`), best first
+        """
+        return [result.to_dict(text) for result in self]
+
+    def print(self, show_summary: bool = False):
+        """Prints the hits, with their summaries if asked for (only the printed hits are summarized)
+
+        Args:
+            show_summary (bool, optional): whether to show the summary of every hit. Defaults to False.
+
+        Returns:
+            None
+        """
+        print(f"Documents Retrieved: {len(self)}")
+        if not self.ranked:
+            print("Unranked Search Results: Boolean Retrieval")
+        print(_RULE)
+        print(_RULE)
+        if show_summary:
+            # every hit printed is summarized in one go
+            self.summaries()
+        for result in self:
+            print(f"Rank: {result.rank}")
+            print(f"Document Name: {result.document_name}")
+            print(f"Page Number: {result.page_number}")
+            print(f"Paragraph Number: {result.paragraph_number}")
+            print(f"Score: {result.score}")
+            print(_RULE)
+            if show_summary:
+                print(f"Summary: {result.summary}")
+            print(_RULE)
+            # replace any number f spaces with a single space
+            print_text = re.sub(r"\s+", " ", result.text)
+            print(f"Paragraph Text: \n{print_text}")
+            print(_RULE)
+            print(_RULE)
+            print(_RULE)
@@ -0,0 +1,398 @@
+# Copyright © 2023 Arunachala Amuda Murugan (@majimearun)
+#
+# License: GNU General Public License v3.0
+
+# importing libraries
+import asyncio
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+from search_results import SearchResults
+from sharded_search import SCORERS, ShardSearcher
+
+# searcher of the executor process (see `_init_worker`)
+_searcher: ShardSearcher | None = None
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+def _init_worker(index_path: str):
+    """Opens the index once in every executor process, so requests never pay for loading it
+
+    Args:
+        index_path (str): path of the segment file
+
+    Returns:
+        None
+    """
+    global _searcher
+    _searcher = ShardSearcher(index_path)
+
+
+def _ping():
+    """Does nothing, submitted to start the executor processes up front"""
+    return None
+
+
+def _run_batch(queries: list[str], is_phrase: bool, ranked: bool, k: int | None, scorer: str):
+    """Searches a batch of queries with the same options in an executor process
+
+    Args:
+        queries (list[str]): query strings
+        is_phrase (bool): whether the queries are phrase queries
+        ranked (bool): whether the results are ranked
+        k (int | None): number of results per query (None for all of them)
+        scorer (str): name of the ranking function (see `SCORERS`)
+
+    Returns:
+        list[tuple[bool, object]]: for each query, True and its results (rank, doc ID, score, document name, page, paragraph and text of every result), or False and the error it raised
+    """
+    responses: list[tuple[bool, object]] = []
+    for query in queries:
+        try:
+            scores = _searcher.search(query, is_phrase, ranked, k, scorer)
+            responses.append((True, SearchResults(scores, _searcher.document_table, ranked, query).to_list()))
+        except Exception as e:
+            responses.append((False, e))
+    return responses
+
+
+class Overloaded(Exception):
+    """Raised when the request queue of the server is full"""
+
+
+class SearchServer:
+    def __init__(
+        self,
+        index_path: str,
+        processes: int = 2,
+        max_batch_size: int = 32,
+        max_wait: float = 0.005,
+        max_queue: int = 1024,
+    ):
+        """Asynchronous search service over a segment file (see `save_engine`), answering JSON over HTTP on a TCP port or a Unix socket. Requests arriving at about the same time are grouped into micro batches (up to max_batch_size requests, waiting at most max_wait seconds for more), and batches are searched in a pool of processes which load the index once, so the event loop never blocks on scoring. Requests wait in a bounded queue: once max_queue requests are waiting, new ones are turned down right away (HTTP 503) instead of piling up
+
+        Args:
+            index_path (str): path of the segment file
+            processes (int, optional): number of search processes (batches searched at the same time). Defaults to 2.
+            max_batch_size (int, optional): largest number of requests in a batch. Defaults to 32.
+            max_wait (float, optional): time in seconds a batch waits for more requests after its first one. Defaults to 0.005.
+            max_queue (int, optional): number of requests that can wait for a batch. Defaults to 1024.
+
+        Returns:
+            None
+        """
+        self.index_path = index_path
+        self.processes = processes
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self._executor: ProcessPoolExecutor | None = None
+        self._queue: asyncio.Queue | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._batcher: asyncio.Task | None = None
+        self._servers: list[asyncio.AbstractServer] = []
+        self._batches: set[asyncio.Task] = set()
+
+    async def start(self, host: str | None = "127.0.0.1", port: int = 8080, unix_path: str | None = None):
+        """Starts the search processes (each one opens the index) and listens for requests
+
+        Args:
+            host (str | None, optional): address to listen on over TCP, None to only listen on the Unix socket. Defaults to "127.0.0.1".
+            port (int, optional): TCP port. Defaults to 8080.
+            unix_path (str | None, optional): path of a Unix socket to listen on as well. Defaults to None.
+
+        Returns:
+            None
+        """
+        loop = asyncio.get_running_loop()
+        self._executor = ProcessPoolExecutor(self.processes, initializer=_init_worker, initargs=(self.index_path,))
+        await asyncio.gather(*(loop.run_in_executor(self._executor, _ping) for _ in range(self.processes)))
+        self._queue = asyncio.Queue(self.max_queue)
+        # at most one batch per process is handed to the executor, the others wait in the queue (where they are counted)
+        self._slots = asyncio.Semaphore(self.processes)
+        self._batcher = asyncio.create_task(self._batch_requests())
+        if host is not None:
+            self._servers.append(await asyncio.start_server(self._handle, host, port))
+        if unix_path is not None:
+            self._servers.append(await asyncio.start_unix_server(self._handle, unix_path))
+
+    async def serve_forever(self):
+        """Serves requests until the task is cancelled
+
+        Returns:
+            None
+        """
+        await asyncio.gather(*(server.serve_forever() for server in self._servers))
+
+    async def close(self):
+        """Stops listening, fails the requests still waiting and stops the search processes
+
+        Returns:
+            None
+        """
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+        if self._batcher is not None:
+            self._batcher.cancel()
+            await asyncio.gather(self._batcher, return_exceptions=True)
+            self._batcher = None
+        await asyncio.gather(*self._batches, return_exceptions=True)
+        while self._queue is not None and not self._queue.empty():
+            *_, future = self._queue.get_nowait()
+            future.cancel()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def search(
+        self,
+        query: str,
+        is_phrase: bool = False,
+        ranked: bool = True,
+        retrieve_n: int | None = 10,
+        scorer: str = "tfidf",
+    ):
+        """Searches a query, batched with the other requests waiting at the same time
+
+        Args:
+            query (str): query string
+            is_phrase (bool, optional): Whether the query is a phrase query or not. Defaults to False.
+            ranked (bool, optional): Whether the results should be ranked or not. Defaults to True.
+            retrieve_n (int | None, optional): Number of documents to be retrieved. Defaults to 10.
+            scorer (str, optional): ranking function (one of `SCORERS`). Defaults to "tfidf".
+
+        Raises:
+            Overloaded: if the request queue is full
+
+        Returns:
+            list[dict]: results (rank, doc ID, score, document name, page number, paragraph number and text), best first
+        """
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait(((is_phrase, ranked, retrieve_n, scorer), query, future))
+        except asyncio.QueueFull:
+            raise Overloaded(f"{self.max_queue} requests are already waiting") from None
+        return await future
+
+    async def _batch_requests(self):
+        """Takes requests off the queue into batches, and hands every batch to the executor once a process is free. Requests with different options go into separate batches
+
+        Returns:
+            None
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            groups: dict[tuple, list] = {}
+            for options, query, future in batch:
+                groups.setdefault(options, []).append((query, future))
+            for options, requests in groups.items():
+                await self._slots.acquire()
+                task = asyncio.create_task(self._run(options, requests))
+                self._batches.add(task)
+                task.add_done_callback(self._batches.discard)
+
+    async def _run(self, options: tuple, requests: list):
+        """Searches a batch in the executor and resolves the futures of its requests
+
+        Args:
+            options (tuple): is_phrase, ranked, retrieve_n and scorer of the batch
+            requests (list): query and future of every request
+
+        Returns:
+            None
+        """
+        try:
+            responses = await asyncio.get_running_loop().run_in_executor(
+                self._executor, _run_batch, [query for query, _ in requests], *options
+            )
+        except Exception as e:
+            responses = [(False, e)] * len(requests)
+        finally:
+            self._slots.release()
+        for (_, future), (ok, result) in zip(requests, responses):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(result)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answers one HTTP request: `GET /search?q=...` (options `k`, `phrase`, `ranked`, `scorer`) or `POST /search` with the same options in a JSON body (`query` instead of `q`), and `GET /health`
+
+        Args:
+            reader (asyncio.StreamReader): request stream
+            writer (asyncio.StreamWriter): response stream
+
+        Returns:
+            None
+        """
+        try:
+            status, body = await self._respond(reader)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        payload = json.dumps(body).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            "Connection: close\r\n\r\n".encode("ascii")
+            + payload
+        )
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, reader: asyncio.StreamReader):
+        """Reads an HTTP request and computes the response
+
+        Args:
+            reader (asyncio.StreamReader): request stream
+
+        Returns:
+            tuple[int, dict]: HTTP status and JSON body
+        """
+        request_line = (await reader.readline()).decode("latin-1").split()
+        headers: dict[str, str] = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if len(request_line) < 2:
+            return 400, {"error": "malformed request"}
+        method, target = request_line[0], urlsplit(request_line[1])
+        if target.path == "/health":
+            return 200, {"status": "ok", "queued": self._queue.qsize()}
+        if target.path != "/search":
+            return 404, {"error": f"no such endpoint {target.path}"}
+        if method == "GET":
+            params = {name: values[-1] for name, values in parse_qs(target.query).items()}
+        elif method == "POST":
+            try:
+                params = json.loads(await reader.readexactly(int(headers.get("content-length", 0))) or b"{}")
+            except ValueError:
+                return 400, {"error": "body is not valid JSON"}
+        else:
+            return 405, {"error": f"method {method} not allowed"}
+
+        try:
+            query = str(params.get("q", params.get("query", ""))).strip()
+            is_phrase = _flag(params.get("phrase", False))
+            ranked = _flag(params.get("ranked", True))
+            k = params.get("k", 10)
+            k = None if k is None or k == "all" else int(k)
+            scorer = str(params.get("scorer", "tfidf"))
+        except (TypeError, ValueError) as e:
+            return 400, {"error": str(e)}
+        if not query:
+            return 400, {"error": "missing query"}
+        if k is not None and k < 1:
+            return 400, {"error": f"k must be at least 1, got {k}"}
+        if scorer not in SCORERS:
+            return 400, {"error": f"unknown scorer {scorer!r}, expected one of {list(SCORERS)}"}
+
+        start = time.perf_counter()
+        try:
+            results = await self.search(query, is_phrase, ranked, k, scorer)
+        except Overloaded as e:
+            return 503, {"error": str(e)}
+        except Exception as e:
+            # the options are validated above, so a failed search is the server's fault
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+        return 200, {
+            "query": query,
+            "results": results,
+            "took_ms": round(1000 * (time.perf_counter() - start), 3),
+        }
+
+
+def _flag(value: object):
+    """Reads a boolean option of a request (JSON boolean, or 1/0, true/false, yes/no in a query string)
+
+    Args:
+        value (object): option value
+
+    Raises:
+        ValueError: if the value is not a boolean
+
+    Returns:
+        bool: option value
+    """
+    if isinstance(value, bool):
+        return value
+    text = str(value).lower()
+    if text in ("1", "true", "yes"):
+        return True
+    if text in ("0", "false", "no"):
+        return False
+    raise ValueError(f"expected a boolean, got {value!r}")
+
+
+async def serve(index_path: str, host: str | None = "127.0.0.1", port: int = 8080, unix_path: str | None = None, **kwargs):
+    """Runs a `SearchServer` until it is cancelled
+
+    Args:
+        index_path (str): path of the segment file
+        host (str | None, optional): address to listen on over TCP. Defaults to "127.0.0.1".
+        port (int, optional): TCP port. Defaults to 8080.
+        unix_path (str | None, optional): path of a Unix socket to listen on as well. Defaults to None.
+        kwargs: options of `SearchServer`
+
+    Returns:
+        None
+    """
+    server = SearchServer(index_path, **kwargs)
+    await server.start(host, port, unix_path)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    # Run this file from the src directory after setup.py saved the index, then query it with e.g. curl "http://127.0.0.1:8080/search?q=data+protection&k=5"
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve the search engine over HTTP")
+    parser.add_argument("index_path", nargs="?", default="../data/index/engine.idx")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix", default=None, help="path of a Unix socket to listen on as well")
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-queue", type=int, default=1024)
+    args = parser.parse_args()
+    try:
+        asyncio.run(
+            serve(
+                args.index_path,
+                args.host,
+                args.port,
+                args.unix,
+                processes=args.processes,
+                max_batch_size=args.max_batch_size,
+                max_queue=args.max_queue,
+            )
+        )
+    except KeyboardInterrupt:
+        pass
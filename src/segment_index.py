@@ -0,0 +1,720 @@
+# Copyright © 2023 Arunachala Amuda Murugan (@majimearun)
+#
+# License: GNU General Public License v3.0
+
+# importing libraries
+import bisect
+import heapq
+import itertools
+import json
+import os
+import threading
+from array import array
+from collections import ChainMap
+from collections.abc import Iterator, Mapping
+import numpy as np
+import pandas as pd
+from postings import PostingsList
+from permuterm import PermutermIndex
+from term_dictionary import TermDictionary
+from spelling_index import SpellingIndex
+from autocomplete_index import AutocompleteIndex
+from query_analyzer import QueryAnalyzer
+from index_io import DocumentTable, IndexReader, IndexWriter
+from scorers import document_norms
+from setup import build_engine, create_inverted_list, prepare_documents
+
+# columns of a document (as in the tokenized csv files)
+DOCUMENT_COLUMNS = ["document_name", "page_number", "paragraph_number", "text", "tokenized"]
+
+# number of every SegmentedIndex of the process, part of the generation of its snapshots
+_index_numbers = itertools.count()
+
+
+class Segment:
+    def __init__(
+        self,
+        name: str | None,
+        inverted_list: Mapping[str, PostingsList],
+        documents: DocumentTable,
+        lemmas: Mapping[str, str],
+        deleted: bytearray | None = None,
+    ):
+        """Immutable part of a segmented index: the positional inverted index and documents of a batch of added documents (local doc IDs 0..n-1), along with a tombstone bitmap of its deleted documents. Only the tombstones change after the segment is written
+
+        Args:
+            name (str | None): name of the segment file, None for the in memory segment of documents not flushed yet
+            inverted_list (Mapping[str, PostingsList]): positional inverted index of the segment
+            documents (DocumentTable): document table of the segment (with the lengths and norms), indexed by local doc ID
+            lemmas (Mapping[str, str]): lemma table of the words of the segment (see `QueryAnalyzer`)
+            deleted (bytearray | None, optional): tombstone bitmap (bit i set if local doc ID i is deleted). Defaults to None (nothing deleted).
+
+        Returns:
+            None
+        """
+        self.name = name
+        self.inverted_list = inverted_list
+        self.documents = documents
+        self.lemmas = lemmas
+        self.deleted = deleted if deleted is not None else bytearray((len(documents) + 7) // 8)
+
+    @classmethod
+    def open(cls, directory: str, name: str):
+        """Opens a segment file (memory mapped) and its tombstones
+
+        Args:
+            directory (str): directory of the segmented index
+            name (str): segment name
+
+        Returns:
+            Segment: segment
+        """
+        reader = IndexReader(os.path.join(directory, name + ".idx"))
+        deleted = None
+        tombstones_path = os.path.join(directory, name + ".del")
+        if os.path.exists(tombstones_path):
+            with open(tombstones_path, "rb") as f:
+                deleted = bytearray(f.read())
+        return cls(
+            name,
+            reader.inverted_list,
+            reader.documents,
+            reader.query_analyzer.lemmas,
+            deleted,
+        )
+
+    def __len__(self):
+        """Number of documents in the segment, deleted ones included"""
+        return len(self.documents)
+
+    def is_deleted(self, doc_id: int):
+        """Checks the tombstone of a local doc ID
+
+        Args:
+            doc_id (int): local doc ID
+
+        Returns:
+            bool: True if the document is deleted, False otherwise
+        """
+        return bool(self.deleted[doc_id >> 3] & (1 << (doc_id & 7)))
+
+    def delete(self, doc_id: int):
+        """Sets the tombstone of a local doc ID
+
+        Args:
+            doc_id (int): local doc ID
+
+        Returns:
+            None
+        """
+        self.deleted[doc_id >> 3] |= 1 << (doc_id & 7)
+
+
+def _doc_map(n_docs: int, deleted: bytes, base: int):
+    """Maps the local doc IDs of a segment to the doc IDs of a snapshot (live documents numbered consecutively from base, deleted ones mapped to -1)
+
+    Args:
+        n_docs (int): number of documents in the segment
+        deleted (bytes): tombstone bitmap
+        base (int): doc ID of the first live document
+
+    Returns:
+        tuple[array, int]: doc ID of every local doc ID, and the number of live documents
+    """
+    doc_map = array("i", bytes(4 * n_docs))
+    n_live = 0
+    for doc_id in range(n_docs):
+        if deleted[doc_id >> 3] & (1 << (doc_id & 7)):
+            doc_map[doc_id] = -1
+        else:
+            doc_map[doc_id] = base + n_live
+            n_live += 1
+    return doc_map, n_live
+
+
+class SnapshotInvertedList(Mapping):
+    def __init__(self, parts: list[tuple[Segment, array | None]], generation: tuple):
+        """Read only inverted index over the segments of a snapshot. The postings list of a word is the concatenation of its postings in every segment, with doc IDs mapped to snapshot doc IDs and deleted documents left out (positions included, so phrase queries work across segments)
+
+        Args:
+            parts (list[tuple[Segment, array | None]]): segments in doc ID order with their doc ID maps (None if the segment is the only one and has no deletions, its postings are used as they are)
+            generation (tuple): generation of the snapshot, changes whenever the index does (see `SearchCache`)
+
+        Returns:
+            None
+        """
+        self.parts = parts
+        self.generation = generation
+        # segments with deleted documents, only their postings need checking for live documents
+        self._has_deletions = [doc_map is not None and any(segment.deleted) for segment, doc_map in parts]
+        self._words: list[str] | None = None
+        self._term_dictionary: TermDictionary | None = None
+        # merged postings of the words looked up so far (None if no live document has the word), a snapshot never changes
+        self._postings: dict[str, PostingsList | None] = {}
+
+    def __getitem__(self, word: str):
+        """Postings list of a word
+
+        Raises:
+            KeyError: if no live document contains the word
+
+        Returns:
+            PostingsList: postings list (with positions) in snapshot doc IDs
+        """
+        if len(self.parts) == 1 and self.parts[0][1] is None:
+            return self.parts[0][0].inverted_list[word]
+        if word in self._postings:
+            postings = self._postings[word]
+        else:
+            postings = PostingsList()
+            for segment, doc_map in self.parts:
+                if word not in segment.inverted_list:
+                    continue
+                segment_postings = segment.inverted_list[word]
+                for doc_id, positions in zip(segment_postings, segment_postings.positions()):
+                    if doc_map[doc_id] != -1:
+                        postings.add_positions(doc_map[doc_id], positions)
+            if len(postings) == 0:
+                postings = None
+            self._postings[word] = postings
+        if postings is None:
+            raise KeyError(word)
+        return postings
+
+    def _is_live(self, word: str):
+        """Checks if a live document contains the word
+
+        Args:
+            word (str): word of one of the segments
+
+        Returns:
+            bool: True if the word occurs in a live document, False otherwise
+        """
+        for (segment, doc_map), has_deletions in zip(self.parts, self._has_deletions):
+            if word not in segment.inverted_list:
+                continue
+            if not has_deletions:
+                return True
+            if any(doc_map[doc_id] != -1 for doc_id in segment.inverted_list[word]):
+                return True
+        return False
+
+    @property
+    def words(self):
+        """Sorted words occurring in at least one live document (merged from the sorted words of the segments)"""
+        if self._words is None:
+            words: list[str] = []
+            any_deleted = any(self._has_deletions)
+            # the words of every segment are sorted in utf-8 byte order, which is code point order
+            for word in heapq.merge(*(sorted(segment.inverted_list) for segment, _ in self.parts)):
+                if words and words[-1] == word:
+                    continue
+                if not any_deleted or self._is_live(word):
+                    words.append(word)
+            self._words = words
+        return self._words
+
+    @property
+    def term_dictionary(self):
+        """Term dictionary (TermDictionary) of the live words"""
+        if self._term_dictionary is None:
+            self._term_dictionary = TermDictionary(self.words)
+        return self._term_dictionary
+
+    def __contains__(self, word: object):
+        return word in self.term_dictionary
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.words)
+
+    def __len__(self):
+        return len(self.words)
+
+
+class SnapshotDocuments:
+    def __init__(self, parts: list[tuple[Segment, array | None]], norms: np.ndarray):
+        """Read only document table of a snapshot, with the same methods as `DocumentTable`. A snapshot doc ID is mapped to a segment and a local doc ID, and the document is read from the document table of the segment, so nothing but the lengths and norms is copied
+
+        Args:
+            parts (list[tuple[Segment, array | None]]): segments in doc ID order with their doc ID maps (None if every document of the segment is live)
+            norms (np.ndarray): norm of each live document, indexed by snapshot doc ID
+
+        Returns:
+            None
+        """
+        self._tables: list[DocumentTable] = []
+        # first snapshot doc ID of every segment, and the local doc ID of every snapshot doc ID
+        self._starts: list[int] = []
+        self._local_ids = array("I")
+        lengths = []
+        for segment, doc_map in parts:
+            live = range(len(segment)) if doc_map is None else [i for i, doc_id in enumerate(doc_map) if doc_id != -1]
+            self._tables.append(segment.documents)
+            self._starts.append(len(self._local_ids))
+            self._local_ids.extend(live)
+            lengths.append(np.asarray(segment.documents.lengths, dtype=np.uint32)[list(live)])
+        self.lengths: np.ndarray = np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.uint32)
+        self.norms = norms
+
+    def __len__(self):
+        """Number of live documents"""
+        return len(self._local_ids)
+
+    def _locate(self, doc_id: int):
+        """Segment document table and local doc ID of a snapshot doc ID
+
+        Args:
+            doc_id (int): snapshot doc ID
+
+        Returns:
+            tuple[DocumentTable, int]: document table and local doc ID
+        """
+        # segments without live documents share the start of the next one
+        return self._tables[bisect.bisect_right(self._starts, doc_id) - 1], self._local_ids[doc_id]
+
+    def document_name(self, doc_id: int):
+        """Name of the pdf a document (paragraph) comes from
+
+        Args:
+            doc_id (int): snapshot doc ID
+
+        Returns:
+            str: document name
+        """
+        table, local_id = self._locate(doc_id)
+        return table.document_name(local_id)
+
+    def page_number(self, doc_id: int):
+        """Page number (0 indexed) of a document
+
+        Args:
+            doc_id (int): snapshot doc ID
+
+        Returns:
+            int: page number
+        """
+        table, local_id = self._locate(doc_id)
+        return table.page_number(local_id)
+
+    def paragraph_number(self, doc_id: int):
+        """Paragraph number (0 indexed) of a document in its page
+
+        Args:
+            doc_id (int): snapshot doc ID
+
+        Returns:
+            int: paragraph number
+        """
+        table, local_id = self._locate(doc_id)
+        return table.paragraph_number(local_id)
+
+    def text(self, doc_id: int):
+        """Raw text of a document (paragraph)
+
+        Args:
+            doc_id (int): snapshot doc ID
+
+        Returns:
+            str: raw text
+        """
+        table, local_id = self._locate(doc_id)
+        return table.text(local_id)
+
+    def tokenized(self, doc_id: int):
+        """Tokenized (lemmatized) text of a document (paragraph)
+
+        Args:
+            doc_id (int): snapshot doc ID
+
+        Returns:
+            str: tokenized text
+        """
+        table, local_id = self._locate(doc_id)
+        return table.tokenized(local_id)
+
+
+class Snapshot:
+    def __init__(self, segments: list[Segment], generation: tuple):
+        """Consistent, read only view of a segmented index at one point in time: later additions, deletions, flushes and merges do not change it. Documents are numbered consecutively over the live documents of the segments, in segment order. The indexes the engine searches with are built from the segments on first use
+
+        Args:
+            segments (list[Segment]): segments in doc ID order (tombstones frozen, see `SegmentedIndex.snapshot`)
+            generation (tuple): generation of the snapshot
+
+        Returns:
+            None
+        """
+        self.segments = segments
+        self.generation = generation
+        parts: list[tuple[Segment, array | None]] = []
+        base = 0
+        for segment in segments:
+            doc_map, n_live = _doc_map(len(segment), segment.deleted, base)
+            parts.append((segment, doc_map))
+            base += n_live
+        if len(segments) == 1 and not any(segments[0].deleted):
+            parts = [(segments[0], None)]
+        self.n_docs = base
+        self.inverted_list = SnapshotInvertedList(parts, generation)
+        self._perm_index: PermutermIndex | None = None
+        self._spelling_index: SpellingIndex | None = None
+        self._autocomplete_index: AutocompleteIndex | None = None
+        self._query_analyzer: QueryAnalyzer | None = None
+        self._documents: SnapshotDocuments | None = None
+
+    @property
+    def term_dictionary(self):
+        """Term dictionary (TermDictionary) of the live words"""
+        return self.inverted_list.term_dictionary
+
+    @property
+    def perm_index(self):
+        """Permuterm index (PermutermIndex) of the live words, for wildcard queries"""
+        if self._perm_index is None:
+            self._perm_index = PermutermIndex(self.term_dictionary)
+        return self._perm_index
+
+    @property
+    def spelling_index(self):
+        """Spelling index (SpellingIndex) of the live words"""
+        if self._spelling_index is None:
+            self._spelling_index = SpellingIndex(self.term_dictionary)
+        return self._spelling_index
+
+    @property
+    def autocomplete_index(self):
+        """Autocomplete index (AutocompleteIndex) of the live words"""
+        if self._autocomplete_index is None:
+            self._autocomplete_index = AutocompleteIndex.build(self.term_dictionary, self.inverted_list)
+        return self._autocomplete_index
+
+    @property
+    def query_analyzer(self):
+        """Query analyzer (QueryAnalyzer) over the lemma tables of all the segments"""
+        if self._query_analyzer is None:
+            self._query_analyzer = QueryAnalyzer(ChainMap(*(segment.lemmas for segment in self.segments)))
+        return self._query_analyzer
+
+    @property
+    def documents(self):
+        """Live documents (SnapshotDocuments, indexed by snapshot doc ID) read from the document tables of the segments, with their lengths and tf*idf norms over the whole snapshot"""
+        if self._documents is None:
+            if len(self.segments) == 1 and not any(self.segments[0].deleted):
+                norms = np.asarray(self.segments[0].documents.norms, dtype=np.float64)
+            else:
+                # idf depends on the whole collection, so the norms stored with each segment are only right for a lone segment
+                norms = document_norms(self.inverted_list, self.n_docs)
+            self._documents = SnapshotDocuments(self.inverted_list.parts, norms)
+        return self._documents
+
+
+class SegmentedIndex:
+    def __init__(
+        self,
+        directory: str,
+        max_buffered_docs: int = 1000,
+        max_segments: int = 8,
+        merge_factor: int = 4,
+    ):
+        """Index that can be updated without a full rebuild, made of immutable segment files (see `IndexWriter`). Added documents go into an in memory segment that is flushed into a new segment file once it holds max_buffered_docs documents (or on `flush`). Deleted documents are marked in a tombstone bitmap per segment (`<segment>.del`). Once there are more than max_segments segments, the merge_factor newest (smallest) ones are merged into one in a background thread, leaving out deleted documents. Searches run on a `Snapshot`, which no later change affects.
+
+        The directory holds `segments.json` (segment names in doc ID order), and the `.idx` and `.del` file of every segment. Documents are identified by their document name (a pdf), all of its paragraphs are deleted or replaced together.
+
+        Args:
+            directory (str): directory of the index, created if needed
+            max_buffered_docs (int, optional): number of added documents (paragraphs) kept in memory before they are flushed. Defaults to 1000.
+            max_segments (int, optional): number of segments above which segments are merged. Defaults to 8.
+            merge_factor (int, optional): number of segments merged at once. Defaults to 4.
+
+        Returns:
+            None
+        """
+        self.directory = directory
+        self.max_buffered_docs = max_buffered_docs
+        self.max_segments = max_segments
+        self.merge_factor = merge_factor
+        os.makedirs(directory, exist_ok=True)
+        manifest = self._read_manifest()
+        self.segments: list[Segment] = [Segment.open(directory, name) for name in manifest["segments"]]
+        self._next_segment: int = manifest["next_segment"]
+        self._buffer: list[pd.DataFrame] = []
+        self._number = next(_index_numbers)
+        self._version = 0
+        self._snapshot: Snapshot | None = None
+        self._merging: set[str] = set()
+        self._merge_thread: threading.Thread | None = None
+        self._lock = threading.RLock()
+
+    def _read_manifest(self):
+        """Reads `segments.json`
+
+        Returns:
+            dict: segment names in doc ID order and the number of the next segment
+        """
+        path = os.path.join(self.directory, "segments.json")
+        if not os.path.exists(path):
+            return {"segments": [], "next_segment": 0}
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_manifest(self):
+        """Writes `segments.json` next to its target and renames it over it
+
+        Returns:
+            None
+        """
+        path = os.path.join(self.directory, "segments.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(
+                {"segments": [segment.name for segment in self.segments], "next_segment": self._next_segment},
+                f,
+            )
+        os.replace(path + ".tmp", path)
+
+    def _write_tombstones(self, segment: Segment):
+        """Writes the tombstone bitmap of a segment next to its target and renames it over it
+
+        Args:
+            segment (Segment): segment with new deletions
+
+        Returns:
+            None
+        """
+        path = os.path.join(self.directory, segment.name + ".del")
+        with open(path + ".tmp", "wb") as f:
+            f.write(segment.deleted)
+        os.replace(path + ".tmp", path)
+
+    def _new_segment_name(self):
+        """Reserves the name of a new segment
+
+        Returns:
+            str: segment name
+        """
+        with self._lock:
+            name = f"segment_{self._next_segment:06d}"
+            self._next_segment += 1
+        return name
+
+    def _changed(self):
+        """Invalidates the current snapshot after a change
+
+        Returns:
+            None
+        """
+        self._version += 1
+        self._snapshot = None
+
+    def add(self, df: pd.DataFrame):
+        """Adds documents (rows of a tokenized csv: document name, page number, paragraph number, text and tokenized text). They are searchable in the next snapshot and written to disk on the next flush
+
+        Args:
+            df (pd.DataFrame): documents to be added
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._buffer.append(df[DOCUMENT_COLUMNS].copy())
+            self._changed()
+            if sum(len(frame) for frame in self._buffer) >= self.max_buffered_docs:
+                self.flush()
+
+    def delete(self, document_name: str):
+        """Deletes every paragraph of a document, from the flushed segments (tombstones, written right away) and from the documents not flushed yet
+
+        Args:
+            document_name (str): document name
+
+        Returns:
+            int: number of deleted paragraphs
+        """
+        with self._lock:
+            n_deleted = 0
+            for segment in self.segments:
+                names = segment.documents.names
+                if document_name not in names:
+                    continue
+                name_id = names.index(document_name)
+                matches = [
+                    doc_id
+                    for doc_id, paragraph_name_id in enumerate(segment.documents.name_ids)
+                    if paragraph_name_id == name_id and not segment.is_deleted(doc_id)
+                ]
+                for doc_id in matches:
+                    segment.delete(doc_id)
+                if matches:
+                    self._write_tombstones(segment)
+                    n_deleted += len(matches)
+            for i, frame in enumerate(self._buffer):
+                keep = frame["document_name"].astype(str) != document_name
+                n_deleted += int((~keep).sum())
+                self._buffer[i] = frame[keep]
+            if n_deleted:
+                self._changed()
+            return n_deleted
+
+    def replace(self, document_name: str, df: pd.DataFrame):
+        """Replaces every paragraph of a document with new ones (no snapshot sees the document half replaced)
+
+        Args:
+            document_name (str): document name
+            df (pd.DataFrame): new paragraphs of the document
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self.delete(document_name)
+            self.add(df)
+
+    def _write_segment(self, name: str, df: pd.DataFrame, lemmas: Mapping[str, str] | None = None):
+        """Builds the indexes of a batch of documents and writes them into a segment file
+
+        Args:
+            name (str): segment name
+            df (pd.DataFrame): documents
+            lemmas (Mapping[str, str] | None, optional): lemma table, built with the lemmatizer if not given. Defaults to None.
+
+        Returns:
+            Segment: the written segment, memory mapped
+        """
+        inverted_list, perm_index, _, spelling_index, autocomplete_index, query_analyzer, main_df = build_engine(
+            prepare_documents(df), lemmas
+        )
+        IndexWriter(os.path.join(self.directory, name + ".idx")).write(
+            inverted_list, perm_index, main_df, spelling_index, autocomplete_index, query_analyzer
+        )
+        return Segment.open(self.directory, name)
+
+    def flush(self):
+        """Writes the documents added since the last flush into a new segment file, then starts a background merge if there are too many segments
+
+        Returns:
+            None
+        """
+        with self._lock:
+            frames = [frame for frame in self._buffer if len(frame)]
+            self._buffer = []
+            if frames:
+                segment = self._write_segment(self._new_segment_name(), pd.concat(frames))
+                self.segments.append(segment)
+                self._write_manifest()
+                self._changed()
+            if len(self.segments) > self.max_segments:
+                self.merge(background=True)
+
+    def merge(self, names: list[str] | None = None, background: bool = False):
+        """Merges consecutive segments into one, leaving out their deleted documents. The new segment is built outside the lock, searches and updates go on meanwhile: deletions made during the merge are carried over to it before it replaces the merged segments
+
+        Args:
+            names (list[str] | None, optional): names of consecutive segments to be merged. Defaults to None (the merge_factor newest segments).
+            background (bool, optional): whether to merge in a background thread (see `wait`). Defaults to False.
+
+        Raises:
+            ValueError: if the named segments are not consecutive
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._merging:
+                # one merge at a time
+                return
+            if names is None:
+                sources = self.segments[-self.merge_factor :]
+            else:
+                sources = [segment for segment in self.segments if segment.name in names]
+                start = self.segments.index(sources[0]) if sources else 0
+                if sources != self.segments[start : start + len(sources)]:
+                    raise ValueError("only consecutive segments can be merged, doc IDs follow segment order")
+            if len(sources) < 2:
+                return
+            self._merging = {segment.name for segment in sources}
+            if background:
+                self._merge_thread = threading.Thread(target=self._merge, args=(sources,), daemon=True)
+                self._merge_thread.start()
+                return
+        self._merge(sources)
+
+    def _merge(self, sources: list[Segment]):
+        """Builds the merged segment and swaps it in (see `merge`)
+
+        Args:
+            sources (list[Segment]): consecutive segments to be merged
+
+        Returns:
+            None
+        """
+        try:
+            with self._lock:
+                tombstones = [bytes(segment.deleted) for segment in sources]
+            live = [
+                [doc_id for doc_id in range(len(segment)) if not tombstones[i][doc_id >> 3] & (1 << (doc_id & 7))]
+                for i, segment in enumerate(sources)
+            ]
+            df = pd.concat(
+                [segment.documents.to_dataframe(ids)[DOCUMENT_COLUMNS] for segment, ids in zip(sources, live)]
+            )
+            lemmas: dict[str, str] = {}
+            for segment in reversed(sources):
+                lemmas.update(segment.lemmas.items())
+            name = self._new_segment_name()
+            merged = self._write_segment(name, df, lemmas) if len(df) else None
+
+            with self._lock:
+                if merged is not None:
+                    # documents deleted while the merge was running
+                    offset = 0
+                    for segment, ids in zip(sources, live):
+                        for new_id, doc_id in enumerate(ids, offset):
+                            if segment.is_deleted(doc_id):
+                                merged.delete(new_id)
+                        offset += len(ids)
+                    if any(merged.deleted):
+                        self._write_tombstones(merged)
+                start = self.segments.index(sources[0])
+                self.segments[start : start + len(sources)] = [merged] if merged is not None else []
+                self._write_manifest()
+                self._changed()
+            for segment in sources:
+                # open snapshots keep their memory maps, which stay valid after the files are removed
+                for extension in (".idx", ".del"):
+                    path = os.path.join(self.directory, segment.name + extension)
+                    if os.path.exists(path):
+                        os.remove(path)
+        finally:
+            with self._lock:
+                self._merging = set()
+
+    def wait(self):
+        """Waits for a background merge to finish
+
+        Returns:
+            None
+        """
+        thread = self._merge_thread
+        if thread is not None:
+            thread.join()
+
+    def snapshot(self):
+        """Consistent view of the index as it is now (see `Snapshot`), reused until the index changes. The documents added since the last flush are indexed in memory as one more segment
+
+        Returns:
+            Snapshot: snapshot to search
+        """
+        with self._lock:
+            if self._snapshot is None:
+                segments = [
+                    Segment(segment.name, segment.inverted_list, segment.documents, segment.lemmas, bytearray(segment.deleted))
+                    for segment in self.segments
+                ]
+                frames = [frame for frame in self._buffer if len(frame)]
+                if frames:
+                    df = prepare_documents(pd.concat(frames))
+                    corpus = sorted({word for words in df["posting_list"] for word in words})
+                    inverted_list = create_inverted_list(df, corpus)
+                    df["norm"] = document_norms(inverted_list, len(df))
+                    segments.append(Segment(None, inverted_list, DocumentTable.from_dataframe(df), {}))
+                self._snapshot = Snapshot(segments, (self._number, self._version))
+            return self._snapshot
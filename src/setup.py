@@ -2,9 +2,20 @@
 #
 # License: GNU General Public License v3.0
 
+import os
 import pandas as pd
 import pickle
-from LinkedList import LinkedList
+from collections import defaultdict
+from collections.abc import Mapping
+from postings import PostingsList
+from permuterm import PermutermIndex
+from term_dictionary import TermDictionary
+from spelling_index import SpellingIndex
+from autocomplete_index import AutocompleteIndex
+from query_analyzer import QueryAnalyzer
+from model_registry import SUMMARY_MODEL, SUMMARY_PIPELINE_PATH
+from index_io import IndexReader
+from scorers import document_norms
 
 def create_postings_list(x: str):
     """Creates a postings list for a given string
@@ -29,126 +40,109 @@ def create_postings_list(x: str):
     return sorted((posting_list))
 
 
+def count_tokens(x: str):
+    """Counts the number of tokens in a given tokenized string (document length used for ranking)
+
+    Args:
+        x (str): tokenized string
+
+    Returns:
+        int: number of tokens in the string
+    """
+    return len(str(x).split())
+
+
 def create_inverted_list(df: pd.DataFrame, corpus: list[str]):
-    """Creates an inverted list for a given corpus and set of documents. Inverted list a dictionary with keys as the words in the corpus and values as a sorted linked list of the documents in which the word occurs
+    """Creates a positional inverted list for a given corpus and set of documents. Inverted list a dictionary with keys as the words in the corpus and values as a sorted postings list of the documents in which the word occurs, along with the positions (token index in the tokenized text) at which it occurs in each of them. The number of positions is the term frequency
 
     Args:
-        df (pd.DataFrame): dataframe containing the postings list for each document
+        df (pd.DataFrame): dataframe containing the postings list and tokenized text for each document
         corpus (list[str]): list of all the words in the corpus
 
     Returns:
-        dict[str, LinkedList]: inverted list for the given corpus and set of documents
+        dict[str, PostingsList]: positional inverted list for the given corpus and set of documents
     """
     inverted_list = {}
     for word in corpus:
-        inverted_list[word] = LinkedList()
+        inverted_list[word] = PostingsList()
+    # rows are visited in ascending index order, so the postings lists are built already sorted
     for row in df.iterrows():
         l = row[1]["posting_list"]
+        positions = token_positions(l, row[1]["tokenized"])
         for word in l:
-            inverted_list[word].append(row[0])
-    for word in inverted_list:
-        inverted_list[word].sort()
+            inverted_list[word].add_positions(row[0], positions[word])
     return inverted_list
 
 
-def get_all_rotations(s: str):
-    """Get all the rotations of a given string (clockwise downwards rotation)
+def token_positions(posting_list: list[str], tokenized: str):
+    """Finds the positions (token index in the tokenized text) of the words of a document
 
     Args:
-        s (str): string for which all the rotations are to be found
+        posting_list (list[str]): words of the document (see `create_postings_list`)
+        tokenized (str): tokenized text of the document
 
     Returns:
-        list[str]: list of all the rotations of the given string
+        dict[str, list[int]]: ascending positions of each word
     """
-    rotations = []
-    for i in range(len(s)):
-        rotations.append(s[i:] + s[:i])
-    return rotations
+    words = set(posting_list)
+    # positions count every token (punctuation included), so words separated by punctuation are not adjacent in phrases
+    positions: dict[str, list[int]] = defaultdict(list)
+    for position, word in enumerate(str(tokenized).lower().split()):
+        if word in words:
+            positions[word].append(position)
+    return positions
 
 
-def permuterm_indexing(inv_list: dict[str, LinkedList]):
-    """Creates a permuterm index for a given inverted list
+def permuterm_indexing(term_dictionary: TermDictionary):
+    """Creates a permuterm index over the term dictionary: every rotation of every `word$` in one array sorted by the rotated strings (see `PermutermIndex`), which answers prefix, suffix, infix and multi wildcard queries. Rotations point to words by their term IDs, so the words themselves are only stored in the term dictionary
 
     Args:
-        inv_list (dict[str, LinkedList]): inverted list using which the permuterm index is to be created
+        term_dictionary (TermDictionary): term dictionary of the words in the corpus
 
     Returns:
-        dict[str, LinkedList]: permuterm index for the given inverted list
+        PermutermIndex: permuterm index for the given term dictionary
     """
-    perm_index = {}
-    for word in inv_list:
-        word_perm = word + "$"
-        rotations = get_all_rotations(word_perm)
-        for rotation in rotations:
-            q = rotation.split("$")[-1]
-            if q not in perm_index:
-                perm_index[q] = LinkedList()
-            perm_index[q].append(word)
-    return perm_index
-
+    return PermutermIndex(term_dictionary)
 
-def reverse_permuterm_indexing(inv_list: dict[str, LinkedList]):
-    """Creates a reverse permuterm index for a given inverted list
 
+def startup_engine(*paths: tuple[str]):
+    """Creates the (positional) inverted list, permuterm index, corpus (term dictionary), spelling (trigram) index, autocomplete index, query analyzer (lemma table) and the dataframe containing the index, text (normal and tokenized), length and norm for each document
     Args:
-        inv_list (dict[str, LinkedList]): inverted list using which the reverse permuterm index is to be created
-
+        paths (tuple[str]): paths to the csv files containing the text for which the indexes are to be created
+        
     Returns:
-        dict[str, LinkedList]: reverse permuterm index for the given inverted list
+        tuple[dict[str, PostingsList], PermutermIndex, TermDictionary, SpellingIndex, AutocompleteIndex, QueryAnalyzer, pd.DataFrame]: tuple containing the inverted list, permuterm index, corpus (term dictionary, a sorted sequence of the words), spelling index, autocomplete index, query analyzer and the dataframe containing the index, text (normal and tokenized) length (number of tokens) and tf*idf vector norm for each document
+        
     """
-    rev_perm_index = {}
-    for word in inv_list:
-        word_perm = "$" + word
-        word_perm = word_perm[::-1]
-        rotations = get_all_rotations(word_perm)
-        for rotation in rotations:
-            q = rotation.split("$")[-1]
-            if q not in rev_perm_index:
-                rev_perm_index[q] = LinkedList()
-            rev_perm_index[q].append(word)
-    return rev_perm_index
-
-
-def make_bi_word_index(df: pd.DataFrame):
-    """Creates an bi-word index for a given dataframe
+    main_df = pd.concat([pd.read_csv(path) for path in paths])
+    return build_engine(prepare_documents(main_df))
+
+
+def prepare_documents(df: pd.DataFrame):
+    """Adds the postings list (sorted unique words) and length (number of tokens) of every document to a dataframe of tokenized documents
 
     Args:
-        df (pd.DataFrame): dataframe whose `tokenized` column is to be used to create the bi-word index
+        df (pd.DataFrame): dataframe containing the document name, page number, paragraph number, text and tokenized text of each document
 
     Returns:
-        dict[str, LinkedList]: bi-word index for the given dataframe
+        pd.DataFrame: dataframe with the `posting_list` and `length` columns, indexed 0..n-1 (document IDs)
     """
-    bi_word_index = {}
-    for row in df.iterrows():
-        text = str(row[1]["tokenized"])
-        text = text.split()
-        for i in range(len(text) - 1):
-            # tale two adjacent words as the key for the bi-word index
-            bi_word = text[i] + " " + text[i + 1]
-            if bi_word not in bi_word_index:
-                bi_word_index[bi_word] = LinkedList()
-            bi_word_index[bi_word].append(row[0])
-    for key in bi_word_index:
-        bi_word_index[key].sort()
-    return bi_word_index
+    df = df.reset_index(drop=True)
+    df["posting_list"] = df["tokenized"].apply(create_postings_list)
+    df["length"] = df["tokenized"].apply(count_tokens)
+    return df
+
+
+def build_engine(main_df: pd.DataFrame, lemmas: Mapping[str, str] | None = None):
+    """Creates all the indexes (see `startup_engine`) for a dataframe of documents prepared with `prepare_documents`, and adds their norms to it
 
-def startup_engine(*paths: tuple[str]):
-    """Creates the inverted list, permuterm index, reverse permuterm index, bi-word index, corpus and the dataframe containing the index and text (normal and tokenized) for each document
     Args:
-        paths (tuple[str]): paths to the csv files containing the text for which the indexes are to be created
-        
+        main_df (pd.DataFrame): prepared dataframe of documents
+        lemmas (Mapping[str, str] | None, optional): lemma table of the query analyzer, built with the lemmatizer from the words of the corpus and their inflections if not given. Defaults to None.
+
     Returns:
-        tuple[dict[str, LinkedList], dict[str, LinkedList], dict[str, LinkedList], dict[str, LinkedList], list[str], pd.DataFrame]: tuple containing the inverted list, permuterm index, reverse permuterm index, bi-word index, corpus and the dataframe containing the index and text (normal and tokenized) for each document
-        
+        tuple[dict[str, PostingsList], PermutermIndex, TermDictionary, SpellingIndex, AutocompleteIndex, QueryAnalyzer, pd.DataFrame]: same as `startup_engine`
     """
-    main_df = pd.read_csv(paths[0])
-    main_df["posting_list"] = main_df["tokenized"].apply(create_postings_list)
-    for path in paths[1:]:
-        temp_df = pd.read_csv(path)
-        temp_df["posting_list"] = temp_df["tokenized"].apply(create_postings_list)
-        main_df = pd.concat([main_df, temp_df])
-        
-    main_df = main_df.reset_index(drop=True)
     corpus = set()
     for l in main_df.posting_list:
         for word in l:
@@ -156,19 +150,130 @@ def startup_engine(*paths: tuple[str]):
     corpus = sorted(list(corpus))
 
     inverted_list = create_inverted_list(main_df, corpus)
+    # norms are stored with the documents so scorers never have to go over the corpus
+    main_df["norm"] = document_norms(inverted_list, len(main_df))
 
-    perm_index = permuterm_indexing(inverted_list)
-    rev_perm_index = reverse_permuterm_indexing(inverted_list)
+    term_dictionary = TermDictionary(corpus)
+    perm_index = permuterm_indexing(term_dictionary)
+    spelling_index = SpellingIndex(term_dictionary)
+    autocomplete_index = AutocompleteIndex.build(term_dictionary, inverted_list)
+    if lemmas is not None:
+        query_analyzer = QueryAnalyzer(lemmas)
+    else:
+        # query words are usually words of the corpus or one of their inflections, so their lemmas are looked up once here
+        query_analyzer = QueryAnalyzer.build(
+            [*corpus, *(word for inflections in autocomplete_index.inflections for word in inflections)]
+        )
+
+    return (
+        inverted_list,
+        perm_index,
+        term_dictionary,
+        spelling_index,
+        autocomplete_index,
+        query_analyzer,
+        main_df,
+    )
+
+
+def save_engine(
+    index_path: str,
+    *paths: tuple[str],
+    memory_budget: int = 64 * 1024 * 1024,
+    summarize: bool = False,
+    compress_text: bool = False,
+    tfidf_matrix: bool = False,
+):
+    """Builds the indexes from the given csv files (the same as `startup_engine`) and writes them, along with the document table, into a segment file that `load_engine` can open. The csv files are streamed in chunks and indexed with bounded memory (see `SpimiIndexer`), so the corpus does not have to fit in memory
+
+    Args:
+        index_path (str): path of the segment file to be written
+        paths (tuple[str]): paths to the csv files containing the text for which the indexes are to be created
+        memory_budget (int, optional): approximate memory in bytes taken by the postings lists before they are written to a temporary run. Defaults to 64 MiB.
+        summarize (bool, optional): whether to also summarize every paragraph into the summary store (see `precompute_summaries`), so `show_summary` searches never wait for the summarizer. Defaults to False.
+        compress_text (bool, optional): whether to compress the text of the documents (in blocks, so reading a document decompresses only its block). Defaults to False.
+        tfidf_matrix (bool, optional): whether to also build the weighted document-term matrix (see `TfidfMatrix`) and save it next to the segment file, for `load_tfidf_matrix`. Defaults to False.
+
+    Returns:
+        None
+    """
+    from spimi import SpimiIndexer
+
+    SpimiIndexer(memory_budget, compress_text=compress_text).build(index_path, *paths)
+    if tfidf_matrix:
+        from matrix_scoring_functions import TfidfMatrix
+
+        reader = IndexReader(index_path)
+        TfidfMatrix.from_inverted_list(reader.inverted_list, len(reader.documents)).save(
+            tfidf_matrix_path(index_path)
+        )
+    if summarize:
+        from summarizer import precompute_summaries
+
+        precompute_summaries(index_path)
+
+
+def load_engine(index_path: str):
+    """Opens the indexes written by `save_engine` instead of rebuilding them. The segment file is memory mapped, so postings are only read (and shared between processes through the page cache) when they are queried. The documents are not loaded into a dataframe either: the document table reads them straight from the file by doc ID (its `to_dataframe` gives the dataframe if needed)
+
+    Args:
+        index_path (str): path of the segment file
+
+    Returns:
+        tuple[Mapping[str, PostingsList], PermutermIndex, TermDictionary, SpellingIndex, AutocompleteIndex, QueryAnalyzer, DocumentTable]: same as `startup_engine`, with the indexes as read only mappings over the file and the columnar document table in place of the dataframe
+    """
+    reader = IndexReader(index_path)
+    return (
+        reader.inverted_list,
+        reader.perm_index,
+        reader.corpus,
+        reader.spelling_index,
+        reader.autocomplete_index,
+        reader.query_analyzer,
+        reader.documents,
+    )
+
+
+def tfidf_matrix_path(index_path: str):
+    """Path of the weighted document-term matrix saved next to a segment file (see `save_engine`)
+
+    Args:
+        index_path (str): path of the segment file
+
+    Returns:
+        str: path of the `.npz` file
+    """
+    return os.path.splitext(index_path)[0] + ".tfidf.npz"
+
+
+def load_tfidf_matrix(index_path: str):
+    """Loads the weighted document-term matrix saved with a segment file by `save_engine(..., tfidf_matrix=True)`, to rank with (pass it to `search` as `tfidf_matrix`)
+
+    Args:
+        index_path (str): path of the segment file
+
+    Returns:
+        TfidfMatrix | None: weighted document-term matrix, None if it was not saved with the segment
+    """
+    from matrix_scoring_functions import TfidfMatrix
+
+    path = tfidf_matrix_path(index_path)
+    if not os.path.exists(path):
+        return None
+    return TfidfMatrix.load(path)
 
-    bi_word_index = make_bi_word_index(main_df)
-    
-    return inverted_list, perm_index, rev_perm_index, bi_word_index, corpus, main_df
 
 if __name__ == "__main__":
     # Run this file to create the summarizer model (pretrained transformer form huggingface). Needs to be run only once.
     from transformers import pipeline
-    summary_pipeline = pipeline("summarization")
+    summary_pipeline = pipeline("summarization", model=SUMMARY_MODEL)
     
-    with open("./models/summary_pipeline.pkl", "wb") as f:
+    with open(SUMMARY_PIPELINE_PATH, "wb") as f:
         pickle.dump(summary_pipeline, f)
+
+    # Build the indexes once and save them, so the engine can be started with `load_engine("../data/index/engine.idx")`
+    import glob
+
+    os.makedirs("./data/index", exist_ok=True)
+    save_engine("./data/index/engine.idx", *sorted(glob.glob("./data/tokenized/*.csv")), tfidf_matrix=True)
     
\ No newline at end of file
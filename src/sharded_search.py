@@ -0,0 +1,540 @@
+# Copyright © 2023 Arunachala Amuda Murugan (@majimearun)
+#
+# License: GNU General Public License v3.0
+
+# importing libraries
+import bisect
+import heapq
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import Counter
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import pandas as pd
+from query_functions import boolean_filter
+from scoring_functions import get_top_k_scores
+from search_results import SearchResults
+from scorers import BM25Scorer, CosineTfIdfScorer, Scorer, TfIdfScorer, document_column, document_norms
+from setup import load_engine
+from spimi import SpimiIndexer
+
+# ranking functions a sharded engine can rank with (see `Scorer`)
+SCORERS = ("tfidf", "cosine", "bm25")
+
+
+def _split_documents(paths: tuple[str], n_shards: int, directory: str, chunk_size: int = 10000):
+    """Splits the rows of tokenized csv files into n_shards csv files of about the same number of rows. Every shard holds consecutive rows and the paragraphs of a document are never split between shards, so the doc IDs of a shard follow the ones of the previous shard
+
+    Args:
+        paths (tuple[str]): paths to the tokenized csv files
+        n_shards (int): number of shards
+        directory (str): directory the shard csv files are written to
+        chunk_size (int, optional): number of rows read at a time. Defaults to 10000.
+
+    Returns:
+        list[list[str]]: csv file of each shard (in a list, like the paths of a shard built from whole csv files)
+    """
+    # consecutive rows of each document, in order
+    documents: list[list] = []
+    for path in paths:
+        for chunk in pd.read_csv(path, usecols=["document_name"], chunksize=chunk_size):
+            for name in chunk["document_name"]:
+                if documents and documents[-1][0] == name:
+                    documents[-1][1] += 1
+                else:
+                    documents.append([name, 1])
+    total = sum(rows for _, rows in documents)
+    # first row of every shard after the first one
+    starts: list[int] = []
+    row = 0
+    for _, rows in documents:
+        while len(starts) < n_shards - 1 and row * n_shards >= (len(starts) + 1) * total:
+            starts.append(row)
+        row += rows
+    starts.extend([total] * (n_shards - 1 - len(starts)))
+
+    shard_paths = [os.path.join(directory, f"shard_{i:03d}.csv") for i in range(n_shards)]
+    for shard_path in shard_paths:
+        pd.DataFrame(columns=pd.read_csv(paths[0], nrows=0).columns).to_csv(shard_path, index=False)
+    chunk_start = 0
+    for path in paths:
+        for chunk in pd.read_csv(path, chunksize=chunk_size):
+            position = 0
+            while position < len(chunk):
+                shard = bisect.bisect_right(starts, chunk_start + position)
+                stop = len(chunk) if shard == len(starts) else min(len(chunk), starts[shard] - chunk_start)
+                chunk.iloc[position:stop].to_csv(shard_paths[shard], mode="a", index=False, header=False)
+                position = stop
+            chunk_start += len(chunk)
+    return [[shard_path] for shard_path in shard_paths]
+
+
+def _build_shard(index_path: str, paths: list[str], memory_budget: int, chunk_size: int):
+    """Builds the segment file of a shard (see `SpimiIndexer`)
+
+    Args:
+        index_path (str): path of the segment file
+        paths (list[str]): csv files of the shard
+        memory_budget (int): memory budget of the indexer
+        chunk_size (int): number of csv rows read at a time
+
+    Returns:
+        None
+    """
+    SpimiIndexer(memory_budget, chunk_size).build(index_path, *paths)
+
+
+def build_shards(
+    directory: str,
+    *paths: tuple[str],
+    n_shards: int | None = None,
+    processes: int | None = None,
+    memory_budget: int = 64 * 1024 * 1024,
+    chunk_size: int = 10000,
+):
+    """Partitions the documents of tokenized csv files into shards and builds a segment file per shard (in parallel, one shard per process), for `ShardedEngine` to serve. Shards hold consecutive documents, so the doc IDs of the sharded engine are the ones of an engine built over all the csv files
+
+    Args:
+        directory (str): directory of the shards (`shards.json` and a segment file per shard)
+        paths (tuple[str]): paths to the tokenized csv files, in order
+        n_shards (int | None, optional): number of shards the documents are split into. Defaults to None (one shard per csv file).
+        processes (int | None, optional): number of processes building shards. Defaults to None (one per core).
+        memory_budget (int, optional): memory budget of the indexer of each shard (see `SpimiIndexer`). Defaults to 64 MiB.
+        chunk_size (int, optional): number of csv rows read at a time. Defaults to 10000.
+
+    Returns:
+        list[str]: paths of the segment files of the shards
+    """
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=directory) as temp_dir:
+        groups = [[path] for path in paths] if n_shards is None else _split_documents(paths, n_shards, temp_dir, chunk_size)
+        names = [f"shard_{i:03d}.idx" for i in range(len(groups))]
+        index_paths = [os.path.join(directory, name) for name in names]
+        with ProcessPoolExecutor(processes) as pool:
+            list(
+                pool.map(
+                    _build_shard,
+                    index_paths,
+                    groups,
+                    [memory_budget] * len(groups),
+                    [chunk_size] * len(groups),
+                )
+            )
+    with open(os.path.join(directory, "shards.json.tmp"), "w") as f:
+        json.dump({"shards": names}, f, indent=1)
+    os.replace(os.path.join(directory, "shards.json.tmp"), os.path.join(directory, "shards.json"))
+    return index_paths
+
+
+class ShardSearcher:
+    def __init__(self, index_path: str):
+        """Searches one segment file (a shard, or a whole index) without printing anything: the results are doc IDs and scores. The segment file is memory mapped (see `load_engine`), so processes serving the same file share its pages through the page cache. Until `set_statistics` is called, documents are scored with the statistics of the segment itself
+
+        Args:
+            index_path (str): path of the segment file
+
+        Returns:
+            None
+        """
+        (
+            self.inverted_list,
+            self.perm_index,
+            _,
+            _,
+            _,
+            self.query_analyzer,
+            self.document_table,
+        ) = load_engine(index_path)
+        self.offset = 0
+        self.ndocs = len(self.document_table)
+        self.average_length = float(document_column(self.document_table, "length").mean()) if self.ndocs else 1.0
+        self.document_frequencies: Mapping[str, int] | None = None
+        self._scorers: dict[str, Scorer] = {}
+
+    def statistics(self):
+        """Collection statistics of the shard
+
+        Returns:
+            tuple[int, float, dict[str, int]]: number of documents, sum of the document lengths and document frequency of each word
+        """
+        return (
+            len(self.document_table),
+            float(document_column(self.document_table, "length").sum()),
+            {word: len(self.inverted_list[word]) for word in self.inverted_list},
+        )
+
+    def set_statistics(self, offset: int, ndocs: int, average_length: float, document_frequencies: Mapping[str, int]):
+        """Sets the statistics of the whole collection the shard is scored with, so the scores of its documents are the same as in an engine built over the whole collection
+
+        Args:
+            offset (int): doc ID of the first document of the shard in the collection
+            ndocs (int): number of documents in the collection
+            average_length (float): average document length in the collection
+            document_frequencies (Mapping[str, int]): document frequency in the collection of each word of the shard
+
+        Returns:
+            None
+        """
+        self.offset = offset
+        self.ndocs = ndocs
+        self.average_length = average_length
+        self.document_frequencies = document_frequencies
+        self._scorers.clear()
+
+    def scorer(self, name: str):
+        """Ranking function of the shard scored with the statistics of the collection, created on first use
+
+        Args:
+            name (str): name of the ranking function (see `SCORERS`)
+
+        Raises:
+            ValueError: if the name is not one of `SCORERS`
+
+        Returns:
+            Scorer: ranking function
+        """
+        scorer = self._scorers.get(name)
+        if scorer is None:
+            if name == "tfidf":
+                scorer = TfIdfScorer(self.document_table, self.ndocs)
+            elif name == "cosine":
+                norms = None
+                if self.document_frequencies is not None:
+                    # the norms saved with the shard use its own document frequencies
+                    norms = document_norms(
+                        self.inverted_list, len(self.document_table), self.document_frequencies, self.ndocs
+                    )
+                scorer = CosineTfIdfScorer(self.document_table, self.ndocs, norms)
+            elif name == "bm25":
+                scorer = BM25Scorer(self.document_table, ndocs=self.ndocs, average_length=self.average_length)
+            else:
+                raise ValueError(f"unknown scorer {name!r}, expected one of {SCORERS}")
+            self._scorers[name] = scorer
+        return scorer
+
+    def search(self, query: str, is_phrase: bool, ranked: bool, k: int | None, scorer: str):
+        """Finds the top k documents of the shard for a query (see `search`)
+
+        Args:
+            query (str): query string
+            is_phrase (bool): whether the query is a phrase query
+            ranked (bool): whether the results are ranked
+            k (int | None): number of results (None for all of them)
+            scorer (str): name of the ranking function
+
+        Returns:
+            list[tuple[int, float | None]]: doc IDs (in the collection) and scores, best first (ascending doc IDs with no score if unranked)
+        """
+        query = query.lower()
+        self.query_analyzer.analyze(word for word in query.replace('"', " ").split() if "*" not in word)
+        filtered = boolean_filter(
+            query, self.inverted_list, self.perm_index, _phrase=is_phrase, analyzer=self.query_analyzer
+        )
+        if len(filtered) == 0:
+            return []
+        if ranked:
+            scores = get_top_k_scores(
+                self.document_table,
+                query.split(),
+                self.inverted_list,
+                self.perm_index,
+                candidates=filtered,
+                k=k,
+                scorer=self.scorer(scorer),
+                analyzer=self.query_analyzer,
+                document_frequencies=self.document_frequencies,
+            )
+        else:
+            scores = [(doc_id, None) for doc_id in islice(filtered, k)]
+        return [(doc_id + self.offset, score) for doc_id, score in scores]
+
+    def documents(self, doc_ids: list[int]):
+        """Rows of the given documents
+
+        Args:
+            doc_ids (list[int]): doc IDs (in the collection) of documents of the shard
+
+        Returns:
+            pd.DataFrame: document name, page number, paragraph number and text of the documents (read from the document table), indexed by their doc IDs in the collection
+        """
+        table = self.document_table
+        local_ids = [doc_id - self.offset for doc_id in doc_ids]
+        return pd.DataFrame(
+            {
+                "document_name": [table.document_name(i) for i in local_ids],
+                "page_number": [table.page_number(i) for i in local_ids],
+                "paragraph_number": [table.paragraph_number(i) for i in local_ids],
+                "text": [table.text(i) for i in local_ids],
+            },
+            index=doc_ids,
+        )
+
+
+def _serve_shard(index_path: str, connection):
+    """Worker process serving one shard: sends the statistics of the shard, then answers the requests (method name and arguments of `ShardSearcher`) of the coordinator until it gets None
+
+    Args:
+        index_path (str): path of the segment file of the shard
+        connection (Connection): end of the pipe to the coordinator
+
+    Returns:
+        None
+    """
+    shard = ShardSearcher(index_path)
+    connection.send(shard.statistics())
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        method, args = request
+        try:
+            connection.send((True, getattr(shard, method)(*args)))
+        except Exception as e:
+            connection.send((False, e))
+    connection.close()
+
+
+class ShardedEngine:
+    def __init__(self, directory: str, window: int = 8):
+        """Searches the shards written by `build_shards`, each one in its own worker process. Queries are sent to every shard (scatter), each shard finds its own top k scored with the document frequencies, number of documents and average document length of the whole collection, and the results are merged into the top k of the collection (gather). The results are the same as the ones of `search` over an engine built from all the documents, and the shards of a query are searched in parallel
+
+        Spell check, autocomplete and the tf*idf matrix are not supported, they need the words of the whole collection.
+
+        Args:
+            directory (str): directory of the shards
+            window (int, optional): number of queries of a batch (see `top_k_batch`) sent to a shard before its results are read back. Defaults to 8.
+
+        Returns:
+            None
+        """
+        with open(os.path.join(directory, "shards.json")) as f:
+            names: list[str] = json.load(f)["shards"]
+        self.window = window
+        self._lock = threading.Lock()
+        self._connections = []
+        self._processes = []
+        for name in names:
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_serve_shard, args=(os.path.join(directory, name), worker_connection), daemon=True
+            )
+            process.start()
+            worker_connection.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+
+        # global statistics: every shard is scored as part of the whole collection
+        statistics = [connection.recv() for connection in self._connections]
+        self.ndocs: int = sum(ndocs for ndocs, _, _ in statistics)
+        total_length = sum(length for _, length, _ in statistics)
+        self.average_length: float = total_length / self.ndocs if self.ndocs else 1.0
+        document_frequencies: Counter = Counter()
+        for _, _, shard_frequencies in statistics:
+            document_frequencies.update(shard_frequencies)
+        self.offsets: list[int] = []
+        offset = 0
+        for connection, (ndocs, _, shard_frequencies) in zip(self._connections, statistics):
+            self.offsets.append(offset)
+            connection.send(
+                (
+                    "set_statistics",
+                    (offset, self.ndocs, self.average_length, {word: document_frequencies[word] for word in shard_frequencies}),
+                )
+            )
+            offset += ndocs
+        self._gather([connection.recv() for connection in self._connections])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Stops the worker processes
+
+        Returns:
+            None
+        """
+        with self._lock:
+            for connection, process in zip(self._connections, self._processes):
+                try:
+                    connection.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+                connection.close()
+                process.join()
+            self._connections = []
+            self._processes = []
+
+    @staticmethod
+    def _gather(responses: list[tuple[bool, object]]):
+        """Unpacks the responses of the shards, raising the first error a shard ran into
+
+        Args:
+            responses (list[tuple[bool, object]]): success flag and result (or exception) of each shard
+
+        Returns:
+            list: result of each shard
+        """
+        for ok, result in responses:
+            if not ok:
+                raise result
+        return [result for _, result in responses]
+
+    @staticmethod
+    def _merge(results: list[list[tuple[int, float | None]]], ranked: bool, k: int | None):
+        """Merges the top k of the shards into the top k of the collection
+
+        Args:
+            results (list[list[tuple[int, float | None]]]): results of each shard, best first
+            ranked (bool): whether the results are ranked (by descending score, then ascending doc ID) or in doc ID order
+            k (int | None): number of results (None for all of them)
+
+        Returns:
+            list[tuple[int, float | None]]: doc IDs and scores, best first
+        """
+        if ranked:
+            merged = heapq.merge(*results, key=lambda x: (-x[1], x[0]))
+        else:
+            merged = heapq.merge(*results, key=lambda x: x[0])
+        return list(islice(merged, k))
+
+    def top_k(
+        self,
+        query: str,
+        is_phrase: bool = False,
+        ranked: bool = True,
+        retrieve_n: int | None = None,
+        scorer: str = "tfidf",
+    ):
+        """Finds the top documents of the collection for a query, searching the shards in parallel
+
+        Args:
+            query (str): query string
+            is_phrase (bool, optional): Whether the query is a phrase query or not. Defaults to False.
+            ranked (bool, optional): Whether the results should be ranked or not. Defaults to True.
+            retrieve_n (int | None, optional): Number of documents to be retrieved. Defaults to None (all of them).
+            scorer (str, optional): ranking function (one of `SCORERS`). Defaults to "tfidf".
+
+        Returns:
+            list[tuple[int, float | None]]: doc IDs and scores, best first
+        """
+        return self.top_k_batch([query], is_phrase, ranked, retrieve_n, scorer)[0]
+
+    def top_k_batch(
+        self,
+        queries: list[str],
+        is_phrase: bool = False,
+        ranked: bool = True,
+        retrieve_n: int | None = None,
+        scorer: str = "tfidf",
+    ):
+        """Finds the top documents of several queries (see `top_k`). Up to `window` queries are queued at every shard, so the shards keep working on the next queries while the results of the previous ones are merged
+
+        Args:
+            queries (list[str]): query strings
+            is_phrase (bool, optional): Whether the queries are phrase queries or not. Defaults to False.
+            ranked (bool, optional): Whether the results should be ranked or not. Defaults to True.
+            retrieve_n (int | None, optional): Number of documents to be retrieved per query. Defaults to None (all of them).
+            scorer (str, optional): ranking function (one of `SCORERS`). Defaults to "tfidf".
+
+        Raises:
+            ValueError: if the scorer is not one of `SCORERS`
+
+        Returns:
+            list[list[tuple[int, float | None]]]: doc IDs and scores of each query, best first
+        """
+        if scorer not in SCORERS:
+            raise ValueError(f"unknown scorer {scorer!r}, expected one of {SCORERS}")
+        results: list = []
+        with self._lock:
+            sent = 0
+            for query in queries:
+                if sent - len(results) == self.window:
+                    results.append(self._receive_results(ranked, retrieve_n))
+                    if isinstance(results[-1], Exception):
+                        break
+                for connection in self._connections:
+                    connection.send(("search", (query, is_phrase, ranked, retrieve_n, scorer)))
+                sent += 1
+            # every answer sent back is read before raising, or the next query would read a stale one
+            while len(results) < sent:
+                results.append(self._receive_results(ranked, retrieve_n))
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    def _receive_results(self, ranked: bool, k: int | None):
+        """Reads the results of the oldest query sent to the shards and merges them (see `_merge`). The answer of every shard is read even if one of them failed, so no answer is left behind in a connection
+
+        Args:
+            ranked (bool): whether the results are ranked
+            k (int | None): number of results (None for all of them)
+
+        Returns:
+            list[tuple[int, float | None]] | Exception: doc IDs and scores, best first, or the first error a shard ran into
+        """
+        responses = [connection.recv() for connection in self._connections]
+        for ok, result in responses:
+            if not ok:
+                return result
+        return self._merge([result for _, result in responses], ranked, k)
+
+    def documents(self, doc_ids: list[int]):
+        """Rows of the given documents, read from the shards holding them
+
+        Args:
+            doc_ids (list[int]): doc IDs
+
+        Returns:
+            pd.DataFrame: document name, page number, paragraph number and text of the documents, indexed by doc ID
+        """
+        by_shard: dict[int, list[int]] = {}
+        for doc_id in doc_ids:
+            by_shard.setdefault(bisect.bisect_right(self.offsets, doc_id) - 1, []).append(doc_id)
+        with self._lock:
+            for shard, shard_ids in by_shard.items():
+                self._connections[shard].send(("documents", (shard_ids,)))
+            rows = self._gather([self._connections[shard].recv() for shard in by_shard])
+        if len(rows) == 0:
+            return pd.DataFrame()
+        return pd.concat(rows)
+
+    def search(
+        self,
+        query: str,
+        is_phrase: bool = False,
+        ranked: bool = True,
+        show_summary: bool = False,
+        retrieve_n: int | None = None,
+        scorer: str = "tfidf",
+        display: bool = True,
+    ):
+        """Searches the shards for documents that match the query string (see `search`). The hits are read from their shards in one round trip per shard
+
+        Args:
+            query (str): query string
+            is_phrase (bool, optional): Whether the query is a phrase query or not. Defaults to False.
+            ranked (bool, optional): Whether the results should be ranked or not. Defaults to True.
+            show_summary (bool, optional): Whether we need to show the summary of the retrieved documents. Defaults to False.
+            retrieve_n (int | None, optional): Number of documents to be retrieved. Defaults to None.
+            scorer (str, optional): ranking function (one of `SCORERS`). Defaults to "tfidf".
+            display (bool, optional): Whether to print the results as well. Defaults to True.
+
+        Returns:
+            SearchResults: results of the search
+        """
+        scores = self.top_k(query, is_phrase, ranked, retrieve_n, scorer)
+        results = SearchResults(scores, self.documents([doc_id for doc_id, _ in scores]), ranked, query)
+        if display:
+            if len(results) == 0:
+                print("No documents found")
+            else:
+                results.print(show_summary)
+        return results
@@ -0,0 +1,85 @@
+# Copyright © 2023 Arunachala Amuda Murugan (@majimearun)
+#
+# License: GNU General Public License v3.0
+
+# importing libraries
+from collections import Counter
+from collections.abc import Mapping, Sequence
+from postings import PostingsList
+
+# a single edit (insertion, deletion, replacement or swap of adjacent characters) changes at most this many trigrams of a word
+_TRIGRAMS_PER_EDIT = 4
+
+
+class SpellingIndex:
+    def __init__(
+        self,
+        terms: Sequence[str],
+        grams: Mapping[str, PostingsList] | None = None,
+    ):
+        """Character trigram index of the words in the corpus (trigram -> postings list of the term IDs of the words containing it), built along with the other indexes. It narrows spelling correction down to a handful of candidate words before any edit distance is computed
+
+        Args:
+            terms (Sequence[str]): sorted words of the corpus (term ID -> word), usually the TermDictionary
+            grams (Mapping[str, PostingsList] | None, optional): trigram postings, built from the words if not given (when loading it from disk). Defaults to None.
+
+        Returns:
+            None
+        """
+        self.terms = terms
+        if grams is None:
+            grams = {}
+            for term_id, term in enumerate(terms):
+                for gram in self.trigrams(term):
+                    if gram not in grams:
+                        grams[gram] = PostingsList()
+                    grams[gram].append(term_id)
+        self.grams = grams
+
+    @staticmethod
+    def trigrams(word: str):
+        """Distinct character trigrams of a word padded with `$` on both sides (so its first and last characters are part of as many trigrams as the others)
+
+        Args:
+            word (str): word
+
+        Returns:
+            set[str]: trigrams of the word
+        """
+        padded = "$" + word + "$"
+        return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+    def filter_distance(self, word: str, max_distance: int):
+        """Largest edit distance (up to max_distance) for which `candidates` is guaranteed to contain every word within that distance of the query word. Every edit changes at most 4 trigrams, so the filter only works while the word has more trigrams than that
+
+        Args:
+            word (str): query word
+            max_distance (int): largest edit distance of interest
+
+        Returns:
+            int: largest usable distance, 0 if the word is too short for the trigram filter
+        """
+        return max(0, min(max_distance, (len(self.trigrams(word)) - 1) // _TRIGRAMS_PER_EDIT))
+
+    def candidates(self, word: str, max_distance: int):
+        """Finds the words that can be within an edit distance of the query word: they share enough trigrams with it (count filter) and their length differs by at most the distance. Only these need an exact edit distance computation
+
+        Args:
+            word (str): query word
+            max_distance (int): maximum edit distance, at most `filter_distance(word, max_distance)` for the result to be complete
+
+        Returns:
+            list[int]: sorted term IDs of the candidate words
+        """
+        query_grams = self.trigrams(word)
+        threshold = len(query_grams) - _TRIGRAMS_PER_EDIT * max_distance
+        counts: Counter[int] = Counter()
+        for gram in query_grams:
+            if gram in self.grams:
+                counts.update(self.grams[gram])
+        return sorted(
+            term_id
+            for term_id, count in counts.items()
+            if count >= threshold
+            and abs(len(self.terms[term_id]) - len(word)) <= max_distance
+        )
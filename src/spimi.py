@@ -0,0 +1,214 @@
+# Copyright © 2023 Arunachala Amuda Murugan (@majimearun)
+#
+# License: GNU General Public License v3.0
+
+# importing libraries
+import heapq
+import mmap
+import os
+import sys
+import tempfile
+from array import array
+from collections.abc import Mapping
+from itertools import count, groupby, repeat
+import numpy as np
+import pandas as pd
+from postings import PostingsList
+from permuterm import PermutermIndex
+from term_dictionary import TermDictionary
+from spelling_index import SpellingIndex
+from autocomplete_index import AutocompleteIndex
+from query_analyzer import QueryAnalyzer
+from index_io import DocStoreWriter, IndexWriter, TermTable, TermTableWriter
+from scorers import tfidf
+from setup import count_tokens, create_postings_list, token_positions
+
+# approximate memory taken by a word of the in memory block besides its postings (dict entry, key and postings list object)
+_WORD_OVERHEAD = 200
+# approximate memory taken by a posting besides its positions (doc ID gap and term frequency)
+_POSTING_OVERHEAD = 2
+
+
+class SpimiIndexer:
+    def __init__(
+        self,
+        memory_budget: int = 64 * 1024 * 1024,
+        chunk_size: int = 10000,
+        temp_dir: str | None = None,
+        compress_text: bool = False,
+    ):
+        """Builds a segment file from tokenized csv files with bounded memory (single pass in memory indexing). Rows are streamed from the csv files in chunks and indexed into an in memory block of positional postings lists, which is written out as a sorted run (a term table in a temporary file) every time it grows past the memory budget. The runs are then merged key by key into the inverted index of the segment, computing the document norms on the way, and the text of the documents goes straight into temporary files. Only the words of the corpus (term dictionary, permuterm, spelling and autocomplete indexes, lemma table) and a few numbers per document are held in memory, so the corpus can be larger than memory. The segment is the same, byte for byte, as the one `IndexWriter.write` writes for the indexes built by `startup_engine`
+
+        Args:
+            memory_budget (int, optional): approximate size in bytes of the in memory block before it is written as a run. Defaults to 64 MiB.
+            chunk_size (int, optional): number of csv rows read at a time. Defaults to 10000.
+            temp_dir (str | None, optional): directory of the temporary files (runs and document text). Defaults to None (the system temporary directory).
+            compress_text (bool, optional): whether to compress the text of the documents in the doc store (see `DocStoreWriter`). Defaults to False.
+
+        Returns:
+            None
+        """
+        self.memory_budget = memory_budget
+        self.chunk_size = chunk_size
+        self.temp_dir = temp_dir
+        self.compress_text = compress_text
+
+    def build(self, index_path: str, *paths: tuple[str], lemmas: Mapping[str, str] | None = None):
+        """Indexes the csv files (in order, doc IDs follow the rows) into a segment file that `load_engine` can open
+
+        Args:
+            index_path (str): path of the segment file to be written
+            paths (tuple[str]): paths to the csv files containing the text for which the indexes are to be created
+            lemmas (Mapping[str, str] | None, optional): lemma table of the query analyzer, built with the lemmatizer from the words of the corpus and their inflections if not given. Defaults to None.
+
+        Returns:
+            int: number of runs written before the merge
+        """
+        with tempfile.TemporaryDirectory(dir=self.temp_dir) as directory:
+            documents = DocStoreWriter(directory, self.compress_text)
+            runs = self._invert(paths, documents, directory)
+            merged_path = os.path.join(directory, "inverted")
+            squares = self._merge(runs, merged_path, len(documents), directory)
+            # norms are stored with the documents so scorers never have to go over the corpus
+            documents.norms = array("d", np.sqrt(squares))
+
+            with open(merged_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                view = memoryview(buffer)
+                inverted_list = TermTable(view)
+                corpus = list(inverted_list)
+                term_dictionary = TermDictionary(corpus)
+                perm_index = PermutermIndex(term_dictionary)
+                spelling_index = SpellingIndex(term_dictionary)
+                autocomplete_index = AutocompleteIndex.build(term_dictionary, inverted_list)
+                if lemmas is not None:
+                    query_analyzer = QueryAnalyzer(lemmas)
+                else:
+                    # query words are usually words of the corpus or one of their inflections, so their lemmas are looked up once here
+                    query_analyzer = QueryAnalyzer.build(
+                        [*corpus, *(word for inflections in autocomplete_index.inflections for word in inflections)]
+                    )
+                IndexWriter(index_path).write_sections(
+                    view, documents, term_dictionary, perm_index, spelling_index, autocomplete_index, query_analyzer
+                )
+                # the map can only be closed once nothing points into it anymore
+                del inverted_list
+                view.release()
+            documents.close()
+        return len(runs)
+
+    def _invert(self, paths: tuple[str], documents: DocStoreWriter, directory: str):
+        """Streams the rows of the csv files into the doc store and the in memory block, writing the block as a run whenever it outgrows the memory budget
+
+        Args:
+            paths (tuple[str]): paths to the csv files
+            documents (DocStoreWriter): doc store the documents are added to
+            directory (str): directory of the runs
+
+        Returns:
+            list[str]: paths of the runs, in doc ID order
+        """
+        runs: list[str] = []
+        block: dict[str, PostingsList] = {}
+        block_size = 0
+        doc_id = 0
+        for path in paths:
+            for chunk in pd.read_csv(path, chunksize=self.chunk_size):
+                for row in zip(
+                    chunk["document_name"],
+                    chunk["page_number"],
+                    chunk["paragraph_number"],
+                    chunk["text"],
+                    chunk["tokenized"],
+                ):
+                    document_name, page_number, paragraph_number, text, tokenized = row
+                    posting_list = create_postings_list(tokenized)
+                    positions = token_positions(posting_list, tokenized)
+                    documents.add(document_name, page_number, paragraph_number, count_tokens(tokenized), text, tokenized)
+                    for word in posting_list:
+                        postings = block.get(word)
+                        if postings is None:
+                            postings = block[word] = PostingsList()
+                            block_size += _WORD_OVERHEAD + sys.getsizeof(word)
+                        postings.add_positions(doc_id, positions[word])
+                        block_size += _POSTING_OVERHEAD + len(positions[word])
+                    doc_id += 1
+                    if block_size >= self.memory_budget:
+                        runs.append(self._write_run(block, os.path.join(directory, f"run_{len(runs):06d}")))
+                        block_size = 0
+        if block or not runs:
+            runs.append(self._write_run(block, os.path.join(directory, f"run_{len(runs):06d}")))
+        return runs
+
+    @staticmethod
+    def _write_run(block: dict[str, PostingsList], path: str):
+        """Writes the block as a sorted run and empties it. Postings lists are dropped as soon as they are encoded, so writing a run takes no more memory than the block
+
+        Args:
+            block (dict[str, PostingsList]): in memory block of postings lists
+            path (str): path of the run
+
+        Returns:
+            str: path of the run
+        """
+        writer = TermTableWriter(True)
+        for word in sorted(block):
+            writer.add(word.encode("utf-8"), block.pop(word))
+        with open(path, "wb") as f:
+            writer.write_to(f)
+        writer.close()
+        return path
+
+    @staticmethod
+    def _merge(runs: list[str], path: str, ndocs: int, directory: str):
+        """Merges the runs (k way, on their sorted keys) into the term table of the segment. Runs hold consecutive doc IDs, so the postings lists of a word are concatenated in run order. The squared tf*idf weights of every document are summed over the words in the same (sorted) order as `document_norms`, so the norms are the same
+
+        Args:
+            runs (list[str]): paths of the runs, in doc ID order
+            path (str): path of the merged term table
+            ndocs (int): number of documents
+            directory (str): directory of the temporary block files
+
+        Returns:
+            np.ndarray: sum of the squared tf*idf weights of each document
+        """
+        squares = np.zeros(ndocs)
+        writer = TermTableWriter(True, directory)
+        files = [open(run, "rb") for run in runs]
+        buffers = [mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) for f in files]
+        SpimiIndexer._merge_tables([TermTable(memoryview(buffer)) for buffer in buffers], writer, squares)
+        with open(path, "wb") as f:
+            writer.write_to(f)
+        writer.close()
+        for buffer, f in zip(buffers, files):
+            buffer.close()
+            f.close()
+        return squares
+
+    @staticmethod
+    def _merge_tables(tables: list[TermTable], writer: TermTableWriter, squares: np.ndarray):
+        """Merges the term tables of the runs into the writer and adds the squared tf*idf weights of the documents to `squares` (see `_merge`)
+
+        Args:
+            tables (list[TermTable]): term tables of the runs, in doc ID order
+            writer (TermTableWriter): writer of the merged term table
+            squares (np.ndarray): sum of the squared tf*idf weights of each document, updated in place
+
+        Returns:
+            None
+        """
+        ndocs = len(squares)
+        keys = heapq.merge(*(zip(table, repeat(run), count()) for run, table in enumerate(tables)))
+        for key, entries in groupby(keys, key=lambda entry: entry[0]):
+            entries = list(entries)
+            if len(entries) == 1:
+                postings = tables[entries[0][1]].postings_at(entries[0][2])
+            else:
+                postings = PostingsList()
+                for _, run, term_id in entries:
+                    part = tables[run].postings_at(term_id)
+                    for doc_id, positions in zip(part, part.positions()):
+                        postings.add_positions(doc_id, positions)
+            writer.add(key.encode("utf-8"), postings)
+            doc_ids = np.frombuffer(postings.to_array(), dtype=np.uint32)
+            tf = np.fromiter(postings.frequencies(), dtype=np.float64, count=len(postings))
+            squares[doc_ids] += tfidf(tf, len(postings), ndocs) ** 2
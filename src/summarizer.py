@@ -0,0 +1,247 @@
+# Copyright © 2023 Arunachala Amuda Murugan (@majimearun)
+#
+# License: GNU General Public License v3.0
+
+# importing libraries
+import hashlib
+import os
+import sqlite3
+import threading
+from collections.abc import Callable, Iterable
+from itertools import islice
+from index_io import IndexReader
+from model_registry import get_model, model_version
+
+# summaries generated so far, next to the summarizer pipeline saved by setup.py
+SUMMARY_STORE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, "models", "summaries.sqlite"
+)
+
+
+def content_hash(text: str):
+    """Key of a paragraph in the summary store: the hash of its text, so a summary is reused wherever the same paragraph shows up and is never reused once the text changes
+
+    Args:
+        text (str): paragraph text
+
+    Returns:
+        str: sha256 hex digest of the utf-8 encoded text
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def pipeline_version(pipeline: Callable):
+    """Name of the model of a summarization pipeline, the namespace its summaries are stored under
+
+    Args:
+        pipeline (Callable): huggingface summarization pipeline
+
+    Returns:
+        str: name or path of the pipeline's model, or the name of the callable if it has no model
+    """
+    name = getattr(getattr(pipeline, "model", None), "name_or_path", None)
+    if not name:
+        return getattr(pipeline, "__qualname__", type(pipeline).__qualname__)
+    return name
+
+
+class SummaryStore:
+    def __init__(self, path: str = SUMMARY_STORE_PATH, namespace: str | None = None):
+        """Persistent summary cache (an sqlite database) keyed by the content hash of the paragraphs. Summaries of different models are kept apart by their namespace, so a new model never serves the summaries of the previous one
+
+        Args:
+            path (str, optional): path of the database, ":memory:" for a store that is not saved. Defaults to SUMMARY_STORE_PATH.
+            namespace (str | None, optional): name of the model the summaries come from. Defaults to None (the version of the registry summarizer, see `model_version`, looked up on every access so registering another summarizer switches namespace).
+
+        Returns:
+            None
+        """
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._namespace = namespace
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS summaries (namespace TEXT, hash TEXT, summary TEXT, PRIMARY KEY (namespace, hash))"
+            )
+
+    @property
+    def namespace(self):
+        """Name of the model the summaries of the store come from"""
+        if self._namespace is None:
+            return model_version("summarizer")
+        return self._namespace
+
+    def __len__(self):
+        """Number of summaries stored for the namespace"""
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM summaries WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+
+    def get_many(self, hashes: list[str]):
+        """Looks up the summaries of several paragraphs
+
+        Args:
+            hashes (list[str]): content hashes of the paragraphs
+
+        Returns:
+            dict[str, str]: summary of each hash found in the store
+        """
+        found: dict[str, str] = {}
+        with self._lock:
+            # sqlite limits the number of parameters of a statement
+            for start in range(0, len(hashes), 500):
+                part = hashes[start : start + 500]
+                rows = self._connection.execute(
+                    f"SELECT hash, summary FROM summaries WHERE namespace = ? AND hash IN ({','.join('?' * len(part))})",
+                    (self.namespace, *part),
+                )
+                found.update(rows)
+        return found
+
+    def put_many(self, summaries: dict[str, str]):
+        """Stores summaries (in one transaction)
+
+        Args:
+            summaries (dict[str, str]): summary of each content hash
+
+        Returns:
+            None
+        """
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?)",
+                ((self.namespace, digest, summary) for digest, summary in summaries.items()),
+            )
+
+    def close(self):
+        """Closes the database
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._connection.close()
+
+
+class Summarizer:
+    def __init__(
+        self,
+        store: SummaryStore | None = None,
+        pipeline: Callable | None = None,
+        batch_size: int = 8,
+    ):
+        """Summarization stage: summarizes many paragraphs with a single pipeline call (batched by the pipeline), and keeps every summary in a persistent store, so a paragraph is only ever summarized once (see `precompute` to summarize the whole corpus offline)
+
+        Args:
+            store (SummaryStore | None, optional): summary cache, its namespace has to name the model of the pipeline. Defaults to None (the store at SUMMARY_STORE_PATH, under the name of the pipeline's model).
+            pipeline (Callable | None, optional): huggingface summarization pipeline. Defaults to None (the summarizer of the model registry, loaded the first time a summary is missing from the store).
+            batch_size (int, optional): number of paragraphs the pipeline summarizes at a time. Defaults to 8.
+
+        Returns:
+            None
+        """
+        if store is None:
+            store = SummaryStore(namespace=None if pipeline is None else pipeline_version(pipeline))
+        self.store = store
+        self._pipeline = pipeline
+        self.batch_size = batch_size
+
+    @property
+    def pipeline(self):
+        """Summarization pipeline, the registry summarizer (loaded on first use) if none was given"""
+        if self._pipeline is None:
+            # not kept, so registering another summarizer takes effect (along with its namespace)
+            return get_model("summarizer")
+        return self._pipeline
+
+    def summarize(self, texts: list[str]):
+        """Summarizes paragraphs: summaries found in the store are returned straight away, the missing ones are generated in one pipeline call and stored
+
+        Args:
+            texts (list[str]): paragraph texts
+
+        Returns:
+            list[str]: summary of each paragraph, in order (empty for an empty paragraph)
+        """
+        hashes = [content_hash(text) for text in texts]
+        summaries = self.store.get_many(list(dict.fromkeys(hashes)))
+        missing = {digest: text for digest, text in zip(hashes, texts) if digest not in summaries and text.strip()}
+        summaries.update(self._generate(missing))
+        return [summaries.get(digest, "") for digest in hashes]
+
+    def _generate(self, texts: dict[str, str]):
+        """Summarizes paragraphs in one pipeline call and stores the summaries
+
+        Args:
+            texts (dict[str, str]): text of each paragraph, by content hash
+
+        Returns:
+            dict[str, str]: summary of each paragraph, by content hash
+        """
+        if not texts:
+            return {}
+        outputs = self.pipeline(list(texts.values()), truncation=True, batch_size=self.batch_size)
+        summaries = {digest: output["summary_text"] for digest, output in zip(texts, outputs)}
+        self.store.put_many(summaries)
+        return summaries
+
+    def precompute(self, texts: Iterable[str], chunk_size: int = 256):
+        """Summarizes a whole corpus ahead of time (e.g. after building the index), so searches never wait for the pipeline. Paragraphs already in the store are skipped, so an interrupted run picks up where it stopped
+
+        Args:
+            texts (Iterable[str]): paragraph texts
+            chunk_size (int, optional): number of paragraphs summarized (and stored) at a time. Defaults to 256.
+
+        Returns:
+            int: number of paragraphs summarized
+        """
+        summarized = 0
+        texts = iter(texts)
+        while True:
+            chunk = list(islice(texts, chunk_size))
+            if not chunk:
+                return summarized
+            unique = {content_hash(text): text for text in chunk if text.strip()}
+            stored = self.store.get_many(list(unique))
+            summarized += len(self._generate({digest: text for digest, text in unique.items() if digest not in stored}))
+
+
+_default_summarizer: Summarizer | None = None
+
+
+def default_summarizer():
+    """Summarizer used by search results when none is given: the registry pipeline with the store at SUMMARY_STORE_PATH
+
+    Returns:
+        Summarizer: shared summarizer
+    """
+    global _default_summarizer
+    if _default_summarizer is None:
+        _default_summarizer = Summarizer()
+    return _default_summarizer
+
+
+def precompute_summaries(index_path: str, summarizer: Summarizer | None = None, chunk_size: int = 256):
+    """Summarizes every paragraph of a segment file (see `save_engine`) into the summary store
+
+    Args:
+        index_path (str): path of the segment file
+        summarizer (Summarizer | None, optional): summarizer (and store) to use. Defaults to None (the default summarizer).
+        chunk_size (int, optional): number of paragraphs summarized (and stored) at a time. Defaults to 256.
+
+    Returns:
+        int: number of paragraphs summarized
+    """
+    documents = IndexReader(index_path).documents
+    if summarizer is None:
+        summarizer = default_summarizer()
+    return summarizer.precompute((documents.text(doc_id) for doc_id in range(len(documents))), chunk_size)
+
+
+if __name__ == "__main__":
+    # Run this file from the src directory after setup.py saved the index to summarize the whole corpus ahead of time (slow, but only paragraphs not summarized yet are done)
+    print(f"summarized {precompute_summaries('../data/index/engine.idx')} paragraphs")
@@ -0,0 +1,321 @@
+# Copyright © 2023 Arunachala Amuda Murugan (@majimearun)
+#
+# License: GNU General Public License v3.0
+
+# importing libraries
+from array import array
+from bisect import bisect_left
+from collections import deque
+from collections.abc import Iterator, Sequence
+
+
+class TermDictionary(Sequence):
+    """Term dictionary stored as a trie in flat arrays, mapping the words of the corpus to term IDs (their positions in sorted order) and back.
+
+    Nodes are numbered breadth first, so the children of a node are consecutive nodes sorted by the character on their incoming
+    edge: a node only needs the position of its first child, its own edge character, its parent and its term ID (-1 if no word
+    ends there). Looking a word up is one binary search over the children per character, the words below a node come out in sorted
+    order, and walking the trie while updating an edit distance row per character (a Levenshtein automaton) finds every word
+    within a distance without comparing the query against the whole vocabulary. The arrays can be written to and memory mapped
+    from a segment file.
+
+    The dictionary is a sequence of the sorted words, so it can be used wherever the sorted vocabulary (corpus) was used.
+    """
+
+    __slots__ = ("first_child", "labels", "parents", "node_terms", "term_nodes")
+
+    def __init__(
+        self,
+        terms: Sequence[str] = (),
+        first_child: Sequence[int] | None = None,
+        labels: Sequence[int] | None = None,
+        parents: Sequence[int] | None = None,
+        node_terms: Sequence[int] | None = None,
+        term_nodes: Sequence[int] | None = None,
+    ):
+        """Term dictionary class. Builds the trie for the given sorted words unless the arrays are passed in (when loading it from disk)
+
+        Args:
+            terms (Sequence[str], optional): sorted, unique words. Defaults to ().
+            first_child (Sequence[int] | None, optional): first child of each node (plus one past the last node). Defaults to None.
+            labels (Sequence[int] | None, optional): code point of the edge into each node (0 for the root). Defaults to None.
+            parents (Sequence[int] | None, optional): parent of each node (0 for the root). Defaults to None.
+            node_terms (Sequence[int] | None, optional): term ID of the word ending at each node, -1 if none. Defaults to None.
+            term_nodes (Sequence[int] | None, optional): node at which each term ID ends. Defaults to None.
+
+        Returns:
+            None
+        """
+        if first_child is None:
+            first_child, labels, parents, node_terms, term_nodes = self._build(terms)
+        self.first_child = first_child
+        self.labels = labels
+        self.parents = parents
+        self.node_terms = node_terms
+        self.term_nodes = term_nodes
+
+    @staticmethod
+    def _build(terms: Sequence[str]):
+        """Builds the flat trie arrays (breadth first numbering) for the given sorted words
+
+        Args:
+            terms (Sequence[str]): sorted, unique words
+
+        Returns:
+            tuple[array, array, array, array, array]: first child, label, parent and term ID of each node, and node of each term ID
+        """
+        # nested dict trie first, {character: child} with the term ID under the key None
+        root: dict = {}
+        for term_id, term in enumerate(terms):
+            node = root
+            for character in term:
+                node = node.setdefault(character, {})
+            node[None] = term_id
+
+        first_child = array("I")
+        labels = array("I", [0])
+        parents = array("I", [0])
+        node_terms = array("i")
+        term_nodes = array("I", bytes(4 * len(terms)))
+        queue = deque([root])
+        next_node = 1
+        while queue:
+            node = queue.popleft()
+            node_id = len(node_terms)
+            term_id = node.get(None, -1)
+            node_terms.append(term_id)
+            if term_id != -1:
+                term_nodes[term_id] = node_id
+            first_child.append(next_node)
+            for character in sorted(key for key in node if key is not None):
+                labels.append(ord(character))
+                parents.append(node_id)
+                queue.append(node[character])
+                next_node += 1
+        first_child.append(next_node)
+        return first_child, labels, parents, node_terms, term_nodes
+
+    def __len__(self):
+        """Number of words in the dictionary
+
+        Returns:
+            int: number of words
+        """
+        return len(self.term_nodes)
+
+    def __getitem__(self, term_id: int):
+        """Word with the given term ID (walks up from its node to the root)
+
+        Args:
+            term_id (int): term ID
+
+        Returns:
+            str: word
+        """
+        if term_id < 0:
+            term_id += len(self)
+        node = self.term_nodes[term_id]
+        characters: list[str] = []
+        while node != 0:
+            characters.append(chr(self.labels[node]))
+            node = self.parents[node]
+        return "".join(reversed(characters))
+
+    def __contains__(self, word: object):
+        """Checks if a word is in the dictionary (trie lookup)
+
+        Args:
+            word (object): word to be searched for
+
+        Returns:
+            bool: True if the word is in the dictionary, False otherwise
+        """
+        return isinstance(word, str) and self.find(word) != -1
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterates over the words in sorted order
+
+        Yields:
+            str: word
+        """
+        for word, _ in self.prefix(""):
+            yield word
+
+    def _child(self, node: int, character: str):
+        """Finds the child of a node reached through the given character
+
+        Args:
+            node (int): node
+            character (str): edge character
+
+        Returns:
+            int: child node, -1 if there is none
+        """
+        lo, hi = self.first_child[node], self.first_child[node + 1]
+        code = ord(character)
+        i = bisect_left(self.labels, code, lo, hi)
+        if i < hi and self.labels[i] == code:
+            return i
+        return -1
+
+    def node(self, word: str):
+        """Finds the node reached by walking the characters of a word from the root
+
+        Args:
+            word (str): word or prefix
+
+        Returns:
+            int: node, -1 if the word is not a prefix of any word in the dictionary
+        """
+        node = 0
+        for character in word:
+            node = self._child(node, character)
+            if node == -1:
+                return -1
+        return node
+
+    def find(self, word: str):
+        """Finds the term ID of a word
+
+        Args:
+            word (str): word to be searched for
+
+        Returns:
+            int: term ID, -1 if the word is not in the dictionary
+        """
+        node = self.node(word)
+        if node == -1:
+            return -1
+        return self.node_terms[node]
+
+    def index(self, word: str, *args):
+        """Term ID of a word (sequence protocol)
+
+        Raises:
+            ValueError: if the word is not in the dictionary
+
+        Returns:
+            int: term ID
+        """
+        term_id = self.find(word)
+        if term_id == -1:
+            raise ValueError(f"{word} is not in the term dictionary")
+        return term_id
+
+    def prefix(self, prefix: str):
+        """Enumerates all the words starting with a prefix, in sorted order
+
+        Args:
+            prefix (str): prefix
+
+        Yields:
+            tuple[str, int]: word and its term ID
+        """
+        node = self.node(prefix)
+        if node == -1:
+            return
+        # depth first, children pushed in reverse so the smallest character is visited first
+        stack: list[tuple[int, str]] = [(node, prefix)]
+        while stack:
+            node, word = stack.pop()
+            term_id = self.node_terms[node]
+            if term_id != -1:
+                yield word, term_id
+            for child in range(self.first_child[node + 1] - 1, self.first_child[node] - 1, -1):
+                stack.append((child, word + chr(self.labels[child])))
+
+    def range(self, lo: str, hi: str):
+        """Term IDs of all the words w with lo <= w < hi
+
+        Args:
+            lo (str): inclusive lower bound
+            hi (str): exclusive upper bound
+
+        Returns:
+            range: contiguous range of term IDs (term IDs follow sorted order)
+        """
+        start = bisect_left(self, lo)
+        return range(start, max(start, bisect_left(self, hi)))
+
+    def fuzzy(self, word: str, max_distance: int, swapping_importance: bool = True):
+        """Finds all the words within an edit distance of the query word by walking the trie with one row of the edit distance table per character (Levenshtein automaton). Branches are cut as soon as every entry of the row is over the maximum distance
+
+        Args:
+            word (str): query word
+            max_distance (int): maximum edit distance
+            swapping_importance (bool, optional): Whether swapping two adjacent characters counts as a single edit (same as `levenshtein_distance`). Defaults to True.
+
+        Returns:
+            list[tuple[str, int]]: words (in sorted order) and their distance to the query word
+        """
+        return list(self._walk(word, lambda: max_distance, swapping_importance))
+
+    def nearest(self, word: str, swapping_importance: bool = True):
+        """Finds the word with the smallest edit distance to the query word (the first in sorted order among ties), tightening the cut off every time a closer word is found
+
+        Args:
+            word (str): query word
+            swapping_importance (bool, optional): Whether swapping two adjacent characters counts as a single edit (same as `levenshtein_distance`). Defaults to True.
+
+        Returns:
+            tuple[str, int]: closest word and its distance, ("", -1) if the dictionary is empty
+        """
+        best = ["", -1]
+
+        def cut_off():
+            # strictly closer than the best word so far, so ties keep the first word in sorted order
+            return best[1] - 1 if best[1] != -1 else float("inf")
+
+        for term, distance in self._walk(word, cut_off, swapping_importance):
+            if best[1] == -1 or distance < best[1]:
+                best = [term, distance]
+                if distance == 0:
+                    break
+        return best[0], best[1]
+
+    def _walk(self, word: str, max_distance, swapping_importance: bool):
+        """Depth first trie walk computing the edit distance table one column per trie character
+
+        Args:
+            word (str): query word
+            max_distance (Callable[[], int]): current maximum distance (read again at every node so callers can tighten it)
+            swapping_importance (bool): Whether swapping two adjacent characters counts as a single edit
+
+        Yields:
+            tuple[str, int]: words within the maximum distance, in sorted order, and their distance
+        """
+        n = len(word)
+        first_column = list(range(n + 1))
+        if self.node_terms[0] != -1 and n <= max_distance():
+            yield "", n
+        # (node, word so far, column of the parent, column of the grandparent)
+        stack: list[tuple[int, str, list[int], list[int] | None]] = [
+            (child, "", first_column, None)
+            for child in range(self.first_child[1] - 1, self.first_child[0] - 1, -1)
+        ]
+        while stack:
+            node, prefix, previous, before_previous = stack.pop()
+            character = chr(self.labels[node])
+            j = len(prefix) + 1
+            column = [j] + [0] * n
+            for i in range(1, n + 1):
+                if word[i - 1] == character:
+                    column[i] = previous[i - 1]
+                else:
+                    column[i] = min(previous[i - 1], previous[i], column[i - 1]) + 1
+                    if (
+                        swapping_importance
+                        and before_previous is not None
+                        and i > 1
+                        and word[i - 1] == prefix[-1]
+                        and word[i - 2] == character
+                    ):
+                        column[i] = min(column[i], before_previous[i - 2] + 1)
+            limit = max_distance()
+            if min(column) > limit:
+                continue
+            term = prefix + character
+            if self.node_terms[node] != -1 and column[n] <= limit:
+                yield term, column[n]
+            for child in range(self.first_child[node + 1] - 1, self.first_child[node] - 1, -1):
+                stack.append((child, term, column, previous))
@@ -5,10 +5,12 @@
 import pandas as pd
 import glob
 import pickle
-import spacy
+from collections.abc import Iterable
+from itertools import islice
+from model_registry import get_model
 
-# model used for lemmatizing
-nlp = spacy.load("en_core_web_sm")
+# components of the spacy pipeline the lemmatizer does not need
+_UNUSED_COMPONENTS = ["parser", "ner"]
 
 
 def read_pickle_into_pages(files: list[str]):
@@ -20,25 +22,59 @@ def read_pickle_into_pages(files: list[str]):
     Returns:
         pd.DataFrame: dataframe with the document name, page number and text
     """
-    main_df: pd.DataFrame = pd.DataFrame(
-        columns=["document_name", "page_number", "text"]
-    )
+    # rows are collected in plain lists and turned into a dataframe once
+    document_names: list[str] = []
+    page_numbers: list[int] = []
+    texts: list[str] = []
     for file in files:
         # loading the pickle file from path
-        fh = open(file, "rb")
-        doc_info = pickle.load(fh)
+        with open(file, "rb") as fh:
+            doc_info = pickle.load(fh)
         text = [page[0] for page in doc_info["text"]]
         # 0 indexed page numbers
         page_number = [page[1] for page in doc_info["text"]]
-        # creating a dataframe with a row for each page
-        df = pd.DataFrame(columns=["document_name", "page_number", "text"])
         # The document name is the last element of the path split by `/` and removing the `.pkl` extension
-        df["document_name"] = [file.split("/")[-1][:-4]] * len(text)
-        df["page_number"] = page_number
-        df["text"] = text
-        # concatenating the dataframe to the main dataframe
-        main_df = pd.concat([main_df, df])
-    return main_df
+        document_names.extend([file.split("/")[-1][:-4]] * len(text))
+        page_numbers.extend(page_number)
+        texts.extend(text)
+    return pd.DataFrame(
+        {"document_name": document_names, "page_number": page_numbers, "text": texts}
+    )
+
+
+def split_paragraphs(text: str, threshold: int = 100, break_paragraph_at: int = 3000):
+    """Splits the text of a page into paragraphs
+
+    Args:
+        text (str): text of the page
+        threshold (int, optional): threshold for the length of the paragraph. Defaults to 100.
+        break_paragraph_at (int, optional): maximum length of a paragraph. Defaults to 3000.
+
+    Returns:
+        list[str]: paragraphs longer than the threshold
+    """
+    # split by double new line (observed a spce in between in the txt files)
+    text = text.split("\n \n")
+    text = (" \n\n".join(text)).split("\n\n")
+    text = (" .\n".join(text)).split(".\n")
+    # break the paragraphs if its length is over the break_paragraph_at parameter
+    filtering = (" ".join(text)).split("\n")
+    filtered_text = []
+    string = ""
+    for paragraph in filtering:
+        if len(string) > break_paragraph_at:
+            filtered_text.append(string)
+            string = ""
+        string += paragraph
+    if string != "":
+        filtered_text.append(string)
+    text = filtered_text
+    # remove empty paragraphs
+    text = [paragraph for paragraph in text if paragraph != ""]
+    # remove paragraphs with only spaces
+    text = [paragraph for paragraph in text if paragraph != " "]
+    # remove paragraphs with length less than the threshold
+    return [paragraph for paragraph in text if len(paragraph) > threshold]
 
 
 def seperate_df_into_paragraphs(
@@ -54,44 +90,69 @@ def seperate_df_into_paragraphs(
     Returns:
         pd.DataFrame: dataframe with the document name, page number, paragraph number and text
     """
-    main_df = pd.DataFrame(
-        columns=["document_name", "page_number", "paragraph_number", "text"]
-    )
-    for _, row in df.iterrows():
-        # split by double new line (observed a spce in between in the txt files)
-        text = row["text"].split("\n \n")
-        text = (" \n\n".join(text)).split("\n\n")
-        text = (" .\n".join(text)).split(".\n")
-        # break the paragraphs if its length is over the break_paragraph_at parameter
-        filtering = (" ".join(text)).split("\n")
-        filtered_text = []
-        string = ""
-        for paragraph in filtering:
-            if len(string) > break_paragraph_at:
-                filtered_text.append(string)
-                string = ""
-            string += paragraph
-        if string != "":
-            filtered_text.append(string)
-        text = filtered_text
-        # remove empty paragraphs
-        text = [paragraph for paragraph in text if paragraph != ""]
-        # remove paragraphs with only spaces
-        text = [paragraph for paragraph in text if paragraph != " "]
-        # remove paragraphs with length less than the threshold
-        text = [paragraph for paragraph in text if len(paragraph) > threshold]
-
-        # creating a dataframe with a row for each paragraph (paragraph number and page number are 0 indexed)
-        for paragraph_number, paragraph in enumerate(text):
-            df = pd.DataFrame(
-                columns=["document_name", "page_number", "paragraph_number", "text"]
-            )
-            df["document_name"] = [row["document_name"]]
-            df["page_number"] = [row["page_number"]]
-            df["paragraph_number"] = [paragraph_number]
-            df["text"] = [paragraph]
-            main_df = pd.concat([main_df, df])
-    return main_df
+    # a row for each paragraph (paragraph number and page number are 0 indexed), collected in plain lists and turned into a dataframe once
+    rows: dict[str, list] = {
+        "document_name": [],
+        "page_number": [],
+        "paragraph_number": [],
+        "text": [],
+    }
+    for document_name, page_number, text in zip(
+        df["document_name"], df["page_number"], df["text"]
+    ):
+        for paragraph_number, paragraph in enumerate(
+            split_paragraphs(text, threshold, break_paragraph_at)
+        ):
+            rows["document_name"].append(document_name)
+            rows["page_number"].append(page_number)
+            rows["paragraph_number"].append(paragraph_number)
+            rows["text"].append(paragraph)
+    return pd.DataFrame(rows)
+
+
+def tokenize_texts(
+    texts: Iterable[str],
+    nlp,
+    allow_digits=False,
+    allow_punct=False,
+    allow_stopwords=False,
+    allow_numbers=False,
+    batch_size: int = 256,
+    n_process: int = 1,
+    as_tuples: bool = False,
+):
+    """Streams texts through the spacy pipeline in batches (`nlp.pipe`, optionally over several processes) and yields the lemmatized text of each, without stopwords, punctuations, digits and numbers. Only the components the lemmatizer needs are run
+
+    Args:
+        texts (Iterable[str]): texts to be tokenized
+        nlp (spacy.lang.en.English): spacy model used for lemmatizing
+        allow_digits (bool, optional): whether to allow digits. Defaults to False.
+        allow_punct (bool, optional): whether to allow punctuations. Defaults to False.
+        allow_stopwords (bool, optional): whether to allow stopwords. Defaults to False.
+        allow_numbers (bool, optional): whether to allow numbers. Defaults to False.
+        batch_size (int, optional): number of texts per batch. Defaults to 256.
+        n_process (int, optional): number of worker processes (-1 for one per core). Defaults to 1.
+        as_tuples (bool, optional): whether the texts are (text, context) pairs, the context is passed through with the tokenized text. Defaults to False.
+
+    Yields:
+        str | tuple[str, Any]: tokenized text (and its context), in the order of the input texts
+    """
+    disable = [name for name in _UNUSED_COMPONENTS if name in nlp.pipe_names]
+    for result in nlp.pipe(
+        texts, batch_size=batch_size, n_process=n_process, disable=disable, as_tuples=as_tuples
+    ):
+        doc, context = result if as_tuples else (result, None)
+        tokenized = " ".join(
+            [
+                token.lemma_.lower()
+                for token in doc
+                if (token.is_alpha or allow_digits)
+                and (not token.is_punct or allow_punct)
+                and (not token.is_stop or allow_stopwords)
+                and (not token.like_num or allow_numbers)
+            ]
+        )
+        yield (tokenized, context) if as_tuples else tokenized
 
 
 def tokenize(
@@ -101,6 +162,8 @@ def tokenize(
     allow_punct=False,
     allow_stopwords=False,
     allow_numbers=False,
+    batch_size: int = 256,
+    n_process: int = 1,
 ):
     """removes stopwords, punctuations, digits and numbers and lemmatizes the text. Creates a new column called `tokenized` which contains the tokenized text. Modifies the dataframe in place.
 
@@ -111,24 +174,59 @@ def tokenize(
         allow_punct (bool, optional): whether to allow punctuations. Defaults to False.
         allow_stopwords (bool, optional): whether to allow stopwords. Defaults to False.
         allow_numbers (bool, optional): whether to allow numbers. Defaults to False.
+        batch_size (int, optional): number of paragraphs per `nlp.pipe` batch. Defaults to 256.
+        n_process (int, optional): number of worker processes (-1 for one per core). Defaults to 1.
 
     Returns:
         None
     """
-    df["tokenized"] = df["text"].apply(
-        lambda x: " ".join(
-            [
-                token.lemma_.lower()
-                for token in nlp(x)
-                if (token.is_alpha or allow_digits)
-                and (not token.is_punct or allow_punct)
-                and (not token.is_stop or allow_stopwords)
-                and (not token.like_num or allow_numbers)
-            ]
+    df["tokenized"] = list(
+        tokenize_texts(
+            df["text"],
+            nlp,
+            allow_digits,
+            allow_punct,
+            allow_stopwords,
+            allow_numbers,
+            batch_size,
+            n_process,
         )
     )
 
 
+def tokenize_to_csv(
+    df: pd.DataFrame,
+    nlp,
+    path: str,
+    chunk_size: int = 10000,
+    batch_size: int = 256,
+    n_process: int = 1,
+    **kwargs,
+):
+    """Tokenizes the paragraphs (see `tokenize_texts`) and writes them with their tokenized text to a csv file in chunks, so the tokenized corpus is never held in memory as a whole
+
+    Args:
+        df (pd.DataFrame): dataframe with the document name, page number, paragraph number and text
+        nlp (spacy.lang.en.English): spacy model used for lemmatizing
+        path (str): path of the csv file to be written
+        chunk_size (int, optional): number of rows written at a time. Defaults to 10000.
+        batch_size (int, optional): number of paragraphs per `nlp.pipe` batch. Defaults to 256.
+        n_process (int, optional): number of worker processes (-1 for one per core). Defaults to 1.
+        kwargs: allow_digits, allow_punct, allow_stopwords and allow_numbers (see `tokenize_texts`)
+
+    Returns:
+        None
+    """
+    tokenized_texts = tokenize_texts(
+        df["text"], nlp, batch_size=batch_size, n_process=n_process, **kwargs
+    )
+    with open(path, "w", newline="") as f:
+        for start in range(0, max(len(df), 1), chunk_size):
+            chunk = df.iloc[start : start + chunk_size].copy()
+            chunk["tokenized"] = list(islice(tokenized_texts, len(chunk)))
+            chunk.to_csv(f, index=False, header=start == 0)
+
+
 if __name__ == "__main__":
     #  setting up the tokenized dataframes and saving them for future use
     auto_pkls = glob.glob(
@@ -146,14 +244,7 @@ if __name__ == "__main__":
     property_final = seperate_df_into_paragraphs(property_df)
     property_final.reset_index(inplace=True, drop=True)
 
-    tokenize(auto_final, nlp)
-    tokenize(property_final, nlp)
-
-    auto_final.to_csv(
-        "./data/tokenized/auto.csv",
-        index=False,
-    )
-    property_final.to_csv(
-        "./data/tokenized/property.csv",
-        index=False,
-    )
+    # model used for lemmatizing, paragraphs are tokenized in batches by one process per core and written out in chunks
+    nlp = get_model("spacy")
+    tokenize_to_csv(auto_final, nlp, "./data/tokenized/auto.csv", n_process=-1)
+    tokenize_to_csv(property_final, nlp, "./data/tokenized/property.csv", n_process=-1)